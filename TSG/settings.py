@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ps.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'TSG.urls'
@@ -78,24 +80,99 @@ WSGI_APPLICATION = 'TSG.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# Database configuration with sqlite3
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Configuration pilotée par les variables d'environnement :
+#   DB_ENGINE=sqlite (défaut) ou DB_ENGINE=postgresql
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#   DB_CONN_MAX_AGE : durée de vie (secondes) des connexions persistantes
+#   DB_CONN_HEALTH_CHECKS : vérifie une connexion réutilisée avant chaque requête
+#   DB_POOL=1 : pool de connexions natif de Django (nécessite psycopg[pool] >= 3)
+#   DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT : dimensionnement du pool
+
+
+def env_bool(name, default=False):
+    """Lit une variable d'environnement booléenne (1/true/yes/on)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'game_center_db'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Connexions persistantes : évite la poignée de main TCP/TLS et
+            # l'authentification à chaque requête
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
     }
-}
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': 'game_center_db',
-#         'USER': 'kevyn',
-#         'PASSWORD': 'kevyn',
-#         'HOST': 'localhost',
-#         'PORT': '5432',
-#     }
-# }
+    if env_bool('DB_POOL'):
+        # Le pool natif remplace les connexions persistantes : Django exige
+        # CONN_MAX_AGE = 0 lorsque le pool est activé
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', False),
+            'OPTIONS': {
+                # WAL : les lectures ne bloquent plus les écritures (poste unique)
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=5000;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+                # Prend le verrou d'écriture dès le BEGIN pour éviter les
+                # erreurs "database is locked" lors des montées de verrou
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Les migrations sont générées localement et ne sont pas versionnées : la base
+# de test est créée directement à partir des modèles
+DATABASES['default']['TEST'] = {'MIGRATE': False}
+
+# Réplique en lecture (optionnelle) : DB_REPLICA_NAME et/ou DB_REPLICA_HOST,
+# DB_REPLICA_USER, DB_REPLICA_PASSWORD, DB_REPLICA_PORT. En local, deux
+# fichiers SQLite ou deux bases PostgreSQL suffisent pour tester le routage.
+REPLICA_DATABASE_ALIAS = 'replica'
+
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES[REPLICA_DATABASE_ALIAS] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        # Les tests utilisent la base principale à la place de la réplique
+        'TEST': {'MIRROR': 'default'},
+    }
+    for key in ('HOST', 'PORT', 'USER', 'PASSWORD'):
+        if os.environ.get(f'DB_REPLICA_{key}'):
+            DATABASES[REPLICA_DATABASE_ALIAS][key] = os.environ[f'DB_REPLICA_{key}']
+
+DATABASE_ROUTERS = ['ps.routers.ReplicaRouter']
 
 
 # Password validation
@@ -145,7 +222,7 @@ AUTH_USER_MODEL = 'ps.User'
 # Configuration de REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'ps.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -183,3 +260,47 @@ SWAGGER_SETTINGS = {
         }
     }
 }
+
+# Archivage des sessions terminées (commande archive_sessions)
+SESSION_ARCHIVE_AFTER_DAYS = int(os.environ.get('SESSION_ARCHIVE_AFTER_DAYS', 180))
+SESSION_ARCHIVE_BATCH_SIZE = int(os.environ.get('SESSION_ARCHIVE_BATCH_SIZE', 1000))
+
+# Durée de validité (secondes) du barème tarifaire compilé en mémoire
+PRICING_SCHEDULE_TTL = int(os.environ.get('PRICING_SCHEDULE_TTL', 60))
+
+# Durée de validité (secondes) de l'index en mémoire des stations disponibles
+AVAILABILITY_INDEX_TTL = int(os.environ.get('AVAILABILITY_INDEX_TTL', 5))
+
+# Signaux de vie des agents de station : intervalle d'écriture groupée et délai
+# (secondes) au-delà duquel un agent silencieux est considéré hors ligne
+HEARTBEAT_FLUSH_INTERVAL = float(os.environ.get('HEARTBEAT_FLUSH_INTERVAL', 5))
+STATION_HEARTBEAT_TIMEOUT = int(os.environ.get('STATION_HEARTBEAT_TIMEOUT', 30))
+
+# Durée (secondes) de mise en cache du classement des joueurs, par fenêtre
+LEADERBOARD_CACHE_TTL = int(os.environ.get('LEADERBOARD_CACHE_TTL', 30))
+
+# Rapports en arrière-plan (commande run_report_jobs) : dossier des résultats et
+# durée (secondes) de réutilisation d'un résultat dont la période inclut aujourd'hui
+REPORT_JOBS_DIR = os.environ.get('REPORT_JOBS_DIR', BASE_DIR / 'report_jobs')
+REPORT_JOB_RESULT_TTL = int(os.environ.get('REPORT_JOB_RESULT_TTL', 300))
+
+# Export en colonnes de l'historique des sessions (commande export_sessions)
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', BASE_DIR / 'snapshots')
+
+# Journal des changements : conservation (jours, commande compact_events) et
+# intervalle (secondes) de consultation pendant une lecture en attente
+EVENT_RETENTION_DAYS = int(os.environ.get('EVENT_RETENTION_DAYS', 30))
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 1))
+
+# Webhooks (commande dispatch_webhooks) : délai (secondes) d'un envoi, attente
+# avant la première nouvelle tentative (doublée à chaque échec) et attente maximale
+WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 10))
+WEBHOOK_RETRY_BASE = int(os.environ.get('WEBHOOK_RETRY_BASE', 5))
+WEBHOOK_RETRY_MAX = int(os.environ.get('WEBHOOK_RETRY_MAX', 3600))
+
+# Durée (secondes) de conservation des réponses rejouables (en-tête Idempotency-Key)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))
+
+# Synchronisation hors ligne (POST /api/sync/) : opérations par lot et changements par réponse
+SYNC_MAX_OPERATIONS = int(os.environ.get('SYNC_MAX_OPERATIONS', 500))
+SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', 1000))
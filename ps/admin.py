@@ -1,7 +1,107 @@
+import calendar
+from datetime import date, datetime
+
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
-from .models import User, Station, Session, RateSettings
+from .models import User, PlayerStats, PlayerMonthlyStats, Station, Session, ArchivedSession, Reservation, RateSettings, RateVersion, ReportJob, Event, WebhookSubscription
+from .reports import day_start
+from .search import search_users
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Sous PostgreSQL, une liste non filtrée d'une grande table est comptée
+    d'après les statistiques du planificateur (pg_class.reltuples) plutôt
+    que par un COUNT(*) qui parcourt toute la table.
+    """
+    
+    # En dessous, le comptage exact est peu coûteux et l'estimation moins fiable
+    EXACT_COUNT_LIMIT = 10000
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                    [connection.ops.quote_name(queryset.model._meta.db_table)]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.EXACT_COUNT_LIMIT:
+                return int(row[0])
+        return super().count
+
+
+class StartTimeDrillDown(admin.SimpleListFilter):
+    """
+    Navigation année → mois → jour sur start_time, à la manière de
+    date_hierarchy mais sans requête DISTINCT sur les dates de toute la
+    table : les choix sont calculés en Python et chaque période devient un
+    intervalle [début, fin[ servi par l'index de start_time.
+    """
+    
+    title = _('début')
+    parameter_name = 'start'
+    
+    def period(self):
+        """(premier jour, lendemain du dernier jour) de la période choisie, ou None"""
+        value = self.value()
+        if not value:
+            return None
+        try:
+            if len(value) == 4:
+                year = int(value)
+                return date(year, 1, 1), date(year + 1, 1, 1)
+            if len(value) == 7:
+                first = datetime.strptime(value, '%Y-%m').date()
+                return first, date(first.year + first.month // 12, first.month % 12 + 1, 1)
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+            return day, date.fromordinal(day.toordinal() + 1)
+        except ValueError:
+            raise IncorrectLookupParameters(f"Période invalide : {value}")
+    
+    def lookups(self, request, model_admin):
+        # Valeur invalide : IncorrectLookupParameters, que l'admin traite (?e=1)
+        period = self.period()
+        today = timezone.localdate()
+        if period is None:
+            # Première année : un MIN servi par l'index de start_time
+            first = model_admin.model._default_manager.aggregate(first=Min('start_time'))['first']
+            first_year = timezone.localtime(first).year if first else today.year
+            return [(str(year), str(year)) for year in range(today.year, first_year - 1, -1)]
+        
+        start, end = period
+        year = f'{start.year:04d}'
+        month = f'{year}-{start.month:02d}'
+        if end.toordinal() - start.toordinal() == 1:
+            day = f'{month}-{start.day:02d}'
+            return [(year, year), (month, month), (day, day)]
+        if end.year == start.year + 1 and end.month == start.month:
+            return [(year, year)] + [
+                (f'{year}-{current:02d}', f'{year}-{current:02d}')
+                for current in range(1, 13) if date(start.year, current, 1) <= today
+            ]
+        days = calendar.monthrange(start.year, start.month)[1]
+        return [(year, year), (month, month)] + [
+            (f'{month}-{current:02d}', f'{month}-{current:02d}')
+            for current in range(1, days + 1) if date(start.year, start.month, current) <= today
+        ]
+    
+    def queryset(self, request, queryset):
+        period = self.period()
+        if period is None:
+            return queryset
+        start, end = period
+        return queryset.filter(start_time__gte=day_start(start), start_time__lt=day_start(end))
 
 
 class UserAdmin(BaseUserAdmin):
@@ -19,7 +119,35 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
     search_fields = ('username',)
-    ordering = ('username',)
+    ordering = ('username_key',)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Recherche sur les colonnes normalisées et indexées plutôt qu'un icontains
+        return search_users(queryset, search_term), False
+
+
+class PlayerStatsAdmin(admin.ModelAdmin):
+    list_display = ('player', 'session_count', 'total_minutes', 'total_spent', 'last_visit')
+    search_fields = ('player__username',)
+    ordering = ('-total_spent',)
+    list_select_related = ('player',)
+    readonly_fields = ('player', 'session_count', 'total_minutes', 'total_spent', 'last_visit', 'updated_at')
+    
+    def has_add_permission(self, request):
+        # Cumuls tenus par les fins de session et la commande rebuild_player_stats
+        return False
+
+
+class PlayerMonthlyStatsAdmin(admin.ModelAdmin):
+    list_display = ('player', 'month', 'session_count', 'total_minutes', 'total_spent')
+    list_filter = ('month',)
+    search_fields = ('player__username',)
+    ordering = ('-month', '-total_spent')
+    list_select_related = ('player',)
+    readonly_fields = ('player', 'month', 'session_count', 'total_minutes', 'total_spent')
+    
+    def has_add_permission(self, request):
+        return False
 
 
 class StationAdmin(admin.ModelAdmin):
@@ -27,20 +155,27 @@ class StationAdmin(admin.ModelAdmin):
     list_filter = ('type', 'status')
     search_fields = ('name',)
     ordering = ('name',)
+    # Un menu déroulant listerait toutes les sessions de la base
+    raw_id_fields = ('current_session',)
     
     def has_current_session(self, obj):
-        return obj.current_session is not None
+        # La clé étrangère suffit : pas de requête par ligne sur les sessions
+        return obj.current_session_id is not None
     has_current_session.boolean = True
     has_current_session.short_description = _('Session active')
 
 
 class SessionAdmin(admin.ModelAdmin):
     list_display = ('id', 'player', 'station', 'start_time', 'end_time', 'duration', 'cost', 'is_active')
-    list_filter = ('is_active', 'start_time')
+    list_filter = ('is_active', StartTimeDrillDown)
     search_fields = ('player__username', 'station__name')
     ordering = ('-start_time',)
-    readonly_fields = ('duration', 'cost')
-    date_hierarchy = 'start_time'
+    readonly_fields = ('start_time', 'duration', 'cost')
+    # Table volumineuse : jointures en une requête, pas de COUNT(*) de toute la table
+    list_select_related = ('player', 'station')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    autocomplete_fields = ('player', 'station')
     fieldsets = (
         (None, {
             'fields': ('player', 'station', 'is_active')
@@ -54,23 +189,112 @@ class SessionAdmin(admin.ModelAdmin):
     )
 
 
+class ArchivedSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'player', 'station', 'start_time', 'end_time', 'duration', 'cost', 'archived_at')
+    list_filter = (StartTimeDrillDown,)
+    search_fields = ('player__username', 'station__name')
+    ordering = ('-start_time',)
+    list_select_related = ('player', 'station')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    
+    def has_add_permission(self, request):
+        # Les archives sont alimentées uniquement par la commande archive_sessions
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ('station', 'player', 'start_time', 'end_time', 'is_active', 'created_by')
+    list_filter = ('is_active', 'station__type')
+    search_fields = ('player__username', 'station__name')
+    ordering = ('start_time',)
+    list_select_related = ('station', 'player', 'created_by')
+    autocomplete_fields = ('station', 'player')
+    raw_id_fields = ('created_by',)
+
+
+class RateVersionInline(admin.TabularInline):
+    model = RateVersion
+    fields = ('hourly_rate', 'station_type', 'days_of_week', 'period_start', 'period_end', 'min_duration', 'effective_from', 'effective_to')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    verbose_name_plural = _('Historique des versions')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 class RateSettingsAdmin(admin.ModelAdmin):
-    list_display = ('hourly_rate', 'station_type', 'description', 'created_by', 'is_active', 'updated_at')
+    list_display = ('hourly_rate', 'station_type', 'days_of_week', 'period_start', 'period_end', 'min_duration', 'description', 'created_by', 'is_active', 'updated_at')
     list_filter = ('station_type', 'is_active')
     search_fields = ('description', 'created_by__username')
     readonly_fields = ('created_at', 'updated_at', 'created_by')
     ordering = ('-updated_at',)
+    inlines = (RateVersionInline,)
     fieldsets = (
         (None, {
             'fields': ('hourly_rate', 'station_type', 'description', 'is_active')
         }),
+        (_('Conditions d\'application'), {
+            'fields': ('days_of_week', 'period_start', 'period_end', 'min_duration')
+        }),
         (_('Informations de suivi'), {
             'fields': ('created_by', 'created_at', 'updated_at')
         }),
     )
 
 
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('report', 'status', 'created_by', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'report')
+    ordering = ('-created_at',)
+    list_select_related = ('created_by',)
+    readonly_fields = ('report', 'params', 'params_hash', 'result_file', 'error', 'created_by', 'created_at', 'started_at', 'heartbeat_at', 'finished_at')
+    
+    def has_add_permission(self, request):
+        # Les rapports sont mis en file par l'API
+        return False
+
+
+class EventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'entity_id', 'created_at')
+    list_filter = ('topic',)
+    search_fields = ('=entity_id',)
+    ordering = ('-id',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    readonly_fields = ('topic', 'entity_id', 'payload', 'created_at')
+    
+    def has_add_permission(self, request):
+        # Journal en ajout seul, alimenté par les changements eux-mêmes
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('url', 'is_active', 'last_event_id', 'delivered_events', 'consecutive_failures',
+                    'next_attempt_at', 'last_status_code', 'last_latency_ms')
+    list_filter = ('is_active',)
+    raw_id_fields = ('created_by',)
+    readonly_fields = ('last_event_id', 'consecutive_failures', 'next_attempt_at', 'delivered_events',
+                       'delivered_batches', 'failed_attempts', 'last_delivery_at', 'last_status_code',
+                       'last_latency_ms', 'last_error', 'created_at')
+
+
 admin.site.register(User, UserAdmin)
+admin.site.register(PlayerStats, PlayerStatsAdmin)
+admin.site.register(PlayerMonthlyStats, PlayerMonthlyStatsAdmin)
 admin.site.register(Station, StationAdmin)
 admin.site.register(Session, SessionAdmin)
+admin.site.register(ArchivedSession, ArchivedSessionAdmin)
+admin.site.register(Reservation, ReservationAdmin)
 admin.site.register(RateSettings, RateSettingsAdmin)
+admin.site.register(ReportJob, ReportJobAdmin)
+admin.site.register(Event, EventAdmin)
+admin.site.register(WebhookSubscription, WebhookSubscriptionAdmin)
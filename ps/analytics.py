@@ -0,0 +1,414 @@
+import heapq
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Count, FloatField, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .expressions import EpochSeconds
+from .models import Session, ArchivedSession, Station
+from .reports import day_start, date_range
+
+
+GROUP_BY_CHOICES = ('type', 'station')
+
+
+def session_intervals(start, end, now=None):
+    """
+    Itère les intervalles d'occupation (station_id, station_type, début, fin)
+    qui chevauchent [start, end[, triés par heure de début.
+
+    Une requête triée par stockage (table chaude et archive), fusionnées en
+    flux. Les sessions actives sont considérées occupées jusqu'à `now`.
+    """
+    now = now or timezone.now()
+    fields = ('station_id', 'station__type', 'start_time', 'end_time', 'is_active')
+
+    hot = (
+        Session.objects
+        .filter(station__isnull=False, start_time__lt=end)
+        .filter(Q(is_active=True) | Q(end_time__gt=start))
+        .order_by('start_time')
+        .values_list(*fields)
+    )
+    archived = (
+        ArchivedSession.objects
+        .filter(station__isnull=False, start_time__lt=end, end_time__gt=start)
+        .order_by('start_time')
+        .values_list(*fields[:-1])
+    )
+
+    def _hot():
+        for station_id, station_type, started, ended, is_active in hot.iterator(chunk_size=2000):
+            if is_active:
+                ended = now
+            if ended is not None:
+                yield station_id, station_type, started, ended
+
+    merged = heapq.merge(
+        _hot(),
+        archived.iterator(chunk_size=2000),
+        key=lambda interval: interval[2],
+    )
+    for station_id, station_type, started, ended in merged:
+        started, ended = max(started, start), min(ended, end)
+        if started < ended:
+            yield station_id, station_type, started, ended
+
+
+def split_by_hour(start, end):
+    """Découpe [start, end[ aux frontières d'heure locale : (heure locale, secondes)"""
+    current = start
+    while current < end:
+        local = timezone.localtime(current)
+        boundary = local.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        segment_end = min(end, boundary)
+        yield local, (segment_end - current).total_seconds()
+        current = segment_end
+
+
+class OccupancyAccumulator:
+    """Secondes-stations occupées par heure de la journée et par jour"""
+
+    def __init__(self):
+        self.by_hour = [0.0] * 24
+        self.by_day = defaultdict(float)
+        self.total = 0.0
+
+    def add(self, start, end, weight=1):
+        for local, seconds in split_by_hour(start, end):
+            seconds *= weight
+            self.by_hour[local.hour] += seconds
+            self.by_day[local.date()] += seconds
+            self.total += seconds
+
+
+def sweep_occupancy(intervals, capacities):
+    """
+    Balayage des intervalles, reçus triés par début (session_intervals) :
+    les fins en attente sont gardées dans un tas, les événements (début +1,
+    fin -1) sont donc traités dans l'ordre sans être matérialisés ni triés.
+    Entre deux événements d'un groupe, le nombre de stations occupées
+    (plafonné à la capacité du groupe) est constant.
+    """
+    occupancy = defaultdict(OccupancyAccumulator)
+    active = defaultdict(int)
+    last_time = {}
+
+    def step(moment, delta, group):
+        count = min(active[group], capacities.get(group, 0))
+        if count and last_time[group] < moment:
+            occupancy[group].add(last_time[group], moment, weight=count)
+        active[group] += delta
+        last_time[group] = moment
+
+    # (fin, rang, groupe) : le rang évite de comparer les groupes à fin égale
+    pending = []
+    for index, (group, started, ended) in enumerate(intervals):
+        # À instant égal, les fins passent avant les débuts
+        while pending and pending[0][0] <= started:
+            moment, _, ended_group = heapq.heappop(pending)
+            step(moment, -1, ended_group)
+        step(started, 1, group)
+        heapq.heappush(pending, (ended, index, group))
+    while pending:
+        moment, _, ended_group = heapq.heappop(pending)
+        step(moment, -1, ended_group)
+
+    return occupancy
+
+
+def _rate(occupied, capacity):
+    return round(100 * occupied / capacity, 2) if capacity else 0
+
+
+def utilization_report(start_date, end_date, group_by='type', now=None):
+    """
+    Taux d'occupation (%) des stations par type ou par station, par heure de la
+    journée et par jour, sur la période [start_date, end_date] incluse.
+    """
+    now = now or timezone.now()
+    start = day_start(start_date)
+    end = day_start(end_date + timedelta(days=1))
+    # La capacité ne court que jusqu'à maintenant pour une période en cours
+    capacity_end = min(end, max(now, start))
+
+    if group_by == 'station':
+        stations = Station.objects.order_by('name').values_list('id', 'name')
+        groups = {station_id: {'label': name, 'stations': 1} for station_id, name in stations}
+    else:
+        counts = Station.objects.order_by().values('type').annotate(stations=Count('id'))
+        groups = {row['type']: {'label': row['type'], 'stations': row['stations']} for row in counts}
+
+    capacities = {key: group['stations'] for key, group in groups.items()}
+    key_index = 0 if group_by == 'station' else 1
+    intervals = (
+        (interval[key_index], interval[2], interval[3])
+        for interval in session_intervals(start, capacity_end, now=now)
+    )
+    occupancy = sweep_occupancy(intervals, capacities)
+
+    # Secondes disponibles par station sur la période, ventilées de la même façon
+    window = OccupancyAccumulator()
+    window.add(start, capacity_end)
+
+    results = []
+    for key, group in groups.items():
+        used = occupancy.get(key) or OccupancyAccumulator()
+        stations = group['stations']
+        results.append({
+            'key': str(key),
+            'label': group['label'],
+            'stations': stations,
+            'utilization': _rate(used.total, window.total * stations),
+            'by_hour': [
+                {'hour': hour, 'utilization': _rate(used.by_hour[hour], window.by_hour[hour] * stations)}
+                for hour in range(24)
+            ],
+            'by_day': [
+                {
+                    'date': day.strftime('%Y-%m-%d'),
+                    'utilization': _rate(used.by_day.get(day, 0), window.by_day.get(day, 0) * stations)
+                }
+                for day in date_range(start_date, end_date)
+            ],
+        })
+
+    return {
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'group_by': group_by,
+        'groups': results,
+    }
+
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est optionnel : repli en Python pur
+    np = None
+
+
+HOUR = 3600
+WEEKDAYS = ('lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche')
+
+
+def stream_session_offsets(start, end, now, station_type=None):
+    """
+    Parcourt une seule fois les sessions (table chaude et archive) qui
+    chevauchent [start, end[ et retourne trois colonnes : début et fin en
+    secondes depuis `start` (non bornées) et coût.
+
+    Les horodatages sont convertis en secondes par la base : aucun objet
+    datetime n'est construit côté Python.
+    """
+    starts, ends, costs = array('d'), array('d'), array('d')
+    origin = start.timestamp()
+    elapsed_now = now.timestamp() - origin
+
+    hot = Session.objects.filter(start_time__lt=end).filter(Q(is_active=True) | Q(end_time__gt=start))
+    archived = ArchivedSession.objects.filter(start_time__lt=end, end_time__gt=start)
+    if station_type:
+        hot = hot.filter(station__type=station_type)
+        archived = archived.filter(station__type=station_type)
+
+    columns = {
+        'started': EpochSeconds('start_time') - origin,
+        'ended': EpochSeconds('end_time') - origin,
+        'amount': Cast('cost', FloatField()),
+    }
+    streams = (
+        hot.order_by().annotate(**columns).values_list('started', 'ended', 'amount', 'is_active'),
+        archived.order_by().annotate(**columns).values_list('started', 'ended', 'amount'),
+    )
+    for stream in streams:
+        for row in stream.iterator(chunk_size=5000):
+            started, ended, cost = row[0], row[1], row[2]
+            if len(row) == 4 and row[3]:
+                # Session en cours : occupée jusqu'à maintenant, pas encore facturée
+                ended, cost = elapsed_now, None
+            if ended is None or ended <= started:
+                continue
+            starts.append(started)
+            ends.append(ended)
+            costs.append(cost or 0.0)
+
+    return starts, ends, costs
+
+
+def hour_slots(start, hours):
+    """Indice de case (jour de la semaine * 24 + heure locale) de chaque heure de la période"""
+    slots = []
+    index = 0
+    while index < hours:
+        # Un seul passage par le fuseau horaire par jour local
+        local = timezone.localtime(start + timedelta(hours=index))
+        first = local.weekday() * 24 + local.hour
+        run = min(hours - index, 24 - local.hour)
+        slots.extend(range(first, first + run))
+        index += run
+    return slots
+
+
+def _bucket_numpy(starts, ends, costs, span, hours):
+    """Ventilation vectorisée des intervalles par heure (tableaux de différences)"""
+    s = np.frombuffer(starts, dtype=np.float64)
+    e = np.frombuffer(ends, dtype=np.float64)
+    c = np.frombuffer(costs, dtype=np.float64)
+
+    # Revenu au prorata du temps : coût par seconde sur la durée complète
+    rate = np.divide(c, e - s, out=np.zeros_like(c), where=(e > s))
+    s = np.clip(s, 0, span)
+    e = np.clip(e, 0, span)
+    keep = e > s
+    s, e, rate = s[keep], e[keep], rate[keep]
+
+    first = (s // HOUR).astype(np.int64)
+    last = np.minimum(((e - 1e-9) // HOUR).astype(np.int64), hours - 1)
+    same = first == last
+
+    def spread(weights):
+        # Heure de début (partielle), heure de fin (partielle) et heures pleines entre les deux
+        head = np.where(same, e - s, (first + 1) * HOUR - s) * weights
+        tail = np.where(same, 0, e - last * HOUR) * weights
+        result = np.bincount(first, weights=head, minlength=hours)
+        result += np.bincount(last, weights=tail, minlength=hours)
+        full = np.zeros(hours + 1)
+        inner = ~same & (last > first + 1)
+        np.add.at(full, first[inner] + 1, weights[inner] * HOUR)
+        np.add.at(full, last[inner], -weights[inner] * HOUR)
+        return result + np.cumsum(full)[:hours]
+
+    occupied = spread(np.ones_like(s)) / HOUR
+    revenue = spread(rate)
+
+    # Concurrence au début de chaque heure : sessions telles que s <= k*HOUR < e
+    boundary = np.zeros(hours + 1)
+    np.add.at(boundary, np.ceil(s / HOUR).astype(np.int64), 1)
+    np.add.at(boundary, np.ceil(e / HOUR).astype(np.int64), -1)
+    peak = np.cumsum(boundary)[:hours]
+
+    # Puis maximum atteint à chaque événement (fins avant débuts à instant égal)
+    times = np.concatenate((s, e))
+    deltas = np.concatenate((np.ones_like(s), -np.ones_like(e)))
+    order = np.lexsort((deltas, times))
+    concurrent = np.cumsum(deltas[order])
+    event_hours = np.minimum((times[order] // HOUR).astype(np.int64), hours - 1)
+    np.maximum.at(peak, event_hours, concurrent)
+
+    return occupied.tolist(), revenue.tolist(), peak.tolist()
+
+
+def _bucket_python(starts, ends, costs, span, hours):
+    """Même ventilation que _bucket_numpy, en Python pur"""
+    occupied = [0.0] * hours
+    revenue = [0.0] * hours
+    full = [0.0] * (hours + 1)
+    full_revenue = [0.0] * (hours + 1)
+    boundary = [0] * (hours + 1)
+    events = []
+
+    for s, e, cost in zip(starts, ends, costs):
+        rate = cost / (e - s) if e > s else 0.0
+        s, e = min(max(s, 0.0), span), min(max(e, 0.0), span)
+        if e <= s:
+            continue
+        events.append((s, 1))
+        events.append((e, -1))
+
+        first = int(s // HOUR)
+        last = min(int((e - 1e-9) // HOUR), hours - 1)
+        if first == last:
+            occupied[first] += e - s
+            revenue[first] += (e - s) * rate
+        else:
+            occupied[first] += (first + 1) * HOUR - s
+            revenue[first] += ((first + 1) * HOUR - s) * rate
+            occupied[last] += e - last * HOUR
+            revenue[last] += (e - last * HOUR) * rate
+            if last > first + 1:
+                full[first + 1] += HOUR
+                full[last] -= HOUR
+                full_revenue[first + 1] += HOUR * rate
+                full_revenue[last] -= HOUR * rate
+
+        boundary[-int(-s // HOUR)] += 1
+        boundary[-int(-e // HOUR)] -= 1
+
+    peak = [0] * hours
+    running = running_revenue = current = 0
+    for index in range(hours):
+        running += full[index]
+        running_revenue += full_revenue[index]
+        occupied[index] = (occupied[index] + running) / HOUR
+        revenue[index] += running_revenue
+        current += boundary[index]
+        peak[index] = current
+
+    events.sort()
+    concurrent = 0
+    for moment, delta in events:
+        concurrent += delta
+        index = min(int(moment // HOUR), hours - 1)
+        if concurrent > peak[index]:
+            peak[index] = concurrent
+
+    return occupied, revenue, peak
+
+
+def heatmap_report(start_date, end_date, station_type=None, now=None, use_numpy=None):
+    """
+    Matrice jour de la semaine × heure : nombre moyen et pic de sessions
+    simultanées, et revenu réparti au prorata du temps joué.
+    """
+    now = now or timezone.now()
+    start = day_start(start_date)
+    end = min(day_start(end_date + timedelta(days=1)), max(now, start))
+    span = (end - start).total_seconds()
+    hours = int(-(-span // HOUR))
+
+    if use_numpy is None:
+        use_numpy = np is not None
+
+    starts, ends, costs = stream_session_offsets(start, end, now, station_type=station_type)
+
+    if hours == 0:
+        occupied, revenue, peak = [], [], []
+    elif use_numpy:
+        occupied, revenue, peak = _bucket_numpy(starts, ends, costs, span, hours)
+    else:
+        occupied, revenue, peak = _bucket_python(starts, ends, costs, span, hours)
+
+    # Repli des heures de la période sur les 7 × 24 cases
+    slot_hours = [0.0] * 168
+    slot_occupied = [0.0] * 168
+    slot_revenue = [0.0] * 168
+    slot_peak = [0] * 168
+    for index, slot in enumerate(hour_slots(start, hours)):
+        slot_hours[slot] += min(HOUR, span - index * HOUR) / HOUR
+        slot_occupied[slot] += occupied[index]
+        slot_revenue[slot] += revenue[index]
+        slot_peak[slot] = max(slot_peak[slot], int(peak[index]))
+
+    def matrix(values, digits=2):
+        return [[round(values[day * 24 + hour], digits) for hour in range(24)] for day in range(7)]
+
+    average = [
+        slot_occupied[slot] / slot_hours[slot] if slot_hours[slot] else 0
+        for slot in range(168)
+    ]
+
+    return {
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'station_type': station_type,
+        'engine': 'numpy' if use_numpy else 'python',
+        'weekdays': list(WEEKDAYS),
+        'hours': list(range(24)),
+        'concurrent_sessions': matrix(average),
+        'peak_concurrent_sessions': [[slot_peak[day * 24 + hour] for hour in range(24)] for day in range(7)],
+        'revenue': matrix(slot_revenue),
+        'peak_concurrency': max(slot_peak) if slot_peak else 0,
+        'total_revenue': round(sum(slot_revenue), 2),
+    }
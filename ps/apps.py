@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ps'
+    
+    def ready(self):
+        # Enregistrement des gestionnaires de signaux
+        from . import signals  # noqa: F401
+        from .postgres import install_postgres_objects
+        
+        # Contraintes et extensions propres à PostgreSQL
+        post_migrate.connect(install_postgres_objects, sender=self)
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Session, ArchivedSession
+
+
+def archive_cutoff(days=None):
+    """Retourne la date avant laquelle les sessions terminées sont archivées"""
+    if days is None:
+        days = settings.SESSION_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_sessions(cutoff):
+    """Sessions terminées avant `cutoff` qui ne sont plus référencées par une station"""
+    return Session.objects.filter(
+        is_active=False,
+        end_time__lt=cutoff,
+        current_station__isnull=True,
+    )
+
+
+def archive_sessions(cutoff=None, batch_size=None, max_batches=None):
+    """
+    Déplace les sessions terminées avant `cutoff` vers la table d'archive.
+
+    Chaque lot est copié puis supprimé de la table chaude dans une même
+    transaction : une session est toujours présente dans exactement un des
+    deux stockages. Retourne le nombre de sessions archivées.
+    """
+    if cutoff is None:
+        cutoff = archive_cutoff()
+    if batch_size is None:
+        batch_size = settings.SESSION_ARCHIVE_BATCH_SIZE
+
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(
+                archivable_sessions(cutoff)
+                .order_by('end_time')
+                .values(*ArchivedSession.ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+
+            ArchivedSession.objects.bulk_create(
+                [ArchivedSession(**row) for row in rows],
+                ignore_conflicts=True,
+            )
+            Session.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+
+        archived += len(rows)
+        batches += 1
+
+    return archived
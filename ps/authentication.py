@@ -0,0 +1,15 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication as BaseJWTAuthentication
+
+from .routers import primary_reads
+
+
+class JWTAuthentication(BaseJWTAuthentication):
+    """
+    Authentification JWT dont l'utilisateur est toujours lu sur la base
+    principale : un compte désactivé ou modifié ne doit pas être vu dans son
+    ancien état sur une réplique en retard.
+    """
+
+    def get_user(self, validated_token):
+        with primary_reads():
+            return super().get_user(validated_token)
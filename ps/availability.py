@@ -0,0 +1,102 @@
+"""
+Index en mémoire des stations disponibles, par type.
+
+Il est tenu à jour par les signaux de Station dans ce processus ; les mises
+à jour groupées (`.update()`) doivent appeler invalidate_availability(). Les
+autres processus le rechargent après AVAILABILITY_INDEX_TTL secondes. Ce
+n'est qu'une vue de lecture : la réservation d'une station passe toujours
+par un verrou en base.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+
+_lock = threading.Lock()
+_index = {'stations': None, 'expires_at': 0.0}
+
+
+def _load():
+    from .models import Station
+
+    stations = {station_type: {} for station_type, _ in Station.TYPE_CHOICES}
+    rows = Station.objects.filter(status='available').values_list('type', 'id', 'name')
+    for station_type, station_id, name in rows:
+        stations.setdefault(station_type, {})[station_id] = name
+    return stations
+
+
+def _current():
+    stations = _index['stations']
+    if stations is not None and time.monotonic() < _index['expires_at']:
+        return stations
+
+    with _lock:
+        if _index['stations'] is None or time.monotonic() >= _index['expires_at']:
+            _index['stations'] = _load()
+            _index['expires_at'] = time.monotonic() + getattr(settings, 'AVAILABILITY_INDEX_TTL', 5)
+        return _index['stations']
+
+
+def available_stations(station_type=None):
+    """Stations disponibles (id, nom, type), triées par nom"""
+    stations = _current()
+    types = [station_type] if station_type else sorted(stations)
+    available = [
+        {'id': str(station_id), 'name': name, 'type': current_type}
+        for current_type in types
+        for station_id, name in stations.get(current_type, {}).items()
+    ]
+    return sorted(available, key=lambda station: (station['name'], station['id']))
+
+
+def station_changed(station):
+    """Reporte le statut d'une station enregistrée dans l'index"""
+    with _lock:
+        stations = _index['stations']
+        if stations is None:
+            return
+        for current_type, members in stations.items():
+            if current_type != station.type or station.status != 'available':
+                members.pop(station.pk, None)
+        if station.status == 'available':
+            stations.setdefault(station.type, {})[station.pk] = station.name
+
+
+def station_deleted(station_id):
+    """Retire une station supprimée de l'index"""
+    with _lock:
+        for members in (_index['stations'] or {}).values():
+            members.pop(station_id, None)
+
+
+def invalidate_availability():
+    """Force le rechargement de l'index au prochain appel"""
+    with _lock:
+        _index['stations'] = None
+
+
+def free_stations(start, end, station_type=None):
+    """
+    Stations libres sur [start, end[, en une seule requête : deux anti-jointures
+    (NOT EXISTS) sur les réservations et les sessions actives qui chevauchent
+    la plage. Une session ouverte sans heure de fin occupe la station jusqu'à
+    nouvel ordre ; les stations en maintenance sont exclues.
+    """
+    from .models import Reservation, Session, Station
+
+    reserved = Reservation.overlapping(start, end).filter(station=OuterRef('pk'))
+    occupied = (
+        Session.objects
+        .filter(station=OuterRef('pk'), is_active=True, start_time__lt=end)
+        .filter(Q(end_time__isnull=True) | Q(end_time__gt=start))
+    )
+    stations = Station.objects.exclude(status='maintenance').filter(~Exists(reserved), ~Exists(occupied))
+    if station_type:
+        stations = stations.filter(type=station_type)
+    return [
+        {'id': str(station_id), 'name': name, 'type': current_type}
+        for station_id, name, current_type in stations.order_by('name', 'id').values_list('id', 'name', 'type')
+    ]
@@ -0,0 +1,211 @@
+"""
+Journal des changements des sessions, stations et tarifs.
+
+Chaque événement est inséré dans la transaction qui produit le changement :
+il n'existe que si le changement est validé. Les consommateurs lisent le
+journal par position (GET /api/events/?after=<id>) et peuvent attendre les
+nouveaux événements (long polling).
+
+Sous PostgreSQL, un verrou consultatif de transaction sérialise les écritures
+du journal : les identifiants sont alors validés dans l'ordre, et un
+consommateur qui a lu jusqu'à l'identifiant N ne verra jamais apparaître
+plus tard un événement d'identifiant inférieur. SQLite sérialise déjà les
+écritures.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Exists, Max, Min, OuterRef
+
+from .models import Event, Session, Station, WebhookSubscription
+
+
+TOPICS = (
+    'session.started',
+    'session.ended',
+    'session.repriced',
+    'station.status_changed',
+    'rate.changed',
+)
+# Sujets décrivant un état : seul le dernier événement par entité garde un sens
+COMPACTED_TOPICS = ('session.repriced', 'station.status_changed', 'rate.changed')
+# Clé du verrou consultatif PostgreSQL des écritures du journal
+EVENT_LOCK_KEY = 7310047
+
+_new_events = threading.Condition()
+
+
+def _notify():
+    with _new_events:
+        _new_events.notify_all()
+
+
+def _lock_journal():
+    connection = connections[router.db_for_write(Event)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [EVENT_LOCK_KEY])
+
+
+def record_many(events):
+    """Ajoute des événements (topic, entity_id, payload) au journal"""
+    if not events:
+        return []
+    _lock_journal()
+    created = Event.objects.bulk_create([
+        Event(topic=topic, entity_id=str(entity_id or ''), payload=payload)
+        for topic, entity_id, payload in events
+    ])
+    transaction.on_commit(_notify)
+    return created
+
+
+def record(topic, entity_id, payload):
+    return record_many([(topic, entity_id, payload)])[0]
+
+
+def _moment(value):
+    return value.isoformat() if value else None
+
+
+def session_payload(session):
+    return {
+        'id': str(session.pk),
+        'player_id': str(session.player_id),
+        'station_id': str(session.station_id) if session.station_id else None,
+        'start_time': _moment(session.start_time),
+        'end_time': _moment(session.end_time),
+        'duration': session.duration,
+        'cost': str(session.cost) if session.cost is not None else None,
+        # Les sessions archivées sont toutes terminées
+        'is_active': getattr(session, 'is_active', False),
+    }
+
+
+def record_session(topic, session):
+    return record(topic, session.pk, session_payload(session))
+
+
+def record_sessions(topic, session_ids, model=Session):
+    """Événements de sessions (ou de sessions archivées) modifiées par une mise à jour groupée"""
+    sessions = model.objects.filter(pk__in=list(session_ids)).order_by('start_time', 'id')
+    return record_many([(topic, session.pk, session_payload(session)) for session in sessions])
+
+
+def station_payload(station, previous_status):
+    return {
+        'id': str(station.pk),
+        'name': station.name,
+        'type': station.type,
+        'status': station.status,
+        'previous_status': previous_status,
+        'current_session_id': str(station.current_session_id) if station.current_session_id else None,
+    }
+
+
+def record_station(station, previous_status):
+    return record('station.status_changed', station.pk, station_payload(station, previous_status))
+
+
+def record_stations(previous_statuses):
+    """
+    Événements de stations modifiées par une mise à jour groupée :
+    `previous_statuses` associe l'identifiant de chaque station à son statut
+    avant la mise à jour. Les stations dont le statut n'a pas changé sont ignorées.
+    """
+    stations = Station.objects.filter(pk__in=list(previous_statuses)).order_by('name', 'id')
+    return record_many([
+        ('station.status_changed', station.pk, station_payload(station, previous_statuses[station.pk]))
+        for station in stations
+        if station.status != previous_statuses[station.pk]
+    ])
+
+
+def record_rate(rate):
+    return record('rate.changed', rate.pk, {
+        'id': str(rate.pk),
+        'hourly_rate': str(rate.hourly_rate),
+        'station_type': rate.station_type,
+        'is_active': rate.is_active,
+        'updated_at': _moment(rate.updated_at),
+    })
+
+
+def read_events(after=0, limit=100, topics=None):
+    """Événements d'identifiant supérieur à `after`, dans l'ordre du journal"""
+    queryset = Event.objects.filter(id__gt=after)
+    if topics:
+        queryset = queryset.filter(topic__in=topics)
+    return list(queryset.order_by('id')[:limit])
+
+
+def wait_for_events(after=0, limit=100, topics=None, timeout=0):
+    """
+    Comme read_events, mais attend jusqu'à `timeout` secondes qu'un événement
+    arrive. Les écritures de ce processus réveillent l'attente aussitôt ;
+    celles des autres processus sont vues au plus tard après
+    EVENT_POLL_INTERVAL secondes.
+    """
+    deadline = time.monotonic() + timeout
+    interval = getattr(settings, 'EVENT_POLL_INTERVAL', 1.0)
+    while True:
+        events = read_events(after, limit, topics)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            return events
+        with _new_events:
+            _new_events.wait(min(remaining, interval))
+
+
+def delivered_position():
+    """
+    Position du dernier événement livré à tous les abonnements webhook actifs
+    (None sans abonnement actif) : les événements suivants ne sont ni purgés
+    ni compactés, un abonnement en retard les recevra donc tous.
+    """
+    return WebhookSubscription.objects.filter(is_active=True).aggregate(position=Min('last_event_id'))['position']
+
+
+def _removable(events, position):
+    return events if position is None else events.filter(id__lte=position)
+
+
+def purge_events(before, batch_size=1000):
+    """
+    Supprime par lots les événements antérieurs à `before` et déjà livrés aux
+    abonnements actifs ; retourne leur nombre
+    """
+    events = _removable(Event.objects.filter(created_at__lt=before), delivered_position())
+    deleted = 0
+    while True:
+        ids = list(events.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Event.objects.filter(id__in=ids).delete()[0]
+
+
+def compact_events(before):
+    """
+    Supprime, parmi les événements d'état (COMPACTED_TOPICS) antérieurs à
+    `before` et déjà livrés aux abonnements actifs, ceux qu'un événement plus
+    récent de la même entité remplace.
+    """
+    newer = Event.objects.filter(topic=OuterRef('topic'), entity_id=OuterRef('entity_id'), id__gt=OuterRef('id'))
+    events = _removable(Event.objects.filter(topic__in=COMPACTED_TOPICS, created_at__lt=before), delivered_position())
+    return events.filter(Exists(newer)).delete()[0]
+
+
+def undelivered_events(before):
+    """
+    Événements antérieurs à `before` que la purge conserve faute d'avoir été
+    livrés à tous les abonnements actifs : (nombre, premier, dernier identifiant)
+    """
+    position = delivered_position()
+    if position is None:
+        return 0, None, None
+    kept = Event.objects.filter(created_at__lt=before, id__gt=position).aggregate(
+        count=Count('id'), first=Min('id'), last=Max('id')
+    )
+    return kept['count'], kept['first'], kept['last']
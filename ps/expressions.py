@@ -0,0 +1,27 @@
+from django.db.models import FloatField, Func
+
+
+class EpochSeconds(Func):
+    """
+    Convertit un horodatage en secondes depuis l'epoch Unix, côté base.
+
+    Évite de matérialiser des objets datetime en Python lorsqu'on ne fait
+    que de l'arithmétique sur les durées.
+    """
+
+    output_field = FloatField()
+    template = "EXTRACT(EPOCH FROM %(expressions)s)::double precision"
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # julianday() de l'epoch Unix vaut 2440587.5
+        return self.as_sql(
+            compiler,
+            connection,
+            template="((JULIANDAY(%(expressions)s) - 2440587.5) * 86400.0)",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="UNIX_TIMESTAMP(%(expressions)s)", **extra_context
+        )
@@ -0,0 +1,132 @@
+"""
+Filtres composables de la liste des sessions.
+
+Chaque paramètre de requête est traduit en condition « sargable », c'est-à-dire
+utilisable telle quelle par un index : une date devient un intervalle
+[début, fin[ sur start_time plutôt qu'un start_time__date, et un préfixe de nom
+un intervalle [préfixe, préfixe suivant[ plutôt qu'un LIKE.
+"""
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+from .models import Station
+from .reports import day_start
+
+
+class FilterError(ValueError):
+    """Paramètre de filtre invalide ; le message est destiné au client"""
+
+
+def _uuid(value, label):
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise FilterError(f"{label} invalide")
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise FilterError("Format de date invalide. Utilisez YYYY-MM-DD")
+
+
+def _bool(value):
+    lowered = value.lower()
+    if lowered in ('1', 'true'):
+        return True
+    if lowered in ('0', 'false'):
+        return False
+    raise FilterError("Valeur booléenne invalide (true ou false)")
+
+
+def _int(value, label):
+    try:
+        return int(value)
+    except ValueError:
+        raise FilterError(f"{label} doit être un entier")
+
+
+def _decimal(value, label):
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise FilterError(f"{label} doit être un nombre")
+    # NaN et Infinity sont des Decimal valides, mais pas des montants
+    if not number.is_finite():
+        raise FilterError(f"{label} doit être un nombre")
+    return number
+
+
+def prefix_range(field, prefix):
+    """
+    Condition « commence par » exprimée comme un intervalle de chaînes,
+    utilisable par un index B-tree ordinaire quel que soit le moteur.
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+def date_bounds(start_date=None, end_date=None):
+    """Intervalle [début du premier jour, début du lendemain du dernier jour[ sur start_time"""
+    condition = Q()
+    if start_date is not None:
+        condition &= Q(start_time__gte=day_start(start_date))
+    if end_date is not None:
+        condition &= Q(start_time__lt=day_start(end_date + timedelta(days=1)))
+    return condition
+
+
+def _station_type(value):
+    if value not in dict(Station.TYPE_CHOICES):
+        raise FilterError("Le type doit être 'PC' ou 'console'")
+    return Q(station__type=value)
+
+
+def _date_filter(value):
+    day = _date(value)
+    return date_bounds(day, day)
+
+
+SESSION_FILTERS = {
+    # paramètre : (description, constructeur de condition)
+    'player_id': ("ID du joueur", lambda value: Q(player_id=_uuid(value, "ID de joueur"))),
+    'player': (
+        "Début du nom d'utilisateur du joueur",
+        lambda value: prefix_range('player__username', value) if value else Q(),
+    ),
+    'date': ("Jour de début (YYYY-MM-DD)", _date_filter),
+    'start_date': ("Début au plus tôt ce jour (YYYY-MM-DD)", lambda value: date_bounds(start_date=_date(value))),
+    'end_date': ("Début au plus tard ce jour (YYYY-MM-DD)", lambda value: date_bounds(end_date=_date(value))),
+    'station_id': ("ID de la station", lambda value: Q(station_id=_uuid(value, "ID de station"))),
+    'station_type': ("Type de station (PC ou console)", _station_type),
+    'is_active': ("Sessions actives (true) ou terminées (false)", lambda value: Q(is_active=_bool(value))),
+    'min_cost': ("Coût minimal", lambda value: Q(cost__gte=_decimal(value, "min_cost"))),
+    'max_cost': ("Coût maximal", lambda value: Q(cost__lte=_decimal(value, "max_cost"))),
+    'min_duration': ("Durée minimale (minutes)", lambda value: Q(duration__gte=_int(value, "min_duration"))),
+    'max_duration': ("Durée maximale (minutes)", lambda value: Q(duration__lte=_int(value, "max_duration"))),
+}
+
+
+def session_filters(params):
+    """
+    Combine les filtres présents dans `params` (QueryDict ou dict) en une
+    seule condition. Lève FilterError si un paramètre est invalide.
+    """
+    condition = Q()
+    for name, (_, build) in SESSION_FILTERS.items():
+        value = params.get(name)
+        if value is not None and value != '':
+            condition &= build(value)
+    return condition
+
+
+def filter_sessions(queryset, params, user=None):
+    """Applique les filtres de `params` et la restriction d'un joueur à ses propres sessions"""
+    queryset = queryset.filter(session_filters(params))
+    if user is not None and user.role == 'player':
+        queryset = queryset.filter(player=user)
+    return queryset
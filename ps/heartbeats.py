@@ -0,0 +1,120 @@
+"""
+Réception des signaux de vie (heartbeats) des agents de station.
+
+Les agents envoient leur état toutes les quelques secondes. Plutôt qu'une
+écriture par signal, le tampon ne garde que le dernier état de chaque
+station et l'écrit par lot toutes les HEARTBEAT_FLUSH_INTERVAL secondes.
+L'écriture est conditionnelle : avec plusieurs processus, un signal plus
+ancien que celui déjà enregistré ne fait pas reculer last_seen_at.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, CharField, DateTimeField, F, Q, Value, When
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatBuffer:
+    """Dernier état connu par station, en attente d'écriture"""
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def _flush_interval(self):
+        if self.interval is not None:
+            return self.interval
+        return getattr(settings, 'HEARTBEAT_FLUSH_INTERVAL', 5)
+
+    def record(self, station_id, seen_at, agent_status=''):
+        """Enregistre un signal ; un signal plus ancien que celui en attente est ignoré"""
+        with self._lock:
+            current = self._pending.get(station_id)
+            if current is None or seen_at >= current[0]:
+                self._pending[station_id] = (seen_at, agent_status)
+            self._schedule()
+
+    def _schedule(self):
+        # Appelé sous self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(self._flush_interval(), self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending(self):
+        """Nombre de stations en attente d'écriture"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Écrit les états en attente par mises à jour groupées et retourne leur nombre"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        try:
+            items = list(pending.items())
+            for start in range(0, len(items), 500):
+                self._write(items[start:start + 500])
+        except Exception:
+            self._restore(pending)
+            raise
+        return len(pending)
+
+    @staticmethod
+    def _write(items):
+        from .models import Station
+
+        # Une station inconnue ne met aucune ligne à jour ; un état déjà plus récent est conservé
+        newer = [
+            (Q(pk=station_id) & (Q(last_seen_at__isnull=True) | Q(last_seen_at__lt=seen_at)), seen_at, agent_status)
+            for station_id, (seen_at, agent_status) in items
+        ]
+        Station.objects.filter(pk__in=[station_id for station_id, _ in items]).update(
+            last_seen_at=Case(
+                *[When(condition, then=Value(seen_at)) for condition, seen_at, _ in newer],
+                default=F('last_seen_at'), output_field=DateTimeField(),
+            ),
+            agent_status=Case(
+                *[When(condition, then=Value(agent_status)) for condition, _, agent_status in newer],
+                default=F('agent_status'), output_field=CharField(),
+            ),
+        )
+
+    def _restore(self, pending):
+        """Remet en attente un lot dont l'écriture a échoué, sans écraser les signaux plus récents"""
+        with self._lock:
+            for station_id, (seen_at, agent_status) in pending.items():
+                current = self._pending.get(station_id)
+                if current is None or seen_at > current[0]:
+                    self._pending[station_id] = (seen_at, agent_status)
+            # Nouvelle tentative au prochain intervalle
+            self._schedule()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Échec de l'écriture des signaux de vie des stations")
+        finally:
+            # Chaque écriture tourne dans un nouveau thread de minuteur : sa connexion
+            # doit être fermée même si CONN_MAX_AGE la rend persistante
+            connections.close_all()
+
+
+heartbeat_buffer = HeartbeatBuffer()
+
+# Ne pas perdre les derniers signaux à l'arrêt du processus
+atexit.register(heartbeat_buffer._flush_from_timer)
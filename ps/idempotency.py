@@ -0,0 +1,129 @@
+"""
+Clés d'idempotence (en-tête Idempotency-Key) des opérations rejouées par les clients.
+
+La première requête portant une clé est exécutée normalement ; sa réponse
+(code, type et corps) est conservée dans la table IdempotencyKey pendant
+IDEMPOTENCY_KEY_TTL secondes, partagée par tous les processus. Une nouvelle
+tentative avec la même clé reçoit la réponse conservée, sans réexécuter la
+vue ni toucher aux sessions et stations. La clé est propre à l'utilisateur et
+à la route :
+
+- même clé, corps différent : 422, la clé ne peut pas servir à autre chose ;
+- même clé pendant que la première requête s'exécute encore : 409 ;
+- les erreurs serveur (5xx) ne sont pas conservées : la tentative suivante
+  exécute de nouveau la vue.
+
+La ligne insérée à l'arrivée de la première requête sert de verrou ; la
+commande purge_idempotency_keys supprime les clés expirées.
+"""
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from drf_yasg import openapi
+
+from .models import IdempotencyKey
+from .utils import ErrorResponse
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Durée (secondes) au-delà de laquelle une requête en cours est considérée comme abandonnée
+IN_FLIGHT_TIMEOUT = 60
+
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    name=HEADER,
+    in_=openapi.IN_HEADER,
+    description="Clé unique de l'opération : une nouvelle tentative avec la même clé rejoue la première réponse",
+    type=openapi.TYPE_STRING,
+    required=False
+)
+
+
+def _key_hash(request, key):
+    scope = f"{request.user.pk}:{request.method}:{request.path}:{key}"
+    return hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        return ErrorResponse.unprocessable("Cette clé d'idempotence a déjà servi pour une autre requête")
+    response = HttpResponse(bytes(stored.body), status=stored.status, content_type=stored.content_type or None)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(key_hash, fingerprint, now):
+    """
+    Réserve la clé pour la requête courante ; retourne None si elle lui revient,
+    sinon la ligne existante (réponse conservée ou requête en cours)
+    """
+    in_flight = dict(fingerprint=fingerprint, status=None, content_type='', body=b'',
+                     expires_at=now + timedelta(seconds=IN_FLIGHT_TIMEOUT))
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(key_hash=key_hash, **in_flight)
+        return None
+    except IntegrityError:
+        pass
+    stored = IdempotencyKey.objects.filter(key_hash=key_hash).first()
+    if stored is not None and stored.expires_at > now:
+        return stored
+    if stored is not None:
+        # Réponse expirée ou requête abandonnée : la première requête qui la remplace reprend la clé
+        if IdempotencyKey.objects.filter(key_hash=key_hash, expires_at=stored.expires_at).update(**in_flight):
+            return None
+    # Clé purgée ou reprise entre-temps par une autre requête : traitée comme en cours
+    return IdempotencyKey(key_hash=key_hash, fingerprint=fingerprint)
+
+
+def purge_expired_keys(batch_size=1000):
+    """Supprime par lots les clés expirées ; retourne leur nombre"""
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+    deleted = 0
+    while True:
+        hashes = list(expired.order_by('expires_at').values_list('key_hash', flat=True)[:batch_size])
+        if not hashes:
+            return deleted
+        deleted += expired.filter(key_hash__in=hashes).delete()[0]
+
+
+def idempotent(view_method):
+    """Décorateur de méthode d'APIView honorant l'en-tête Idempotency-Key"""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return ErrorResponse.bad_request(f"{HEADER} ne doit pas dépasser {MAX_KEY_LENGTH} caractères")
+
+        key_hash = _key_hash(request, key)
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        stored = _claim(key_hash, fingerprint, timezone.now())
+        if stored is not None:
+            if stored.status is None:
+                return ErrorResponse.conflict("Une requête avec cette clé d'idempotence est en cours")
+            return _replay(stored, fingerprint)
+
+        pending = IdempotencyKey.objects.filter(key_hash=key_hash, status__isnull=True)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            pending.delete()
+            raise
+        if response.status_code < 500 and not response.streaming:
+            pending.update(
+                status=response.status_code,
+                content_type=response.get('Content-Type', ''),
+                body=response.content,
+                expires_at=timezone.now() + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)),
+            )
+        else:
+            pending.delete()
+        return response
+    return wrapper
@@ -0,0 +1,180 @@
+"""
+File d'attente locale des rapports lourds, sans courtier externe.
+
+Les travaux sont des lignes ReportJob : l'API les crée (pending), la
+commande run_report_jobs les réclame par SELECT ... FOR UPDATE SKIP LOCKED,
+les calcule dans un pool de processus et écrit le résultat en JSON dans
+REPORT_JOBS_DIR. Un résultat terminé est réutilisé pour les mêmes
+paramètres : indéfiniment si la période est close, REPORT_JOB_RESULT_TTL
+secondes si elle inclut aujourd'hui.
+"""
+import hashlib
+import json
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ReportJob
+
+
+def _period(params):
+    return date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date'])
+
+
+def _revenue(params):
+    from .reports import revenue_report
+    return revenue_report(*_period(params))
+
+
+def _usage(params):
+    from .reports import usage_report
+    return usage_report(*_period(params))
+
+
+def _utilization(params):
+    from .analytics import utilization_report
+    return utilization_report(*_period(params), group_by=params.get('group_by') or 'type')
+
+
+def _heatmap(params):
+    from .analytics import heatmap_report
+    return heatmap_report(*_period(params), station_type=params.get('station_type') or None)
+
+
+def _station_revenue(params):
+    # Déjà exécuté dans un processus du pool : les tranches mensuelles sont calculées en série
+    from .reports import station_revenue_report
+    return station_revenue_report(*_period(params))
+
+
+def _session_snapshot(params):
+    from .snapshots import export_sessions
+    return export_sessions(full=params.get('full', False))
+
+
+# rapport : fonction de calcul (paramètres JSON -> résultat sérialisable)
+REPORTS = {
+    'revenue': _revenue,
+    'usage': _usage,
+    'utilization': _utilization,
+    'heatmap': _heatmap,
+    'station_revenue': _station_revenue,
+    'session_snapshot': _session_snapshot,
+}
+
+
+def jobs_dir():
+    return Path(getattr(settings, 'REPORT_JOBS_DIR', Path(settings.BASE_DIR) / 'report_jobs'))
+
+
+def params_hash(report, params):
+    """Empreinte stable d'un rapport et de ses paramètres"""
+    payload = json.dumps({'report': report, 'params': params}, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def result_path(job):
+    return jobs_dir() / job.result_file
+
+
+def _reusable(job, now):
+    if not job.result_file or not result_path(job).exists():
+        return False
+    end_date = job.params.get('end_date')
+    if end_date and date.fromisoformat(end_date) < timezone.localdate(now):
+        return True
+    ttl = getattr(settings, 'REPORT_JOB_RESULT_TTL', 300)
+    return job.finished_at is not None and job.finished_at >= now - timedelta(seconds=ttl)
+
+
+def enqueue(report, params, user=None, refresh=False):
+    """
+    Retourne le travail à suivre pour ce rapport : un résultat terminé
+    réutilisable, un travail identique encore en file, ou un nouveau travail.
+    """
+    if report not in REPORTS:
+        raise ValueError(f"Rapport inconnu : {report}")
+    digest = params_hash(report, params)
+    now = timezone.now()
+
+    if not refresh:
+        existing = ReportJob.objects.filter(params_hash=digest).exclude(status='failed').order_by('-created_at')
+        for job in existing[:5]:
+            if job.status in ('pending', 'running') or _reusable(job, now):
+                return job
+
+    return ReportJob.objects.create(report=report, params=params, params_hash=digest, created_by=user)
+
+
+def claim_jobs(limit):
+    """Réclame jusqu'à `limit` travaux en attente ; plusieurs workers ne prennent jamais le même"""
+    with transaction.atomic():
+        jobs = list(
+            ReportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('created_at')[:limit]
+        )
+        if jobs:
+            now = timezone.now()
+            ReportJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status='running', started_at=now, heartbeat_at=now
+            )
+    return jobs
+
+
+def heartbeat(job_ids):
+    """Signale que les travaux `job_ids` sont toujours en cours de calcul par ce worker"""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return 0
+    return ReportJob.objects.filter(pk__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+
+def requeue_stale(seconds):
+    """
+    Remet en file les travaux « en cours » sans signal de vie depuis `seconds`
+    secondes (worker arrêté) ; un calcul long dont le worker tourne encore
+    n'est pas repris.
+    """
+    limit = timezone.now() - timedelta(seconds=seconds)
+    return (
+        ReportJob.objects
+        .filter(status='running', heartbeat_at__lt=limit)
+        .update(status='pending', started_at=None, heartbeat_at=None)
+    )
+
+
+def compute(job_id, report, params, digest):
+    """
+    Exécuté dans un processus du pool (ps.workers) : calcule le rapport et
+    l'écrit de façon atomique (fichier temporaire puis renommage).
+    Retourne le nom du fichier.
+    """
+    result = REPORTS[report](params)
+    directory = jobs_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    filename = f"{report}-{digest}.json"
+    temporary = directory / f".{filename}.{job_id}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as output:
+        json.dump(result, output, cls=DjangoJSONEncoder)
+    os.replace(temporary, directory / filename)
+    return filename
+
+
+def finish_job(job, future):
+    """Enregistre l'issue d'un calcul du pool"""
+    try:
+        filename = future.result()
+    except Exception as e:
+        ReportJob.objects.filter(pk=job.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+        return False
+    ReportJob.objects.filter(pk=job.pk).update(
+        status='done', result_file=filename, error='', finished_at=timezone.now()
+    )
+    return True
@@ -0,0 +1,130 @@
+"""
+Classement des joueurs (programme de fidélité).
+
+- « depuis toujours » : compteurs PlayerStats, ORDER BY ... LIMIT sur index ;
+- mois calendaires entiers (dont « ce mois-ci ») : compteurs PlayerMonthlyStats ;
+- période quelconque : requête groupée ORDER BY ... LIMIT sur les sessions.
+  Si la période couvre à la fois la table chaude et l'archive, les cumuls
+  des deux stockages sont fusionnés puis les meilleurs retenus par heapq.
+
+Les résultats sont mis en cache par fenêtre pendant LEADERBOARD_CACHE_TTL secondes.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import ArchivedSession, PlayerMonthlyStats, PlayerStats, Session
+from .reports import closed_sessions, day_start
+
+
+METRICS = {
+    'time': 'total_minutes',
+    'spend': 'total_spent',
+}
+SESSION_FIELDS = {
+    'total_minutes': 'duration',
+    'total_spent': 'cost',
+}
+MAX_LIMIT = 100
+
+
+def _is_whole_months(start_date, end_date):
+    """
+    Vrai si [start_date, end_date] couvre exactement des mois calendaires ; le
+    mois en cours compte comme entier jusqu'à aujourd'hui (« ce mois-ci »).
+    """
+    month_end = (end_date + timedelta(days=1)).day == 1 or end_date >= timezone.localdate()
+    return start_date.day == 1 and month_end
+
+
+def _rows(queryset, value, sessions, limit):
+    """Cumuls par joueur triés par valeur décroissante (limit=None : tous)"""
+    rows = (
+        queryset
+        .order_by()
+        .values('player_id', username=F('player__username'))
+        .annotate(value=value, sessions=sessions)
+        .order_by('-value', 'player_id')
+    )
+    return list(rows[:limit] if limit else rows)
+
+
+def _from_sessions(field, start_date, end_date, limit):
+    start = day_start(start_date)
+    end = day_start(end_date + timedelta(days=1))
+    session_field = SESSION_FIELDS[field]
+
+    stores = [
+        queryset for queryset in (
+            closed_sessions(model, start, end).filter(player__role='player')
+            for model in (Session, ArchivedSession)
+        )
+        if queryset.exists()
+    ]
+    if not stores:
+        return []
+    if len(stores) == 1:
+        return _rows(stores[0], Sum(session_field), Count('id'), limit)
+
+    # Un joueur peut avoir des sessions dans les deux stockages : un LIMIT par
+    # stockage serait faux, on fusionne donc les cumuls complets
+    merged = {}
+    for queryset in stores:
+        for row in _rows(queryset, Sum(session_field), Count('id'), None):
+            current = merged.setdefault(row['player_id'], {**row, 'value': 0, 'sessions': 0})
+            current['value'] += row['value'] or 0
+            current['sessions'] += row['sessions']
+    return heapq.nlargest(limit, merged.values(), key=lambda row: row['value'])
+
+
+def top_players(metric='spend', start_date=None, end_date=None, limit=10):
+    """
+    Meilleurs joueurs selon `metric` (time ou spend) sur la période donnée
+    (bornes incluses), ou depuis toujours si aucune période n'est donnée.
+    """
+    field = METRICS[metric]
+    limit = max(1, min(limit, MAX_LIMIT))
+    window = f"{start_date:%Y-%m-%d}:{end_date:%Y-%m-%d}" if start_date else 'all'
+    cache_key = f"top-players:{metric}:{window}:{limit}"
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if start_date is None:
+        source = 'lifetime'
+        rows = _rows(
+            PlayerStats.objects.filter(player__role='player'), F(field), F('session_count'), limit
+        )
+    elif _is_whole_months(start_date, end_date):
+        source = 'monthly'
+        rows = _rows(
+            PlayerMonthlyStats.objects.filter(player__role='player', month__gte=start_date, month__lte=end_date),
+            Sum(field), Sum('session_count'), limit
+        )
+    else:
+        source = 'sessions'
+        rows = _from_sessions(field, start_date, end_date, limit)
+
+    result = {
+        'metric': metric,
+        'start_date': start_date.strftime('%Y-%m-%d') if start_date else None,
+        'end_date': end_date.strftime('%Y-%m-%d') if end_date else None,
+        'source': source,
+        'players': [
+            {
+                'rank': rank,
+                'player_id': str(row['player_id']),
+                'username': row['username'],
+                'value': round(float(row['value'] or 0), 2),
+                'session_count': row['sessions'],
+            }
+            for rank, row in enumerate(rows, start=1)
+        ],
+    }
+    cache.set(cache_key, result, getattr(settings, 'LEADERBOARD_CACHE_TTL', 30))
+    return result
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ps.archive import archive_cutoff, archivable_sessions, archive_sessions
+
+
+class Command(BaseCommand):
+    """Archive les sessions terminées plus anciennes que l'horizon configuré"""
+
+    help = "Déplace les sessions terminées anciennes vers la table ArchivedSession par lots transactionnels"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.SESSION_ARCHIVE_AFTER_DAYS,
+            help="Horizon en jours : les sessions terminées avant cette limite sont archivées"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.SESSION_ARCHIVE_BATCH_SIZE,
+            help="Nombre de sessions déplacées par transaction"
+        )
+        parser.add_argument('--max-batches', type=int, default=None, help="Nombre maximal de lots à traiter")
+        parser.add_argument('--dry-run', action='store_true', help="Affiche le nombre de sessions concernées sans rien modifier")
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+
+        if options['dry_run']:
+            count = archivable_sessions(cutoff).count()
+            self.stdout.write(f"{count} session(s) terminée(s) avant le {cutoff:%Y-%m-%d %H:%M} seraient archivées")
+            return
+
+        archived = archive_sessions(
+            cutoff=cutoff,
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{archived} session(s) archivée(s) (avant le {cutoff:%Y-%m-%d %H:%M})"))
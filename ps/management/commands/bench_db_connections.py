@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+
+class Command(BaseCommand):
+    """Mesure le coût par requête de l'ouverture des connexions à la base"""
+
+    help = (
+        "Compare le coût par requête HTTP simulée avec des connexions ouvertes "
+        "à chaque requête (CONN_MAX_AGE=0) et des connexions persistantes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Nombre de requêtes simulées")
+        parser.add_argument('--database', default='default', help="Alias de la base à mesurer")
+        parser.add_argument('--max-age', type=int, default=60, help="CONN_MAX_AGE du scénario persistant")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        count = options['requests']
+        connection = connections[alias]
+        original_max_age = connection.settings_dict.get('CONN_MAX_AGE', 0)
+
+        self.stdout.write(f"Base : {connection.vendor} ({alias}), {count} requêtes simulées")
+
+        try:
+            before = self._run(connection, count, max_age=0)
+            after = self._run(connection, count, max_age=options['max_age'])
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = original_max_age
+            connection.close()
+
+        self.stdout.write(f"  Connexion par requête (CONN_MAX_AGE=0)   : {before * 1000:.3f} ms/requête")
+        self.stdout.write(f"  Connexion persistante (CONN_MAX_AGE={options['max_age']}) : {after * 1000:.3f} ms/requête")
+        if after > 0:
+            self.stdout.write(self.style.SUCCESS(f"  Gain : x{before / after:.1f}"))
+
+    def _run(self, connection, count, max_age):
+        """Simule `count` cycles requête/réponse et retourne la durée moyenne d'un cycle"""
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+        started = time.perf_counter()
+        for _ in range(count):
+            # Reproduit le cycle de vie d'une requête Django : les signaux
+            # request_started/request_finished déclenchent close_old_connections
+            request_started.send(sender=self.__class__)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            request_finished.send(sender=self.__class__)
+        elapsed = time.perf_counter() - started
+
+        return elapsed / count
@@ -0,0 +1,107 @@
+import os
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ps.models import Session, Station, User
+from ps.reports import day_start, month_shards, station_revenue_report
+
+
+BENCH_PREFIX = 'bench-shard'
+
+
+class Command(BaseCommand):
+    """Mesure le gain du calcul par tranches mensuelles en parallèle"""
+
+    help = (
+        "Compare station_revenue_report en série et réparti par mois sur un pool de processus. "
+        "--generate crée d'abord des sessions de test étalées sur --years années (--cleanup les supprime)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=3, help="Profondeur de la période mesurée (années)")
+        parser.add_argument('--generate', type=int, default=0, help="Nombre de sessions de test à créer")
+        parser.add_argument('--stations', type=int, default=20, help="Stations de test à créer avec --generate")
+        parser.add_argument(
+            '--workers', type=int, nargs='+',
+            help="Nombres de processus à mesurer (défaut : 2, 4... jusqu'au nombre de cœurs)"
+        )
+        parser.add_argument('--repeat', type=int, default=3, help="Mesures par scénario (la meilleure est retenue)")
+        parser.add_argument('--cleanup', action='store_true', help="Supprime les données de test puis s'arrête")
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            Session.objects.filter(player__username__startswith=BENCH_PREFIX).delete()
+            Station.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS("Données de test supprimées"))
+            return
+
+        end_date = timezone.localdate() - timedelta(days=1)
+        start_date = end_date - timedelta(days=365 * options['years'] - 1)
+        if options['generate']:
+            self._generate(options['generate'], options['stations'], start_date, end_date)
+
+        cores = os.cpu_count() or 1
+        workers = options['workers'] or [count for count in (2, 4, 8, 16) if count <= cores] or [2]
+        shards = len(month_shards(start_date, end_date))
+        self.stdout.write(f"Période : {start_date} → {end_date} ({shards} tranches mensuelles, {cores} cœur(s))")
+
+        reference, sequential = self._measure(start_date, end_date, 1, options['repeat'])
+        self.stdout.write(f"  En série            : {sequential:.3f} s")
+        for count in workers:
+            result, elapsed = self._measure(start_date, end_date, count, options['repeat'])
+            if result != reference:
+                self.stderr.write(self.style.ERROR(f"  Résultat différent avec {count} processus"))
+            self.stdout.write(f"  {count:>2} processus        : {elapsed:.3f} s (x{sequential / elapsed:.2f})")
+
+    def _measure(self, start_date, end_date, workers, repeat):
+        best = None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            result = station_revenue_report(start_date, end_date, workers=workers)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    @transaction.atomic
+    def _generate(self, count, station_count, start_date, end_date):
+        rng = random.Random(0)
+        player, _ = User.objects.get_or_create(username=f'{BENCH_PREFIX}-player', defaults={'role': 'player'})
+        stations = [
+            Station.objects.get_or_create(
+                name=f'{BENCH_PREFIX}-{index}', defaults={'type': 'PC' if index % 2 else 'console'}
+            )[0]
+            for index in range(station_count)
+        ]
+        first = day_start(start_date)
+        span = (end_date - start_date).days * 86400
+        batch = []
+        for _ in range(count):
+            start = first + timedelta(seconds=rng.randrange(span))
+            duration = rng.randint(15, 240)
+            batch.append(Session(
+                player=player,
+                station=rng.choice(stations),
+                end_time=start + timedelta(minutes=duration),
+                duration=duration,
+                cost=Decimal(duration * 10),
+                is_active=False,
+            ))
+            if len(batch) == 5000:
+                Session.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Session.objects.bulk_create(batch)
+        # start_time est renseigné à l'insertion (auto_now_add) : le recaler sur la fin
+        for duration in range(15, 241):
+            Session.objects.filter(player=player, duration=duration).update(
+                start_time=F('end_time') - timedelta(minutes=duration)
+            )
+        self.stdout.write(f"{count} session(s) de test créée(s)")
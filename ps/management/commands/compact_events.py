@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ps.events import COMPACTED_TOPICS, compact_events, purge_events, undelivered_events
+
+
+class Command(BaseCommand):
+    """Applique la conservation et le compactage du journal des changements"""
+
+    help = (
+        "Supprime les événements plus anciens que la durée de conservation, puis compacte les "
+        "événements d'état (statut des stations, tarifs) en ne gardant que le dernier par entité. "
+        "Les événements pas encore livrés à un abonnement webhook actif sont conservés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.EVENT_RETENTION_DAYS,
+            help="Durée de conservation en jours"
+        )
+        parser.add_argument(
+            '--compact-after', type=int, default=24,
+            help="Compacte les événements d'état plus anciens que ce nombre d'heures (0 : pas de compactage)"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Événements supprimés par requête")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        before = now - timedelta(days=options['days'])
+        purged = purge_events(before, batch_size=options['batch_size'])
+        self.stdout.write(f"{purged} événement(s) de plus de {options['days']} jour(s) supprimé(s)")
+        kept, first, last = undelivered_events(before)
+        if kept:
+            self.stdout.write(self.style.WARNING(
+                f"{kept} événement(s) expiré(s) conservé(s) (identifiants {first} à {last}) : "
+                "pas encore livrés à tous les abonnements webhook actifs"
+            ))
+
+        if options['compact_after']:
+            compacted = compact_events(now - timedelta(hours=options['compact_after']))
+            self.stdout.write(
+                f"{compacted} événement(s) remplacé(s) supprimé(s) ({', '.join(COMPACTED_TOPICS)})"
+            )
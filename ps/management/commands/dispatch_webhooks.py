@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ps.webhooks import dispatch_once
+
+
+class Command(BaseCommand):
+    """Livre les événements du journal aux abonnements webhook"""
+
+    help = (
+        "Envoie par lots les événements du journal aux abonnements webhook actifs, avec nouvelles "
+        "tentatives à attente exponentielle. Sans --once, tourne en continu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vide les lots en attente puis s'arrête (cron)")
+        parser.add_argument('--workers', type=int, default=4, help="Envois simultanés (un par abonnement)")
+        parser.add_argument('--poll', type=float, default=1, help="Attente (secondes) quand rien n'est à livrer")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                stats = dispatch_once(max_workers=options['workers'])
+                if stats['delivered'] or stats['failed']:
+                    self.stdout.write(
+                        f"{timezone.now():%H:%M:%S} {stats['events']} événement(s) livré(s) en "
+                        f"{stats['delivered']} lot(s), {stats['failed']} échec(s)"
+                    )
+                if stats['delivered']:
+                    # D'autres lots peuvent attendre : enchaîner sans pause
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            self.stdout.write("Répartiteur arrêté")
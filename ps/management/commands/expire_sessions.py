@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ps.scheduler import ExpiryScheduler
+
+
+class Command(BaseCommand):
+    """Termine automatiquement les sessions prépayées arrivées à échéance"""
+
+    help = (
+        "Termine les sessions prépayées dont l'heure de fin est passée et libère leurs stations. "
+        "Sans --once, tourne en continu et se réveille à chaque échéance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Traite les échéances passées puis s'arrête (cron)")
+        parser.add_argument(
+            '--refresh', type=float, default=300,
+            help="Intervalle (secondes) de reconstruction complète du tas depuis la base"
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1,
+            help="Intervalle (secondes) maximal de lecture du journal, pour suivre les nouvelles sessions"
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="Nombre de sessions terminées par transaction")
+
+    def handle(self, *args, **options):
+        scheduler = ExpiryScheduler()
+
+        if options['once']:
+            scheduler.load()
+            expired = scheduler.tick(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{expired} session(s) expirée(s)"))
+            return
+
+        refresh, poll = options['refresh'], options['poll']
+        self.stdout.write(f"Planificateur démarré (journal lu toutes les {poll:g} s, reconstruction toutes les {refresh:g} s)")
+        try:
+            while True:
+                tracked = scheduler.load()
+                reload_at = time.monotonic() + refresh
+
+                while time.monotonic() < reload_at:
+                    tracked += scheduler.follow()
+                    expired = scheduler.tick(batch_size=options['batch_size'])
+                    if expired:
+                        self.stdout.write(f"{timezone.now():%H:%M:%S} {expired} session(s) expirée(s) sur {tracked} suivie(s)")
+
+                    # Dormir jusqu'à la prochaine échéance, sans manquer une session
+                    # démarrée entre-temps (lecture du journal) ni la reconstruction
+                    next_expiry = scheduler.next_expiry()
+                    delay = min(reload_at - time.monotonic(), poll)
+                    if next_expiry is not None:
+                        delay = min(delay, (next_expiry - timezone.now()).total_seconds())
+                    time.sleep(max(delay, 0.05))
+        except KeyboardInterrupt:
+            self.stdout.write("Planificateur arrêté")
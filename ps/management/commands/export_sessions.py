@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ps.snapshots import FORMATS, SnapshotError, export_sessions, snapshot_dir
+
+
+class Command(BaseCommand):
+    """Exporte l'historique des sessions en fichiers colonnes partitionnés par mois"""
+
+    help = (
+        "Écrit les sessions (table chaude et archive, avec type de station et rôle du joueur) dans "
+        "SNAPSHOT_DIR/sessions, une partition par mois. Seuls les mois modifiés depuis le dernier "
+        "export sont réécrits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Réécrit tous les mois")
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS),
+            help="parquet (pyarrow) ou npy (NumPy, un fichier par colonne) ; par défaut parquet si pyarrow est installé"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            summary = export_sessions(full=options['full'], fmt=options['format'])
+        except SnapshotError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Export {summary['format']} dans {snapshot_dir()} : {len(summary['written'])} mois réécrit(s), "
+            f"{summary['unchanged']} inchangé(s), {len(summary['removed'])} supprimé(s), {summary['rows']} session(s)"
+        )
+        if summary['written']:
+            self.stdout.write(f"  Réécrits : {', '.join(summary['written'])}")
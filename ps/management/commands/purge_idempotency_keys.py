@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ps.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    """Supprime les clés d'idempotence expirées"""
+
+    help = (
+        "Supprime les clés d'idempotence dont la réponse a dépassé IDEMPOTENCY_KEY_TTL, ainsi que "
+        "celles des requêtes abandonnées en cours d'exécution."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Clés supprimées par requête")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys(batch_size=options['batch_size'])
+        self.stdout.write(f"{deleted} clé(s) d'idempotence expirée(s) supprimée(s)")
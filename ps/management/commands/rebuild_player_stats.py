@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ps.models import PlayerStats
+
+
+class Command(BaseCommand):
+    """Recalcule les statistiques cumulées des joueurs"""
+
+    help = (
+        "Recalcule entièrement la table PlayerStats à partir des sessions terminées et archivées "
+        "(après une reprise de données ou une correction manuelle)."
+    )
+
+    def handle(self, *args, **options):
+        players = PlayerStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Statistiques recalculées pour {players} joueur(s)"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from ps.models import User
+
+
+class Command(BaseCommand):
+    """Recalcule les noms normalisés servant à la recherche d'utilisateurs"""
+
+    help = (
+        "Recalcule les colonnes username_key, firstname_key et lastname_key de tous les utilisateurs "
+        "(après l'ajout de ces colonnes, un bulk_create ou une modification hors de User.save)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Utilisateurs mis à jour par requête")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['username_key', 'firstname_key', 'lastname_key']
+        updated = 0
+        batch = []
+        for user in User.objects.only('id', 'username', 'firstname', 'lastname', *fields).iterator(chunk_size=batch_size):
+            keys = [getattr(user, field) for field in fields]
+            user.update_search_keys()
+            if keys != [getattr(user, field) for field in fields]:
+                batch.append(user)
+            if len(batch) >= batch_size:
+                User.objects.bulk_update(batch, fields)
+                updated += len(batch)
+                batch = []
+        if batch:
+            User.objects.bulk_update(batch, fields)
+            updated += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Noms normalisés mis à jour pour {updated} utilisateur(s)"))
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ps.models import RateSettings
+from ps.pricing import recompute_costs
+from ps.reports import day_start
+
+
+class Command(BaseCommand):
+    """Recalcule le coût des sessions d'une période d'après l'historique des tarifs"""
+
+    help = (
+        "Recalcule le coût des sessions terminées ayant débuté entre --start et --end "
+        "(inclus) avec les versions de tarifs en vigueur à leur début"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="Date de début (YYYY-MM-DD)")
+        parser.add_argument('--end', required=True, help="Date de fin incluse (YYYY-MM-DD)")
+        parser.add_argument(
+            '--station-type', choices=[choice for choice, _ in RateSettings.STATION_TYPE_CHOICES if choice != 'all'],
+            help="Limiter le recalcul à un type de station"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Nombre de sessions par lot")
+
+    def handle(self, *args, **options):
+        try:
+            start_date = datetime.strptime(options['start'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(options['end'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("Format de date invalide. Utilisez YYYY-MM-DD")
+        if start_date > end_date:
+            raise CommandError("La date de début doit être antérieure à la date de fin")
+
+        stats = recompute_costs(
+            day_start(start_date),
+            day_start(end_date + timedelta(days=1)),
+            station_type=options['station_type'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['sessions']} session(s) recalculée(s) "
+            f"(mode {stats['mode']}, {stats['versions']} version(s) de tarif)"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from ps.reconcile import reconcile
+
+
+LABELS = {
+    'released_stations': "station(s) libérée(s) (session terminée ou absente)",
+    'occupied_stations': "station(s) repassée(s) en utilisation (session active)",
+    'ended_sessions': "session(s) orpheline(s) ou échue(s) terminée(s)",
+}
+
+
+class Command(BaseCommand):
+    """Répare les incohérences entre stations et sessions"""
+
+    help = (
+        "Détecte les stations et sessions incohérentes (station occupée par une session terminée, "
+        "session active sur une station libre...) et les corrige par mises à jour groupées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help="Ignore les sessions démarrées depuis moins de ce nombre de secondes"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Affiche les corrections sans rien modifier")
+
+    def handle(self, *args, **options):
+        found = reconcile(grace_seconds=options['grace'], dry_run=options['dry_run'])
+
+        if not any(found.values()):
+            self.stdout.write("Aucune incohérence")
+            return
+
+        prefix = "[simulation] " if options['dry_run'] else ""
+        for key, ids in found.items():
+            if ids:
+                self.stdout.write(f"{prefix}{len(ids)} {LABELS[key]} : {', '.join(str(pk) for pk in ids)}")
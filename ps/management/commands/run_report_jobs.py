@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ps.jobs import claim_jobs, finish_job, heartbeat, requeue_stale
+from ps.workers import compute_report, process_pool
+
+
+class Command(BaseCommand):
+    """Calcule les rapports mis en file par POST /api/reports/jobs/"""
+
+    help = (
+        "Réclame les rapports en attente dans la table ReportJob et les calcule dans un pool de "
+        "processus ; les résultats sont écrits dans REPORT_JOBS_DIR. Sans --once, tourne en continu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Nombre de processus de calcul")
+        parser.add_argument('--once', action='store_true', help="Traite les travaux en attente puis s'arrête (cron)")
+        parser.add_argument('--poll', type=float, default=2, help="Intervalle (secondes) de consultation de la file")
+        parser.add_argument(
+            '--stale', type=int, default=300,
+            help="Remet en file les travaux sans signal de vie de leur worker depuis ce nombre de secondes"
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        running = {}
+
+        with process_pool(workers) as pool:
+            try:
+                while True:
+                    # Signal de vie avant la reprise : les calculs longs de ce worker restent les siens
+                    heartbeat(job.pk for job in running.values())
+                    requeue_stale(options['stale'])
+                    for job in claim_jobs(workers - len(running)):
+                        future = pool.submit(compute_report, job.pk, job.report, job.params, job.params_hash)
+                        running[future] = job
+
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll'])
+                        continue
+
+                    done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = running.pop(future)
+                        outcome = "terminé" if finish_job(job, future) else "échoué"
+                        self.stdout.write(f"{timezone.now():%H:%M:%S} rapport {job.report} {job.pk} {outcome}")
+            except KeyboardInterrupt:
+                self.stdout.write("Worker arrêté")
@@ -0,0 +1,32 @@
+from .routers import _routing_state, RoutingState
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Active les lectures sur la réplique pour les vues qui le déclarent.
+
+    Une vue opte pour la réplique avec l'attribut de classe `read_replica = True`.
+    Seules les méthodes sûres (GET, HEAD) en profitent : les validations qui
+    précèdent une écriture doivent lire l'état à jour de la base principale.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _routing_state.set(state)
+        try:
+            request._routing_state = state
+            return self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        state = getattr(request, '_routing_state', None)
+        if state is not None and request.method in self.SAFE_METHODS:
+            state.use_replica = bool(getattr(view_class, 'read_replica', False))
+        return None
@@ -43,6 +43,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # Formes normalisées (minuscules, sans accents) pour la recherche (ps.search)
+    username_key = models.CharField(max_length=150, blank=True, default='', editable=False)
+    firstname_key = models.CharField(max_length=100, blank=True, default='', editable=False)
+    lastname_key = models.CharField(max_length=100, blank=True, default='', editable=False)
     
     objects = UserManager()
     
@@ -52,11 +56,34 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = _('utilisateur')
         verbose_name_plural = _('utilisateurs')
+        indexes = [
+            # Recherche par préfixe et liste paginée, éventuellement filtrée par rôle
+            models.Index(fields=['username_key'], name='user_username_key_idx'),
+            models.Index(fields=['firstname_key'], name='user_firstname_key_idx'),
+            models.Index(fields=['lastname_key'], name='user_lastname_key_idx'),
+            models.Index(fields=['role', 'username_key'], name='user_role_username_key_idx'),
+        ]
     
     def __str__(self):
         if self.firstname and self.lastname:
             return f"{self.firstname} {self.lastname} ({self.username})"
         return self.username
+    
+    def update_search_keys(self):
+        """Recalcule les formes normalisées des noms"""
+        from .search import normalize
+        
+        self.username_key = normalize(self.username)
+        self.firstname_key = normalize(self.firstname)
+        self.lastname_key = normalize(self.lastname)
+    
+    def save(self, *args, **kwargs):
+        """Enregistre l'utilisateur avec les formes normalisées de ses noms"""
+        self.update_search_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'username', 'firstname', 'lastname'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'username_key', 'firstname_key', 'lastname_key'}
+        super().save(*args, **kwargs)
 
 
 class Session(models.Model):
@@ -73,6 +100,17 @@ class Session(models.Model):
         verbose_name = _('session')
         verbose_name_plural = _('sessions')
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['player', 'is_active'], name='session_player_active_idx'),
+            models.Index(fields=['is_active', 'end_time'], name='session_active_end_idx'),
+            # Filtres de la liste des sessions (ps.filters)
+            models.Index(fields=['start_time'], name='session_start_idx'),
+            # Index partiel : seules les quelques sessions en cours y figurent
+            models.Index(fields=['start_time'], condition=models.Q(is_active=True), name='session_open_start_idx'),
+            models.Index(fields=['station', 'start_time'], name='session_station_start_idx'),
+            models.Index(fields=['cost'], name='session_cost_idx'),
+            models.Index(fields=['duration'], name='session_duration_idx'),
+        ]
     
     def __str__(self):
         return f"Session {self.id} - {self.player.username}"
@@ -85,40 +123,277 @@ class Session(models.Model):
         return None
     
     def calculate_cost(self):
-        """Calcule le coût de la session en fonction de sa durée"""
+        """Calcule le coût de la session en fonction de sa durée et des tarifs applicables"""
         if self.duration:
-            # Récupérer le tarif horaire applicable
-            if self.station:
-                hourly_rate = RateSettings.get_rate_for_station(self.station.type)
-            else:
-                # Utiliser le tarif par défaut si aucune station n'est associée
-                hourly_rate = RateSettings.get_rate_for_station('all')
+            from .pricing import get_schedule
             
-            # Coût = tarif horaire * (durée en minutes / 60)
-            return round(float(hourly_rate) * (self.duration / 60), 2)
+            # Utiliser le tarif par défaut si aucune station n'est associée
+            station_type = self.station.type if self.station else 'all'
+            return get_schedule().price(station_type, self.start_time, self.duration)
         return None
     
-    def end_session(self):
-        """Termine la session et calcule la durée et le coût"""
+    def end_session(self, end_time=None):
+        """Termine la session (maintenant, ou à `end_time`) et calcule la durée et le coût"""
+        from django.db import transaction
         from django.utils import timezone
         
         if self.is_active:
-            self.end_time = timezone.now()
-            self.is_active = False
-            self.duration = self.calculate_duration()
-            self.cost = self.calculate_cost()
-            
-            # Mettre à jour le statut de la station
-            if self.station:
-                self.station.status = 'available'
-                self.station.current_session = None
-                self.station.save()
-            
-            self.save()
+            with transaction.atomic():
+                # Verrou sur la session : deux fins simultanées ne la comptent qu'une fois
+                if not Session.objects.select_for_update().filter(pk=self.pk, is_active=True).exists():
+                    self.is_active = False
+                    return self
+                
+                self.end_time = end_time or timezone.now()
+                self.is_active = False
+                self.duration = self.calculate_duration()
+                self.cost = self.calculate_cost()
+                
+                # Mettre à jour le statut de la station
+                if self.station:
+                    self.station.status = 'available'
+                    self.station.current_session = None
+                    self.station.save()
+                
+                self.save()
+                PlayerStats.add_session(self)
+                
+                from .events import record_session
+                record_session('session.ended', self)
         
         return self
 
 
+class ArchivedSession(models.Model):
+    """Session terminée déplacée hors de la table chaude par l'archivage"""
+    
+    id = models.UUIDField(primary_key=True, editable=False)
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_sessions')
+    station = models.ForeignKey('Station', on_delete=models.SET_NULL, related_name='archived_sessions', null=True)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    duration = models.IntegerField(null=True, blank=True, help_text=_('Durée en minutes'))
+    cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    # Champs copiés depuis Session lors de l'archivage
+    ARCHIVED_FIELDS = ('id', 'player_id', 'station_id', 'start_time', 'end_time', 'duration', 'cost')
+    
+    class Meta:
+        verbose_name = _('session archivée')
+        verbose_name_plural = _('sessions archivées')
+        ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['end_time'], name='archived_session_end_idx'),
+            models.Index(fields=['player', 'start_time'], name='archived_player_start_idx'),
+            # Liste de l'administration, triée et filtrée par début
+            models.Index(fields=['start_time'], name='archived_session_start_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Session archivée {self.id}"
+
+
+def increment_counters(model, lookup, sessions, minutes, spent, **extra):
+    """
+    Ajoute des sessions aux compteurs d'une ligne par expressions F, en la
+    créant si elle n'existe pas encore. `extra` : autres champs à affecter.
+    """
+    from django.db import IntegrityError, transaction
+    
+    increments = {
+        'session_count': models.F('session_count') + sessions,
+        'total_minutes': models.F('total_minutes') + (minutes or 0),
+        'total_spent': models.F('total_spent') + (spent or 0),
+        **extra,
+    }
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                **lookup,
+                session_count=sessions,
+                total_minutes=minutes or 0,
+                total_spent=spent or 0,
+            )
+            if extra:
+                model.objects.filter(**lookup).update(**extra)
+    except IntegrityError:
+        # Ligne créée entre-temps par une autre transaction
+        model.objects.filter(**lookup).update(**increments)
+
+
+def month_of(moment):
+    """Premier jour du mois (fuseau local) d'un instant"""
+    from django.utils import timezone
+    
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+class PlayerStats(models.Model):
+    """
+    Cumuls d'un joueur sur ses sessions terminées, tenus à jour à chaque fin
+    de session par des expressions F (sans relire l'historique), avec leur
+    déclinaison mensuelle (PlayerMonthlyStats). La commande
+    rebuild_player_stats recalcule les deux entièrement.
+    """
+    
+    player = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    session_count = models.PositiveIntegerField(default=0)
+    total_minutes = models.PositiveBigIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_visit = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('statistiques joueur')
+        verbose_name_plural = _('statistiques joueurs')
+        indexes = [
+            # Classements « depuis toujours »
+            models.Index(fields=['-total_minutes'], name='player_stats_minutes_idx'),
+            models.Index(fields=['-total_spent'], name='player_stats_spent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Statistiques de {self.player.username}"
+    
+    @classmethod
+    def add(cls, player_id, sessions, minutes, spent, last_visit):
+        """Ajoute des sessions terminées aux cumuls d'un joueur, en créant la ligne si besoin"""
+        from django.db.models.functions import Coalesce, Greatest
+        
+        extra = {}
+        if last_visit is not None:
+            extra['last_visit'] = Greatest(Coalesce('last_visit', models.Value(last_visit)), models.Value(last_visit))
+        increment_counters(cls, {'player_id': player_id}, sessions, minutes, spent, **extra)
+    
+    @classmethod
+    def add_session(cls, session):
+        """Ajoute une session terminée aux cumuls de son joueur"""
+        cls.add(session.player_id, 1, session.duration, session.cost, session.end_time)
+        PlayerMonthlyStats.add(session.player_id, month_of(session.end_time), 1, session.duration, session.cost)
+    
+    @classmethod
+    def add_sessions(cls, queryset):
+        """Ajoute un ensemble de sessions terminées, agrégées par joueur (et par mois) en une requête"""
+        for row in cls.aggregate_by_player(queryset):
+            cls.add(row['player_id'], row['sessions'], row['minutes'], row['spent'], row['last_visit'])
+        for row in PlayerMonthlyStats.aggregate_by_month(queryset):
+            PlayerMonthlyStats.add(row['player_id'], row['month'], row['sessions'], row['minutes'], row['spent'])
+    
+    @classmethod
+    def add_spent(cls, changes):
+        """
+        Reporte des écarts de coût de sessions déjà comptées : `changes` est une
+        suite de (joueur, fin de session, écart), cumulés par joueur et par mois.
+        """
+        from collections import defaultdict
+        
+        totals, monthly = defaultdict(int), defaultdict(int)
+        for player_id, end_time, delta in changes:
+            totals[player_id] += delta
+            monthly[(player_id, month_of(end_time))] += delta
+        for player_id, delta in totals.items():
+            if delta:
+                cls.add(player_id, 0, 0, delta, None)
+        for (player_id, month), delta in monthly.items():
+            if delta:
+                PlayerMonthlyStats.add(player_id, month, 0, 0, delta)
+    
+    @staticmethod
+    def aggregate_by_player(queryset):
+        """Cumuls par joueur d'un ensemble de sessions terminées"""
+        return (
+            queryset
+            .order_by()
+            .values('player_id')
+            .annotate(
+                sessions=models.Count('id'),
+                minutes=models.Sum('duration'),
+                spent=models.Sum('cost'),
+                last_visit=models.Max('end_time'),
+            )
+        )
+    
+    @classmethod
+    def rebuild(cls):
+        """Recalcule tous les cumuls, globaux et mensuels, depuis les sessions terminées et archivées"""
+        from django.db import transaction
+        
+        totals, monthly = {}, {}
+        for queryset in (Session.objects.filter(is_active=False), ArchivedSession.objects.all()):
+            for row in cls.aggregate_by_player(queryset):
+                current = totals.setdefault(row['player_id'], cls(player_id=row['player_id'], total_spent=0))
+                current.session_count += row['sessions']
+                current.total_minutes += row['minutes'] or 0
+                current.total_spent += row['spent'] or 0
+                if row['last_visit'] and (current.last_visit is None or row['last_visit'] > current.last_visit):
+                    current.last_visit = row['last_visit']
+            for row in PlayerMonthlyStats.aggregate_by_month(queryset):
+                key = (row['player_id'], row['month'])
+                current = monthly.setdefault(key, PlayerMonthlyStats(
+                    player_id=row['player_id'], month=row['month'], total_spent=0
+                ))
+                current.session_count += row['sessions']
+                current.total_minutes += row['minutes'] or 0
+                current.total_spent += row['spent'] or 0
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(totals.values(), batch_size=1000)
+            PlayerMonthlyStats.objects.all().delete()
+            PlayerMonthlyStats.objects.bulk_create(monthly.values(), batch_size=1000)
+        return len(totals)
+
+
+class PlayerMonthlyStats(models.Model):
+    """Cumuls d'un joueur pour un mois calendaire (mois de fin des sessions)"""
+    
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_stats')
+    month = models.DateField(help_text=_('Premier jour du mois'))
+    session_count = models.PositiveIntegerField(default=0)
+    total_minutes = models.PositiveBigIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = _('statistiques mensuelles joueur')
+        verbose_name_plural = _('statistiques mensuelles joueurs')
+        constraints = [
+            models.UniqueConstraint(fields=['player', 'month'], name='player_monthly_stats_unique'),
+        ]
+        indexes = [
+            # Classements d'un mois : ORDER BY ... LIMIT sur l'index
+            models.Index(fields=['month', '-total_minutes'], name='player_month_minutes_idx'),
+            models.Index(fields=['month', '-total_spent'], name='player_month_spent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.month:%Y-%m}"
+    
+    @classmethod
+    def add(cls, player_id, month, sessions, minutes, spent):
+        """Ajoute des sessions terminées aux cumuls mensuels d'un joueur"""
+        increment_counters(cls, {'player_id': player_id, 'month': month}, sessions, minutes, spent)
+    
+    @staticmethod
+    def aggregate_by_month(queryset):
+        """Cumuls par joueur et par mois de fin d'un ensemble de sessions terminées"""
+        from django.db.models.functions import TruncMonth
+        
+        return (
+            queryset
+            .order_by()
+            .annotate(month=TruncMonth('end_time', output_field=models.DateField()))
+            .values('player_id', 'month')
+            .annotate(
+                sessions=models.Count('id'),
+                minutes=models.Sum('duration'),
+                spent=models.Sum('cost'),
+            )
+        )
+
+
 class Station(models.Model):
     TYPE_CHOICES = (
         ('console', 'Console'),
@@ -131,6 +406,12 @@ class Station(models.Model):
         ('maintenance', 'En maintenance'),
     )
     
+    AGENT_STATUS_CHOICES = (
+        ('idle', 'Au repos'),
+        ('busy', 'Occupé'),
+        ('error', 'En erreur'),
+    )
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=20, choices=TYPE_CHOICES)
@@ -142,15 +423,107 @@ class Station(models.Model):
         blank=True, 
         related_name='current_station'
     )
+    # Dernier signal de vie de l'agent installé sur la machine
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    agent_status = models.CharField(max_length=20, choices=AGENT_STATUS_CHOICES, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = _('station')
         verbose_name_plural = _('stations')
+        indexes = [
+            models.Index(fields=['type', 'status'], name='station_type_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.get_type_display()}) - {self.get_status_display()}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut lu en base, pour ne journaliser que les changements réels
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """Enregistre la station et journalise un changement de statut dans la même transaction"""
+        from django.db import transaction
+        from .events import record_station
+        
+        previous = None if self._state.adding else getattr(self, '_loaded_status', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous != self.status:
+                record_station(self, previous)
+        self._loaded_status = self.status
+
+
+class Reservation(models.Model):
+    """Réservation d'une station sur une plage horaire [start_time, end_time["""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    station = models.ForeignKey(Station, on_delete=models.CASCADE, related_name='reservations')
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='created_reservations'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('réservation')
+        verbose_name_plural = _('réservations')
+        ordering = ['start_time']
+        indexes = [
+            # Recherche de chevauchement : station puis début < fin demandée
+            models.Index(fields=['station', 'start_time', 'end_time'], name='reservation_station_period_idx'),
+            models.Index(fields=['start_time', 'end_time'], name='reservation_period_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_time__gt=models.F('start_time')),
+                name='reservation_end_after_start',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.station.name} : {self.start_time:%Y-%m-%d %H:%M} - {self.end_time:%H:%M}"
+    
+    @classmethod
+    def overlapping(cls, start, end):
+        """Réservations actives qui chevauchent [start, end["""
+        return cls.objects.filter(is_active=True, start_time__lt=end, end_time__gt=start)
+    
+    @classmethod
+    def book(cls, station, player, start, end, created_by=None):
+        """
+        Crée une réservation si la station est libre sur la plage demandée.
+        La station est verrouillée pendant la vérification ; sous PostgreSQL,
+        la contrainte d'exclusion garantit en plus l'absence de chevauchement.
+        """
+        from django.core.exceptions import ValidationError
+        from django.db import IntegrityError, transaction
+        
+        try:
+            with transaction.atomic():
+                Station.objects.select_for_update().filter(pk=station.pk).first()
+                if cls.overlapping(start, end).filter(station=station).exists():
+                    raise ValidationError(_("La station est déjà réservée sur cette plage horaire"))
+                return cls.objects.create(
+                    station=station,
+                    player=player,
+                    start_time=start,
+                    end_time=end,
+                    created_by=created_by,
+                )
+        except IntegrityError:
+            raise ValidationError(_("La station est déjà réservée sur cette plage horaire"))
 
 
 class RateSettings(models.Model):
@@ -176,6 +549,26 @@ class RateSettings(models.Model):
         help_text=_('Type de station auquel ce tarif s\'applique')
     )
     description = models.CharField(max_length=255, blank=True, null=True)
+    days_of_week = models.CharField(
+        max_length=7,
+        blank=True,
+        default='',
+        help_text=_('Jours d\'application (0=lundi … 6=dimanche), vide pour tous les jours')
+    )
+    period_start = models.TimeField(
+        null=True,
+        blank=True,
+        help_text=_('Début de la plage horaire (happy hour), vide pour toute la journée')
+    )
+    period_end = models.TimeField(
+        null=True,
+        blank=True,
+        help_text=_('Fin de la plage horaire, peut passer minuit (ex. 22:00 - 02:00)')
+    )
+    min_duration = models.PositiveIntegerField(
+        default=0,
+        help_text=_('Palier : le tarif s\'applique au-delà de ce nombre de minutes de session')
+    )
     created_by = models.ForeignKey(
         User, 
         on_delete=models.SET_NULL, 
@@ -195,18 +588,267 @@ class RateSettings(models.Model):
     def __str__(self):
         return f"Tarif: {self.hourly_rate} FCFA/h pour {self.get_station_type_display()}"
     
+    def save(self, *args, **kwargs):
+        """Enregistre le tarif et historise sa version dans la même transaction"""
+        from django.db import transaction
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            RateVersion.record(self)
+            
+            from .events import record_rate
+            record_rate(self)
+    
+    @property
+    def has_period(self):
+        """Indique si le tarif est restreint à certains jours ou heures"""
+        return bool(self.days_of_week) or self.period_start is not None
+    
     @classmethod
-    def get_rate_for_station(cls, station_type):
-        """Récupère le tarif horaire applicable pour un type de station donné"""
-        # Essayer d'abord de trouver un tarif spécifique pour ce type de station
-        specific_rate = cls.objects.filter(station_type=station_type, is_active=True).first()
-        if specific_rate:
-            return specific_rate.hourly_rate
-        
-        # Sinon, utiliser le tarif par défaut pour tous les types
-        default_rate = cls.objects.filter(station_type='all', is_active=True).first()
-        if default_rate:
-            return default_rate.hourly_rate
-        
-        # Si aucun tarif n'est défini, retourner une valeur par défaut
-        return 500.0  # 500 FCFA par défaut
+    def get_rate_for_station(cls, station_type, at=None):
+        """Récupère le tarif horaire applicable pour un type de station donné (maintenant ou à `at`)"""
+        from django.utils import timezone
+        from .pricing import get_schedule
+        
+        return get_schedule().rate_at(station_type, at or timezone.now())
+
+
+class RateVersion(models.Model):
+    """Version datée d'un paramètre tarifaire, valable sur [effective_from, effective_to["""
+    
+    # Champs tarifaires copiés depuis RateSettings à chaque version
+    PRICING_FIELDS = ('hourly_rate', 'station_type', 'days_of_week', 'period_start', 'period_end', 'min_duration')
+    
+    rate = models.ForeignKey(
+        RateSettings,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='versions'
+    )
+    hourly_rate = models.DecimalField(max_digits=10, decimal_places=2)
+    station_type = models.CharField(max_length=20, choices=RateSettings.STATION_TYPE_CHOICES)
+    days_of_week = models.CharField(max_length=7, blank=True, default='')
+    period_start = models.TimeField(null=True, blank=True)
+    period_end = models.TimeField(null=True, blank=True)
+    min_duration = models.PositiveIntegerField(default=0)
+    effective_from = models.DateTimeField()
+    effective_to = models.DateTimeField(null=True, blank=True, help_text=_('Vide pour la version en vigueur'))
+    
+    class Meta:
+        verbose_name = _('version de tarif')
+        verbose_name_plural = _('versions de tarifs')
+        ordering = ['-effective_from']
+        indexes = [
+            models.Index(fields=['station_type', 'effective_from', 'effective_to'], name='rate_version_effective_idx'),
+            models.Index(fields=['rate', 'effective_to'], name='rate_version_open_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hourly_rate} FCFA/h ({self.station_type}) depuis {self.effective_from:%Y-%m-%d %H:%M}"
+    
+    has_period = RateSettings.has_period
+    
+    @property
+    def updated_at(self):
+        # Départage des versions concurrentes : la plus récente l'emporte
+        return self.effective_from
+    
+    @property
+    def is_flat(self):
+        """Tarif permanent sans palier, calculable directement en SQL"""
+        return not self.has_period and not self.min_duration
+    
+    @classmethod
+    def effective_at(cls, moment):
+        """Versions en vigueur à un instant donné"""
+        return cls.objects.filter(effective_from__lte=moment).filter(
+            models.Q(effective_to__gt=moment) | models.Q(effective_to__isnull=True)
+        )
+    
+    @classmethod
+    def overlapping(cls, start, end):
+        """Versions en vigueur à un moment quelconque de [start, end["""
+        return cls.objects.filter(effective_from__lt=end).filter(
+            models.Q(effective_to__gt=start) | models.Q(effective_to__isnull=True)
+        )
+    
+    @classmethod
+    def record(cls, rate):
+        """Clôt la version ouverte d'un tarif et en ouvre une nouvelle si ses conditions ont changé"""
+        current = cls.objects.filter(rate=rate, effective_to__isnull=True).first()
+        values = {field: getattr(rate, field) for field in cls.PRICING_FIELDS}
+        
+        if current and rate.is_active and all(
+            getattr(current, field) == value for field, value in values.items()
+        ):
+            return current
+        
+        moment = rate.updated_at
+        if current:
+            current.effective_to = moment
+            current.save(update_fields=['effective_to'])
+        
+        if rate.is_active:
+            return cls.objects.create(rate=rate, effective_from=moment, **values)
+        return None
+    
+    @classmethod
+    def backfill(cls):
+        """Crée une version initiale pour les tarifs actifs qui n'en ont pas encore"""
+        missing = RateSettings.objects.filter(is_active=True, versions__isnull=True)
+        versions = [
+            cls(
+                rate=rate,
+                effective_from=rate.created_at,
+                **{field: getattr(rate, field) for field in cls.PRICING_FIELDS}
+            )
+            for rate in missing
+        ]
+        cls.objects.bulk_create(versions)
+        return len(versions)
+
+
+class ReportJob(models.Model):
+    """Rapport calculé en arrière-plan par la commande run_report_jobs (ps.jobs)"""
+    
+    STATUS_CHOICES = (
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échoué'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report = models.CharField(max_length=30)
+    params = models.JSONField(default=dict)
+    # Empreinte (rapport + paramètres) : un même calcul terminé est réutilisé
+    params_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    result_file = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='report_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Dernier signal de vie du worker qui calcule le rapport
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('rapport en arrière-plan')
+        verbose_name_plural = _('rapports en arrière-plan')
+        ordering = ['-created_at']
+        indexes = [
+            # File d'attente : plus anciens travaux en attente d'abord
+            models.Index(fields=['status', 'created_at'], name='report_job_queue_idx'),
+            models.Index(fields=['params_hash', 'status'], name='report_job_params_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Rapport {self.report} ({self.get_status_display()})"
+
+
+class Event(models.Model):
+    """
+    Journal des changements (ps.events), en ajout seul : l'identifiant
+    croissant sert de position de lecture aux consommateurs.
+    """
+    
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=50)
+    entity_id = models.CharField(max_length=36, blank=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('événement')
+        verbose_name_plural = _('événements')
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['topic', 'id'], name='event_topic_idx'),
+            # Compactage : dernier événement par sujet et entité
+            models.Index(fields=['topic', 'entity_id', 'id'], name='event_entity_idx'),
+            models.Index(fields=['created_at'], name='event_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.id} {self.topic} {self.entity_id}"
+
+
+class WebhookSubscription(models.Model):
+    """
+    Point de terminaison HTTP abonné au journal des changements ; la commande
+    dispatch_webhooks lui envoie les événements par lots (ps.webhooks).
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    url = models.URLField(max_length=500)
+    # Sujets du journal à transmettre (liste vide : tous)
+    topics = models.JSONField(default=list, blank=True)
+    # Clé de signature HMAC-SHA256 des envois (en-tête X-Webhook-Signature)
+    secret = models.CharField(max_length=100, blank=True)
+    batch_size = models.PositiveIntegerField(default=100)
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='webhook_subscriptions'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Position dans le journal : dernier événement livré
+    last_event_id = models.BigIntegerField(default=0)
+    # Nouvelle tentative après un échec (attente exponentielle)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    
+    # Mesures de livraison
+    delivered_events = models.PositiveBigIntegerField(default=0)
+    delivered_batches = models.PositiveBigIntegerField(default=0)
+    failed_attempts = models.PositiveBigIntegerField(default=0)
+    last_delivery_at = models.DateTimeField(null=True, blank=True)
+    last_status_code = models.PositiveIntegerField(null=True, blank=True)
+    last_latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        verbose_name = _('abonnement webhook')
+        verbose_name_plural = _('abonnements webhook')
+        ordering = ['created_at']
+    
+    def __str__(self):
+        return self.url
+
+
+class IdempotencyKey(models.Model):
+    """
+    Clé d'idempotence (en-tête Idempotency-Key) et réponse conservée de la
+    première requête qui l'a portée (ps.idempotency)
+    """
+    
+    # Empreinte (utilisateur, méthode, route, clé) : une même clé sert une fois par route
+    key_hash = models.CharField(max_length=64, primary_key=True)
+    # Empreinte du corps de la première requête
+    fingerprint = models.CharField(max_length=64)
+    # Code HTTP de la réponse ; vide tant que la première requête s'exécute
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    body = models.BinaryField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Fin de conservation de la réponse, ou abandon de la requête en cours
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = _("clé d'idempotence")
+        verbose_name_plural = _("clés d'idempotence")
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return self.key_hash
@@ -0,0 +1,55 @@
+"""
+Objets propres à PostgreSQL, installés après les migrations.
+
+Les migrations du projet sont générées localement (makemigrations) et
+doivent rester portables vers SQLite : ce qui n'a pas d'équivalent est
+donc créé ici, de façon idempotente, par un gestionnaire post_migrate.
+"""
+from django.db import connections
+
+
+RESERVATION_EXCLUSION = 'reservation_no_overlap'
+
+
+def _constraint_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [name])
+    return cursor.fetchone() is not None
+
+
+def install_reservation_exclusion(connection):
+    """Interdit en base deux réservations actives qui se chevauchent sur une même station"""
+    from .models import Reservation
+
+    table = connection.ops.quote_name(Reservation._meta.db_table)
+    with connection.cursor() as cursor:
+        # btree_gist permet de combiner l'égalité sur station_id et le chevauchement d'intervalles
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        if not _constraint_exists(cursor, RESERVATION_EXCLUSION):
+            cursor.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {RESERVATION_EXCLUSION} "
+                "EXCLUDE USING gist (station_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&) "
+                "WHERE (is_active)"
+            )
+
+
+def install_user_trigram_indexes(connection):
+    """Index GIN pg_trgm sur les noms normalisés : LIKE '%mot%' sans parcours de la table"""
+    from .models import User
+    from .search import SEARCH_KEY_FIELDS
+
+    table = connection.ops.quote_name(User._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for key in SEARCH_KEY_FIELDS.values():
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS user_{key}_trgm_idx ON {table} USING gin ({key} gin_trgm_ops)"
+            )
+
+
+def install_postgres_objects(sender, using='default', **kwargs):
+    """Gestionnaire post_migrate : ne fait rien hors PostgreSQL"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    install_reservation_exclusion(connection)
+    install_user_trigram_indexes(connection)
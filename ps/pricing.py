@@ -0,0 +1,519 @@
+"""
+Moteur de tarification.
+
+Les paramètres tarifaires actifs sont compilés en un barème immuable : pour
+chaque type de station, une table d'intervalles triés couvrant la semaine
+(en minutes depuis lundi 00:00), chaque intervalle portant ses paliers de
+durée. Tarifer une session revient à parcourir ces intervalles, en
+O(nombre de segments traversés).
+
+Règles de priorité entre tarifs applicables au même instant :
+1. un tarif du type de station l'emporte sur un tarif « tous les types » ;
+2. puis le palier de durée le plus élevé atteint ;
+3. puis un tarif restreint (jours / plage horaire) sur un tarif permanent ;
+4. puis le tarif modifié le plus récemment.
+"""
+import threading
+from collections import defaultdict
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Value, When
+)
+from django.db.models.functions import Cast, Coalesce, Least, Now, Round
+from django.utils import timezone
+
+from .expressions import EpochSeconds
+
+
+DEFAULT_HOURLY_RATE = 500.0  # 500 FCFA par défaut
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+SCHEDULE_STATION_TYPES = ('PC', 'console', 'all')
+
+
+@dataclass(frozen=True)
+class RateSegment:
+    """Intervalle [start, end[ de la semaine et ses paliers (seuil en minutes, tarif horaire)"""
+    start: float
+    end: float
+    thresholds: tuple
+    rates: tuple
+
+    def tier(self, elapsed):
+        """Retourne (tarif horaire, minutes restantes avant le palier suivant)"""
+        index = bisect_right(self.thresholds, elapsed) - 1
+        if index + 1 < len(self.thresholds):
+            return self.rates[index], self.thresholds[index + 1] - elapsed
+        return self.rates[index], float('inf')
+
+
+@dataclass(frozen=True)
+class RateSchedule:
+    """Barème compilé et immuable, indexé par type de station"""
+    segments: dict
+    starts: dict
+
+    def _segment(self, station_type, position):
+        segments = self.segments.get(station_type) or self.segments['all']
+        starts = self.starts.get(station_type) or self.starts['all']
+        return segments[bisect_right(starts, position) - 1]
+
+    @property
+    def is_flat(self):
+        """Vrai si chaque type n'a qu'un tarif permanent sans palier, calculable en SQL"""
+        return all(
+            len(segments) == 1 and len(segments[0].rates) == 1
+            for segments in self.segments.values()
+        )
+
+    def rate_at(self, station_type, moment, elapsed=0):
+        """Tarif horaire applicable à un instant donné, après `elapsed` minutes de session"""
+        rate, _ = self._segment(station_type, week_position(moment)).tier(elapsed)
+        return rate
+
+    def price(self, station_type, start, minutes):
+        """Coût d'une session de `minutes` minutes débutant à `start`"""
+        if not minutes:
+            return None
+
+        position = week_position(start)
+        elapsed = 0.0
+        total = 0.0
+        while elapsed < minutes:
+            segment = self._segment(station_type, position)
+            rate, until_next_tier = segment.tier(elapsed)
+            step = min(segment.end - position, until_next_tier, minutes - elapsed)
+            total += rate * step / 60
+            elapsed += step
+            position = (position + step) % MINUTES_PER_WEEK
+        return round(total, 2)
+
+
+def week_position(moment):
+    """Position d'un instant dans la semaine locale, en minutes depuis lundi 00:00"""
+    local = timezone.localtime(moment)
+    return (
+        local.weekday() * MINUTES_PER_DAY
+        + local.hour * 60
+        + local.minute
+        + (local.second + local.microsecond / 1e6) / 60
+    )
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def rule_windows(rule):
+    """Intervalles de la semaine (en minutes) couverts par un tarif"""
+    days = sorted({int(day) for day in rule.days_of_week}) if rule.days_of_week else range(7)
+    windows = []
+    for day in days:
+        day_start = day * MINUTES_PER_DAY
+        if rule.period_start is None or rule.period_end is None:
+            start, end = day_start, day_start + MINUTES_PER_DAY
+        else:
+            start = day_start + _minutes(rule.period_start)
+            end = day_start + _minutes(rule.period_end)
+            if end <= start:
+                # Plage qui passe minuit : se termine le lendemain
+                end += MINUTES_PER_DAY
+        if end > MINUTES_PER_WEEK:
+            # Dimanche soir -> lundi matin : on reboucle sur le début de semaine
+            windows.append((start, MINUTES_PER_WEEK))
+            windows.append((0, end - MINUTES_PER_WEEK))
+        else:
+            windows.append((start, end))
+    return windows
+
+
+def _precedence(rule, station_type):
+    return (
+        rule.station_type == station_type and station_type != 'all',
+        rule.min_duration,
+        rule.has_period,
+        rule.updated_at,
+    )
+
+
+def _tiers(candidates, station_type):
+    """Paliers (seuils, tarifs) résultant d'un ensemble de tarifs applicables"""
+    thresholds = sorted({0, *(rule.min_duration for rule in candidates)})
+    tiers = []
+    for threshold in thresholds:
+        eligible = [rule for rule in candidates if rule.min_duration <= threshold]
+        if eligible:
+            best = max(eligible, key=lambda rule: _precedence(rule, station_type))
+            rate = float(best.hourly_rate)
+        else:
+            rate = DEFAULT_HOURLY_RATE
+        if not tiers or tiers[-1][1] != rate:
+            tiers.append((threshold, rate))
+    return tuple(t for t, _ in tiers), tuple(r for _, r in tiers)
+
+
+def compile_schedule(rules):
+    """Compile une liste de tarifs actifs en barème immuable"""
+    rules = list(rules)
+    windows = {id(rule): rule_windows(rule) for rule in rules}
+
+    segments, starts = {}, {}
+    for station_type in SCHEDULE_STATION_TYPES:
+        applicable = [
+            rule for rule in rules
+            if rule.station_type == station_type or rule.station_type == 'all'
+        ]
+        boundaries = sorted({0, MINUTES_PER_WEEK, *(
+            edge for rule in applicable for window in windows[id(rule)] for edge in window
+        )})
+
+        compiled = []
+        for start, end in zip(boundaries, boundaries[1:]):
+            candidates = [
+                rule for rule in applicable
+                if any(w_start <= start and end <= w_end for w_start, w_end in windows[id(rule)])
+            ]
+            thresholds, rates = _tiers(candidates, station_type)
+            if compiled and compiled[-1].thresholds == thresholds and compiled[-1].rates == rates:
+                # Fusion des segments adjacents identiques
+                compiled[-1] = RateSegment(compiled[-1].start, end, thresholds, rates)
+            else:
+                compiled.append(RateSegment(start, end, thresholds, rates))
+
+        segments[station_type] = tuple(compiled)
+        starts[station_type] = tuple(segment.start for segment in compiled)
+
+    return RateSchedule(segments=segments, starts=starts)
+
+
+_cache_lock = threading.Lock()
+_cache = {'schedule': None, 'expires_at': 0.0}
+
+
+def get_schedule():
+    """
+    Barème courant, compilé depuis les tarifs actifs et mis en cache.
+
+    Le cache est invalidé à chaque modification d'un tarif dans ce processus
+    et expire après PRICING_SCHEDULE_TTL secondes pour les autres processus.
+    """
+    schedule = _cache['schedule']
+    if schedule is not None and time.monotonic() < _cache['expires_at']:
+        return schedule
+
+    from .models import RateSettings
+
+    with _cache_lock:
+        if _cache['schedule'] is None or time.monotonic() >= _cache['expires_at']:
+            _cache['schedule'] = compile_schedule(RateSettings.objects.filter(is_active=True))
+            _cache['expires_at'] = time.monotonic() + getattr(settings, 'PRICING_SCHEDULE_TTL', 60)
+        return _cache['schedule']
+
+
+def invalidate_schedule():
+    """Force la recompilation du barème au prochain appel"""
+    with _cache_lock:
+        _cache['schedule'] = None
+
+
+class VersionedSchedules:
+    """
+    Barèmes historiques construits à partir des versions de tarifs.
+
+    Les versions qui chevauchent la période sont chargées en une requête ; un
+    barème est compilé une seule fois par ensemble distinct de versions en
+    vigueur, puis réutilisé pour toutes les sessions de cette période.
+    """
+
+    def __init__(self, versions):
+        self.versions = list(versions)
+        self.change_points = sorted({
+            moment
+            for version in self.versions
+            for moment in (version.effective_from, version.effective_to)
+            if moment is not None
+        })
+        self._compiled = {}
+
+    def at(self, moment):
+        """Barème en vigueur à un instant donné"""
+        index = bisect_right(self.change_points, moment)
+        schedule = self._compiled.get(index)
+        if schedule is None:
+            effective = [
+                version for version in self.versions
+                if version.effective_from <= moment
+                and (version.effective_to is None or moment < version.effective_to)
+            ]
+            schedule = self._compiled[index] = compile_schedule(effective)
+        return schedule
+
+
+def _current_costs(model, ids):
+    """
+    Joueur, fin et coût des sessions `ids`, et leur prise en compte dans les
+    statistiques des joueurs (sessions terminées ou archivées)
+    """
+    from .models import Session
+
+    sessions = model.objects.filter(pk__in=ids)
+    if model is not Session:
+        return {
+            pk: (player_id, end_time, cost, True)
+            for pk, player_id, end_time, cost in sessions.values_list('pk', 'player_id', 'end_time', 'cost')
+        }
+    return {
+        pk: (player_id, end_time, cost, not is_active)
+        for pk, player_id, end_time, cost, is_active
+        in sessions.values_list('pk', 'player_id', 'end_time', 'cost', 'is_active')
+    }
+
+
+def _report_cost_changes(model, before):
+    """
+    Reporte les changements de coût par rapport à `before` : écarts sur les
+    statistiques des joueurs pour les sessions déjà comptées, et événements
+    session.repriced.
+    """
+    from .events import record_sessions
+    from .models import PlayerStats
+
+    after = dict(model.objects.filter(pk__in=list(before)).values_list('pk', 'cost'))
+    changed, deltas = [], []
+    for pk, (player_id, end_time, cost, counted) in before.items():
+        if after[pk] == cost:
+            continue
+        changed.append(pk)
+        if counted:
+            deltas.append((player_id, end_time, (after[pk] or 0) - (cost or 0)))
+    PlayerStats.add_spent(deltas)
+    record_sessions('session.repriced', changed, model=model)
+
+
+def reprice_sessions(queryset, schedule=None, schedule_at=None, batch_size=1000, report_changes=True):
+    """
+    Recalcule le coût des sessions terminées d'un queryset par lots
+    (une requête de lecture par lot, puis les mises à jour du lot dans une transaction).
+
+    `schedule_at(start_time)` permet de tarifer chaque session avec le barème
+    en vigueur à son début ; par défaut, le barème courant est utilisé.
+    Les changements de coût sont reportés dans la même transaction (statistiques
+    des joueurs, événements session.repriced), sauf `report_changes=False` :
+    sessions en cours de clôture, que l'appelant compte et annonce lui-même.
+    Retourne le nombre de sessions dont le coût a changé.
+    """
+    model = queryset.model
+    if schedule_at is None:
+        schedule = schedule or get_schedule()
+        schedule_at = lambda moment: schedule  # noqa: E731
+
+    rows = (
+        queryset
+        .filter(duration__isnull=False)
+        .order_by('pk')
+        .values_list('id', 'station__type', 'start_time', 'duration', 'cost')
+    )
+
+    changed = 0
+    last_id = None
+    while True:
+        # Pagination par clé : chaque lot est lu entièrement avant d'être mis à jour
+        page = rows.filter(pk__gt=last_id) if last_id is not None else rows
+        page = list(page[:batch_size])
+        if not page:
+            break
+        last_id = page[-1][0]
+
+        # Regroupement par nouveau coût : une instruction UPDATE par montant
+        # distinct du lot, bien moins coûteuse qu'un CASE par ligne
+        updates = defaultdict(list)
+        for session_id, station_type, start_time, duration, cost in page:
+            new_cost = schedule_at(start_time).price(station_type or 'all', start_time, duration)
+            if (None if cost is None else float(cost)) != new_cost:
+                updates[new_cost].append(session_id)
+        with transaction.atomic():
+            if report_changes:
+                before = _current_costs(model, [pk for ids in updates.values() for pk in ids])
+            for new_cost, session_ids in updates.items():
+                changed += model.objects.filter(pk__in=session_ids).update(cost=new_cost)
+            if report_changes:
+                _report_cost_changes(model, before)
+
+    return changed
+
+
+def flat_rate_subquery(station_type):
+    """
+    Tarif horaire de la version en vigueur au début de la session externe,
+    pour un type de station : le tarif propre au type prime sur « tous les types »,
+    puis la version la plus récente.
+    """
+    from .models import RateVersion
+
+    start = OuterRef('start_time')
+    versions = (
+        RateVersion.objects
+        .filter(station_type__in={station_type, 'all'}, effective_from__lte=start)
+        .filter(Q(effective_to__gt=start) | Q(effective_to__isnull=True))
+        .annotate(specific=Case(When(station_type=station_type, then=Value(0)), default=Value(1)))
+        .order_by('specific', '-effective_from')
+        .values('hourly_rate')[:1]
+    )
+    return Coalesce(
+        Subquery(versions, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        Value(Decimal(str(DEFAULT_HOURLY_RATE))),
+    )
+
+
+def hourly_cost(minutes, rate):
+    """
+    Coût SQL de `minutes` minutes au tarif horaire `rate`, arrondi au centime.
+    Division par un flottant puis conversion en décimal : SQLite stocke un tarif
+    rond en entier et ferait sinon une division entière.
+    """
+    return Round(Cast(minutes * rate / Value(60.0), DecimalField(max_digits=12, decimal_places=4)), 2)
+
+
+def recompute_costs_sql(queryset, station_type, batch_size=1000):
+    """
+    Recalcule en SQL le coût des sessions d'un type de station à partir des
+    versions de tarifs permanents : une instruction UPDATE par lot, la jointure
+    session -> version applicable étant faite par la base. Les changements de
+    coût sont reportés dans la transaction du lot (statistiques des joueurs,
+    événements session.repriced).
+    """
+    model = queryset.model
+    ids = queryset.filter(duration__isnull=False).order_by('pk').values_list('pk', flat=True)
+    cost = hourly_cost(F('duration'), flat_rate_subquery(station_type))
+
+    updated = 0
+    last_id = None
+    while True:
+        page = ids.filter(pk__gt=last_id) if last_id is not None else ids
+        page = list(page[:batch_size])
+        if not page:
+            break
+        last_id = page[-1]
+        with transaction.atomic():
+            before = _current_costs(model, page)
+            updated += model.objects.filter(pk__in=page).update(cost=cost)
+            _report_cost_changes(model, before)
+    return updated
+
+
+def recompute_costs(start, end, station_type=None, batch_size=1000):
+    """
+    Recalcule le coût des sessions terminées (table chaude et archive) ayant
+    débuté dans [start, end[, d'après les versions de tarifs en vigueur à leur début.
+
+    Si toutes les versions concernées sont des tarifs permanents, le calcul est
+    délégué à la base ; sinon le moteur de tarification parcourt les sessions
+    avec un barème historique compilé par période.
+    """
+    from .models import ArchivedSession, RateVersion, Session
+
+    RateVersion.backfill()
+    versions = list(RateVersion.overlapping(start, end))
+    # None : sessions sans station, tarifées au tarif « tous les types »
+    station_types = [station_type] if station_type else ['PC', 'console', None]
+    use_sql = all(version.is_flat for version in versions)
+
+    stats = {'mode': 'sql' if use_sql else 'engine', 'versions': len(versions), 'sessions': 0}
+    schedules = VersionedSchedules(versions)
+    for model in (Session, ArchivedSession):
+        closed = model.objects.filter(start_time__gte=start, start_time__lt=end)
+        if model is Session:
+            closed = closed.filter(is_active=False)
+        for current_type in station_types:
+            if current_type is None:
+                queryset = closed.filter(station__isnull=True)
+            else:
+                queryset = closed.filter(station__type=current_type)
+            if use_sql:
+                stats['sessions'] += recompute_costs_sql(queryset, current_type or 'all', batch_size=batch_size)
+            else:
+                stats['sessions'] += reprice_sessions(queryset, schedule_at=schedules.at, batch_size=batch_size)
+    return stats
+
+
+def current_rate_subquery(station_type):
+    """
+    Tarif horaire actif au début d'une session d'un type de station, avec la
+    priorité du barème : le tarif propre au type prime sur « tous les types »,
+    puis un tarif restreint (jours / plage) sur un tarif permanent, puis le plus
+    récent. Exact si le barème est plat ; sinon price_live_sessions corrige.
+    """
+    from .models import RateSettings
+
+    permanent = Q(days_of_week='') & Q(period_start__isnull=True)
+    active = (
+        RateSettings.objects
+        .filter(is_active=True, min_duration=0, station_type__in={station_type, 'all'})
+        .annotate(
+            specific=Case(When(station_type=station_type, then=Value(0)), default=Value(1)),
+            permanent=Case(When(permanent, then=Value(1)), default=Value(0)),
+        )
+        .order_by('specific', 'permanent', '-updated_at')
+        .values('hourly_rate')[:1]
+    )
+    return Coalesce(
+        Subquery(active, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        Value(Decimal(str(DEFAULT_HOURLY_RATE))),
+    )
+
+
+def live_rate():
+    """Tarif horaire de la session externe selon le type de sa station"""
+    # Un CASE sur le type plutôt qu'un tri sur le type externe, que SQLite refuse
+    return Case(
+        *(When(station__type=station_type, then=current_rate_subquery(station_type))
+          for station_type in ('PC', 'console')),
+        default=current_rate_subquery('all'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def with_live_cost(queryset):
+    """
+    Annote live_duration (minutes écoulées) et live_cost (coût courant) en une
+    seule expression SQL. Une session prépayée ne compte pas au-delà de sa fin ;
+    une session terminée reprend sa durée et son coût enregistrés. Le coût SQL
+    n'est exact que pour un barème plat : évaluer avec price_live_sessions.
+    """
+    now = Now()
+    until = Least(now, Coalesce('end_time', now))
+    elapsed = Cast(
+        Round((EpochSeconds(until) - EpochSeconds('start_time')) / Value(60.0)),
+        output_field=IntegerField(),
+    )
+    running_cost = hourly_cost(elapsed, live_rate())
+    return queryset.select_related('player', 'station').annotate(
+        live_duration=Case(When(is_active=True, then=elapsed), default=F('duration'), output_field=IntegerField()),
+        live_cost=Case(
+            When(is_active=True, then=running_cost),
+            default=F('cost'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+
+
+def price_live_sessions(sessions):
+    """
+    Évalue des sessions annotées par with_live_cost. Si le barème comporte des
+    plages horaires ou des paliers, non exprimables par un tarif unique en SQL,
+    le coût courant des sessions actives est recalculé par le moteur.
+    """
+    sessions = list(sessions)
+    schedule = get_schedule()
+    if not schedule.is_flat:
+        for session in sessions:
+            if session.is_active and session.live_duration:
+                station_type = session.station.type if session.station else 'all'
+                session.live_cost = Decimal(str(schedule.price(station_type, session.start_time, session.live_duration)))
+    return sessions
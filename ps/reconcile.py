@@ -0,0 +1,124 @@
+"""
+Réconciliation des stations et des sessions.
+
+Quatre incohérences sont recherchées, chacune par une requête ensembliste :
+
+1. une station dont la session courante est terminée, ou « en utilisation »
+   sans session courante : elle est libérée ;
+2. une station « disponible » dont la session courante est active : elle est
+   repassée « en utilisation » ;
+3. une session active que sa station ne désigne pas comme session courante
+   (anti-jointure) : la station a été libérée ou réattribuée, la session est
+   donc terminée, avec sa durée calculée en SQL et son coût par le moteur ;
+4. une session prépayée encore active après son échéance (planificateur
+   arrêté) : elle est terminée à l'échéance et sa station libérée.
+
+Les sessions démarrées depuis moins de `grace_seconds`, ou échues depuis moins
+de `grace_seconds`, sont ignorées pour ne pas interrompre une création en
+cours ni doubler le planificateur.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Least, Round
+from django.utils import timezone
+
+from .availability import invalidate_availability
+from .events import record_sessions, record_stations
+from .expressions import EpochSeconds
+from .models import PlayerStats, Session, Station
+from .pricing import reprice_sessions
+
+
+def stale_stations(now=None, grace_seconds=60):
+    """
+    Stations pointant vers une session terminée ou échue, ou en utilisation
+    sans session
+    """
+    return Station.objects.filter(
+        Q(current_session__is_active=False)
+        | Q(current_session__in=expired_sessions(now, grace_seconds))
+        | Q(status='in_use', current_session__isnull=True)
+    )
+
+
+def unmarked_stations():
+    """Stations disponibles alors que leur session courante est active"""
+    return Station.objects.filter(status='available', current_session__is_active=True)
+
+
+def orphaned_sessions(now=None, grace_seconds=60):
+    """Sessions actives dont la station ne les désigne pas comme session courante"""
+    now = now or timezone.now()
+    attached = Station.objects.filter(pk=OuterRef('station_id'), current_session=OuterRef('pk'))
+    return (
+        Session.objects
+        .filter(is_active=True, station__isnull=False)
+        .filter(start_time__lt=now - datetime.timedelta(seconds=grace_seconds))
+        .filter(~Exists(attached))
+    )
+
+
+def expired_sessions(now=None, grace_seconds=60):
+    """Sessions prépayées encore actives après leur échéance"""
+    now = now or timezone.now()
+    return Session.objects.filter(is_active=True, end_time__lt=now - datetime.timedelta(seconds=grace_seconds))
+
+
+def find_inconsistencies(now=None, grace_seconds=60):
+    """Identifiants des lignes à corriger, par catégorie"""
+    now = now or timezone.now()
+    ended_sessions = orphaned_sessions(now, grace_seconds) | expired_sessions(now, grace_seconds)
+    return {
+        'released_stations': list(stale_stations(now, grace_seconds).values_list('id', flat=True)),
+        'occupied_stations': list(unmarked_stations().values_list('id', flat=True)),
+        'ended_sessions': list(ended_sessions.values_list('id', flat=True)),
+    }
+
+
+def reconcile(now=None, grace_seconds=60, dry_run=False):
+    """
+    Corrige les incohérences en quelques mises à jour groupées, dans une
+    transaction, et retourne les identifiants corrigés par catégorie.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        found = find_inconsistencies(now, grace_seconds)
+        if dry_run:
+            return found
+
+        changed_stations = found['released_stations'] + found['occupied_stations']
+        previous_statuses = dict(Station.objects.filter(pk__in=changed_stations).values_list('id', 'status'))
+
+        if found['released_stations']:
+            Station.objects.filter(pk__in=found['released_stations']).update(
+                current_session=None,
+                # Une station en maintenance le reste
+                status=Case(When(status='in_use', then=Value('available')), default=F('status')),
+                updated_at=now,
+            )
+
+        if found['occupied_stations']:
+            Station.objects.filter(pk__in=found['occupied_stations']).update(status='in_use', updated_at=now)
+
+        if found['ended_sessions']:
+            sessions = Session.objects.filter(pk__in=found['ended_sessions'])
+            # Fin à l'instant présent, ou à l'échéance prépayée si elle est déjà passée
+            sessions.update(is_active=False, end_time=Least(Coalesce('end_time', Value(now)), Value(now)))
+            sessions.update(duration=Cast(
+                Round((EpochSeconds('end_time') - EpochSeconds('start_time')) / Value(60.0)),
+                output_field=IntegerField(),
+            ))
+            # Sessions pas encore comptées ni annoncées : ajoutées aux statistiques avec leur coût définitif
+            reprice_sessions(sessions, report_changes=False)
+            PlayerStats.add_sessions(sessions)
+            record_sessions('session.ended', found['ended_sessions'])
+
+        record_stations(previous_statuses)
+
+        if found['released_stations'] or found['occupied_stations']:
+            # Les mises à jour groupées ne déclenchent pas les signaux de Station
+            transaction.on_commit(invalidate_availability)
+
+    return found
@@ -0,0 +1,215 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Session, ArchivedSession, Station
+
+
+def day_start(day):
+    """Retourne le début (datetime aware) d'une journée dans le fuseau courant"""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def date_range(start_date, end_date):
+    """Itère sur les jours de `start_date` à `end_date` inclus"""
+    current = start_date
+    while current <= end_date:
+        yield current
+        current += timedelta(days=1)
+
+
+def closed_sessions(model, start, end):
+    """Sessions terminées dont la fin tombe dans [start, end[ pour un stockage donné"""
+    queryset = model.objects.filter(end_time__gte=start, end_time__lt=end)
+    if model is Session:
+        queryset = queryset.filter(is_active=False)
+    return queryset
+
+
+def daily_totals(start_date, end_date):
+    """
+    Agrège par jour de fin les sessions terminées des deux stockages
+    (table chaude et archive) en une requête groupée par stockage.
+    """
+    start = day_start(start_date)
+    end = day_start(end_date + timedelta(days=1))
+
+    totals = defaultdict(lambda: {'count': 0, 'revenue': 0, 'duration_sum': 0, 'duration_count': 0})
+    for model in (Session, ArchivedSession):
+        rows = (
+            closed_sessions(model, start, end)
+            .order_by()
+            .annotate(day=TruncDate('end_time'))
+            .values('day')
+            .annotate(
+                count=Count('id'),
+                revenue=Sum('cost'),
+                duration_sum=Sum('duration'),
+                duration_count=Count('duration'),
+            )
+        )
+        for row in rows:
+            day = totals[row['day']]
+            day['count'] += row['count']
+            day['revenue'] += row['revenue'] or 0
+            day['duration_sum'] += row['duration_sum'] or 0
+            day['duration_count'] += row['duration_count']
+    return totals
+
+
+def _average(duration_sum, duration_count):
+    return round(float(duration_sum) / duration_count, 2) if duration_count else 0
+
+
+def revenue_report(start_date, end_date):
+    """Rapport des revenus par jour sur la période (bornes incluses)"""
+    totals = daily_totals(start_date, end_date)
+
+    details = []
+    total_revenue = 0
+    for day in date_range(start_date, end_date):
+        revenue = totals[day]['revenue'] if day in totals else 0
+        total_revenue += revenue
+        details.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'revenue': float(revenue)
+        })
+
+    return {
+        'total_revenue': float(total_revenue),
+        'details': details
+    }
+
+
+def usage_report(start_date, end_date):
+    """Statistiques d'utilisation par jour (nombre de sessions, durée moyenne)"""
+    totals = daily_totals(start_date, end_date)
+
+    details = []
+    total_sessions = duration_sum = duration_count = 0
+    for day in date_range(start_date, end_date):
+        day_totals = totals.get(day, {'count': 0, 'duration_sum': 0, 'duration_count': 0})
+        total_sessions += day_totals['count']
+        duration_sum += day_totals['duration_sum']
+        duration_count += day_totals['duration_count']
+        details.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'sessions_count': day_totals['count'],
+            'average_duration': _average(day_totals['duration_sum'], day_totals['duration_count'])
+        })
+
+    return {
+        'total_sessions': total_sessions,
+        'average_duration': _average(duration_sum, duration_count),
+        'details': details
+    }
+
+
+def month_shards(start_date, end_date):
+    """Découpe [start_date, end_date] en tranches d'un mois calendaire au plus"""
+    shards = []
+    first = start_date
+    while first <= end_date:
+        next_month = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+        last = min(next_month - timedelta(days=1), end_date)
+        shards.append((first, last))
+        first = next_month
+    return shards
+
+
+def station_daily_partials(start_date, end_date):
+    """
+    Cumuls partiels par (station, jour de fin) sur la période : {(station_id,
+    'YYYY-MM-DD'): [sessions, revenu, minutes]}. Sommes et comptes : les
+    partiels de périodes disjointes se fusionnent par simple addition.
+    """
+    start = day_start(start_date)
+    end = day_start(end_date + timedelta(days=1))
+
+    partials = defaultdict(lambda: [0, 0, 0])
+    for model in (Session, ArchivedSession):
+        rows = (
+            closed_sessions(model, start, end)
+            .order_by()
+            .annotate(day=TruncDate('end_time'))
+            .values_list('station_id', 'day')
+            .annotate(count=Count('id'), revenue=Sum('cost'), minutes=Sum('duration'))
+        )
+        for station_id, day, count, revenue, minutes in rows:
+            totals = partials[(str(station_id) if station_id else None, day.isoformat())]
+            totals[0] += count
+            totals[1] += revenue or 0
+            totals[2] += minutes or 0
+    return dict(partials)
+
+
+def merge_partials(partials, into=None):
+    """Additionne des cumuls partiels dans `into` (nouveau dictionnaire par défaut)"""
+    merged = {} if into is None else into
+    for key, (count, revenue, minutes) in partials.items():
+        totals = merged.setdefault(key, [0, 0, 0])
+        totals[0] += count
+        totals[1] += revenue
+        totals[2] += minutes
+    return merged
+
+
+def station_revenue_report(start_date, end_date, workers=1):
+    """
+    Revenu par station et par jour sur la période (bornes incluses).
+
+    Avec workers > 1, la période est découpée en mois calculés en parallèle
+    par un pool de processus (chacun avec sa propre connexion), puis les
+    cumuls partiels sont fusionnés.
+    """
+    shards = month_shards(start_date, end_date)
+    if workers > 1 and len(shards) > 1:
+        from .workers import compute_station_shard, process_pool
+
+        merged = {}
+        with process_pool(min(workers, len(shards))) as pool:
+            for partials in pool.map(
+                compute_station_shard,
+                [first.isoformat() for first, _ in shards],
+                [last.isoformat() for _, last in shards],
+            ):
+                merge_partials(partials, merged)
+    else:
+        merged = {}
+        for first, last in shards:
+            merge_partials(station_daily_partials(first, last), merged)
+
+    by_station = defaultdict(list)
+    for (station_id, day), (count, revenue, minutes) in sorted(merged.items(), key=lambda item: item[0][1]):
+        by_station[station_id].append({
+            'date': day,
+            'sessions_count': count,
+            'revenue': float(revenue),
+            'minutes': minutes,
+        })
+
+    names = {
+        str(pk): name
+        for pk, name in Station.objects.filter(pk__in=[pk for pk in by_station if pk]).values_list('id', 'name')
+    }
+    stations = []
+    for station_id, days in by_station.items():
+        stations.append({
+            'station_id': station_id,
+            'station_name': names.get(station_id),
+            'total_revenue': round(sum(day['revenue'] for day in days), 2),
+            'sessions_count': sum(day['sessions_count'] for day in days),
+            'total_minutes': sum(day['minutes'] for day in days),
+            'details': days,
+        })
+    stations.sort(key=lambda station: -station['total_revenue'])
+
+    return {
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'total_revenue': round(sum(station['total_revenue'] for station in stations), 2),
+        'stations': stations,
+    }
@@ -0,0 +1,77 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# État de routage de la requête courante (une valeur par requête / tâche async)
+_routing_state = contextvars.ContextVar('ps_routing_state', default=None)
+
+
+class RoutingState:
+    """Indique si la requête courante peut lire sur la réplique"""
+
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        self.has_written = False
+
+
+def replica_alias():
+    """Retourne l'alias de la réplique si elle est configurée, sinon None"""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in connections.databases else None
+
+
+@contextmanager
+def routing_context(use_replica):
+    """Active (ou non) les lectures sur la réplique le temps d'un bloc"""
+    token = _routing_state.set(RoutingState(use_replica=use_replica))
+    try:
+        yield
+    finally:
+        _routing_state.reset(token)
+
+
+def replica_reads():
+    """Raccourci pour exécuter des lectures sur la réplique hors requête HTTP"""
+    return routing_context(use_replica=True)
+
+
+def primary_reads():
+    """Force les lectures d'un bloc sur la base principale, même dans une vue `read_replica`"""
+    return routing_context(use_replica=False)
+
+
+class ReplicaRouter:
+    """
+    Routeur de base de données primaire / réplique.
+
+    Les lectures sont envoyées sur la réplique uniquement lorsque la vue l'a
+    demandé (attribut `read_replica`) et tant que la requête n'a rien écrit :
+    toute lecture qui suit une écriture, ou qui a lieu dans une transaction,
+    reste sur la base principale pour garantir la lecture de ses propres écritures.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if state is None or not state.use_replica or state.has_written:
+            return DEFAULT_DB_ALIAS
+
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        return replica_alias() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.has_written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplique contient les mêmes données que la base principale
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
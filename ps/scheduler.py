@@ -0,0 +1,106 @@
+import heapq
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .availability import invalidate_availability
+from .events import read_events, record_sessions, record_stations
+from .models import Event, PlayerStats, Session, Station
+
+
+def expire_sessions(session_ids, now=None):
+    """
+    Termine en masse les sessions prépayées arrivées à échéance et libère
+    leurs stations : une mise à jour groupée pour les sessions et une pour
+    les stations. La durée et le coût ont été fixés à la création.
+    Retourne les identifiants des sessions effectivement terminées.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            Session.objects
+            .select_for_update()
+            .filter(pk__in=session_ids, is_active=True, end_time__lte=now)
+            .values_list('id', flat=True)
+        )
+        if expired:
+            Session.objects.filter(pk__in=expired).update(is_active=False)
+            PlayerStats.add_sessions(Session.objects.filter(pk__in=expired))
+            stations = Station.objects.filter(current_session__in=expired)
+            previous_statuses = dict(stations.values_list('id', 'status'))
+            stations.update(
+                status='available',
+                current_session=None,
+                updated_at=now,
+            )
+            record_sessions('session.ended', expired)
+            record_stations(previous_statuses)
+            # La mise à jour groupée ne déclenche pas les signaux de Station
+            transaction.on_commit(invalidate_availability)
+    return expired
+
+
+class ExpiryScheduler:
+    """
+    Tas des échéances des sessions prépayées actives, reconstruit depuis la base.
+
+    Seules les sessions actives avec une heure de fin sont suivies : le tas
+    reste petit et son minimum donne l'instant du prochain réveil. Entre deux
+    reconstructions, les sessions démarrées ensuite sont ajoutées en suivant
+    le journal des changements (événements session.started).
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.cursor = 0
+
+    def load(self):
+        """Reconstruit le tas à partir des sessions prépayées actives"""
+        # Position lue avant les sessions : un démarrage concurrent sera suivi, au pire en double
+        self.cursor = Event.objects.aggregate(head=Max('id'))['head'] or 0
+        self.heap = list(
+            Session.objects
+            .filter(is_active=True, end_time__isnull=False)
+            .order_by()
+            .values_list('end_time', 'id')
+        )
+        heapq.heapify(self.heap)
+        return len(self.heap)
+
+    def follow(self, batch_size=500):
+        """Ajoute au tas les sessions prépayées démarrées depuis la dernière lecture du journal"""
+        added = 0
+        while True:
+            events = read_events(self.cursor, batch_size, ['session.started'])
+            for event in events:
+                end_time = event.payload.get('end_time')
+                if end_time and event.payload.get('is_active'):
+                    heapq.heappush(self.heap, (parse_datetime(end_time), Session._meta.pk.to_python(event.entity_id)))
+                    added += 1
+            if events:
+                self.cursor = events[-1].id
+            if len(events) < batch_size:
+                return added
+
+    def next_expiry(self):
+        """Prochaine échéance connue, ou None"""
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now=None):
+        """Retire du tas et retourne les sessions arrivées à échéance"""
+        now = now or timezone.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[1])
+        return due
+
+    def tick(self, now=None, batch_size=500):
+        """Termine les sessions échues par lots et retourne leur nombre"""
+        now = now or timezone.now()
+        due = self.pop_due(now)
+        expired = 0
+        for index in range(0, len(due), batch_size):
+            expired += len(expire_sessions(due[index:index + batch_size], now=now))
+        return expired
@@ -0,0 +1,49 @@
+"""
+Recherche d'utilisateurs par nom.
+
+Les noms sont recherchés sur des colonnes normalisées (minuscules, sans
+accents) renseignées à l'enregistrement de l'utilisateur :
+
+- partout, chaque mot saisi doit commencer l'une des colonnes : un intervalle
+  [mot, mot suivant[ servi par un index B-tree ordinaire ;
+- sur PostgreSQL, le mot peut aussi apparaître au milieu du nom : la condition
+  devient un LIKE '%mot%', servi par les index GIN pg_trgm (ps.postgres).
+"""
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q
+
+from .filters import prefix_range
+
+
+SEARCH_KEY_FIELDS = {
+    'username': 'username_key',
+    'firstname': 'firstname_key',
+    'lastname': 'lastname_key',
+}
+
+
+def normalize(text):
+    """Forme de recherche d'un texte : minuscules, sans accents ni espaces superflus"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def _word_condition(word, substring):
+    condition = Q()
+    for key in SEARCH_KEY_FIELDS.values():
+        condition |= Q(**{f'{key}__contains': word}) if substring else prefix_range(key, word)
+    return condition
+
+
+def search_users(queryset, term):
+    """Utilisateurs dont chaque mot de `term` figure dans le nom d'utilisateur, le prénom ou le nom"""
+    words = normalize(term).split()
+    if not words:
+        return queryset
+    substring = connections[queryset.db].vendor == 'postgresql'
+    for word in words:
+        queryset = queryset.filter(_word_condition(word, substring))
+    return queryset
@@ -1,17 +1,47 @@
+import datetime
+
 from rest_framework import serializers
+from django.db import transaction
+from django.db.models import Max
+from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Station, Session, RateSettings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from .models import Station, Session, RateSettings, Reservation, PlayerStats, ReportJob, WebhookSubscription, Event
+from .analytics import GROUP_BY_CHOICES
+from .jobs import REPORTS
+from .events import TOPICS, record_session
 
 User = get_user_model()
 
 
+class PlayerStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlayerStats
+        fields = ('session_count', 'total_minutes', 'total_spent', 'last_visit')
+        read_only_fields = fields
+
+
 class UserSerializer(serializers.ModelSerializer):
+    stats = serializers.SerializerMethodField()
+    
     class Meta:
         model = User
-        fields = ('id', 'username', 'firstname', 'lastname', 'role')
-        read_only_fields = ('id',)
+        fields = ('id', 'username', 'firstname', 'lastname', 'role', 'stats')
+        read_only_fields = ('id', 'stats')
+    
+    def get_stats(self, obj):
+        """Cumuls du joueur (à charger avec select_related('stats')) ; None hors joueurs"""
+        if obj.role != 'player':
+            return None
+        try:
+            stats = obj.stats
+        except PlayerStats.DoesNotExist:
+            # Aucune session terminée
+            stats = PlayerStats(player=obj)
+        return PlayerStatsSerializer(stats).data
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -89,6 +119,15 @@ class SessionSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'start_time', 'end_time', 'duration', 'cost', 'is_active')
 
 
+class LiveSessionSerializer(SessionSerializer):
+    """Session avec sa durée et son coût courants, annotés par la base"""
+    live_duration = serializers.IntegerField(read_only=True, help_text=_("Minutes écoulées"))
+    live_cost = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, help_text=_("Coût courant"))
+    
+    class Meta(SessionSerializer.Meta):
+        fields = SessionSerializer.Meta.fields + ('live_duration', 'live_cost')
+
+
 class SessionCreateSerializer(serializers.Serializer):
     player_id = serializers.UUIDField()
     station_id = serializers.UUIDField()
@@ -132,12 +171,21 @@ class SessionCreateSerializer(serializers.Serializer):
         station = validated_data.pop('station')
         duration = validated_data.pop('duration', None)
         
+        with transaction.atomic():
+            return self._start_session(player, station, duration)
+    
+    def _start_session(self, player, station, duration, start_time=None):
         # Créer la session
         session = Session.objects.create(
             player=player,
             station=station
         )
         
+        # Début horodaté par le client (synchronisation hors ligne) : start_time est auto_now_add
+        if start_time is not None:
+            Session.objects.filter(pk=session.pk).update(start_time=start_time)
+            session.start_time = start_time
+        
         # Si une durée est spécifiée, calculer la date de fin et le coût
         if duration:
             from django.utils import timezone
@@ -150,9 +198,8 @@ class SessionCreateSerializer(serializers.Serializer):
             session.duration = duration
             session.end_time = end_time
             
-            # Calculer le coût en fonction de la durée
-            hourly_rate = RateSettings.get_rate_for_station(station.type)
-            session.cost = round(float(hourly_rate) * (duration / 60), 2)
+            # Calculer le coût en fonction de la durée et des tarifs applicables
+            session.cost = session.calculate_cost()
             
             # La session reste active même si une durée est définie
             session.save()
@@ -162,16 +209,28 @@ class SessionCreateSerializer(serializers.Serializer):
         station.current_session = session
         station.save()
         
+        # Journal des changements, dans la même transaction que la session
+        record_session('session.started', session)
+        
         return session
 
 
 class StationSerializer(serializers.ModelSerializer):
     current_session = SessionInfoSerializer(read_only=True)
+    agent_online = serializers.SerializerMethodField()
     
     class Meta:
         model = Station
-        fields = ('id', 'name', 'type', 'status', 'current_session')
-        read_only_fields = ('id', 'current_session')
+        fields = ('id', 'name', 'type', 'status', 'current_session',
+                  'last_seen_at', 'agent_status', 'agent_online')
+        read_only_fields = ('id', 'current_session', 'last_seen_at', 'agent_status')
+    
+    def get_agent_online(self, obj):
+        """L'agent est considéré en ligne s'il a donné signe de vie récemment"""
+        if obj.last_seen_at is None:
+            return False
+        timeout = getattr(settings, 'STATION_HEARTBEAT_TIMEOUT', 30)
+        return timezone.now() - obj.last_seen_at <= datetime.timedelta(seconds=timeout)
     
     def validate_type(self, value):
         if value not in dict(Station.TYPE_CHOICES).keys():
@@ -184,12 +243,71 @@ class StationSerializer(serializers.ModelSerializer):
         return value
 
 
+class HeartbeatSerializer(serializers.Serializer):
+    station_id = serializers.UUIDField()
+    timestamp = serializers.DateTimeField(required=False, help_text=_("Heure du signal (par défaut : réception)"))
+    status = serializers.ChoiceField(choices=Station.AGENT_STATUS_CHOICES, required=False, default='idle')
+    
+    def validate_timestamp(self, value):
+        # Une horloge d'agent en avance ne doit pas repousser la détection de panne
+        return min(value, timezone.now())
+
+
+class ReservationSerializer(serializers.ModelSerializer):
+    station_id = serializers.UUIDField()
+    player_id = serializers.UUIDField()
+    station_name = serializers.CharField(source='station.name', read_only=True)
+    
+    class Meta:
+        model = Reservation
+        fields = ('id', 'station_id', 'station_name', 'player_id', 'start_time', 'end_time',
+                  'is_active', 'created_at')
+        read_only_fields = ('id', 'station_name', 'is_active', 'created_at')
+    
+    def validate(self, data):
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError(_("La fin de la réservation doit être postérieure à son début"))
+        
+        try:
+            player = User.objects.get(pk=data['player_id'])
+            if player.role != 'player':
+                raise serializers.ValidationError(_("L'utilisateur spécifié n'est pas un joueur"))
+        except User.DoesNotExist:
+            raise serializers.ValidationError(_("Joueur non trouvé"))
+        
+        try:
+            station = Station.objects.get(pk=data['station_id'])
+            if station.status == 'maintenance':
+                raise serializers.ValidationError(_("La station est en maintenance"))
+        except Station.DoesNotExist:
+            raise serializers.ValidationError(_("Station non trouvée"))
+        
+        data['player'] = player
+        data['station'] = station
+        return data
+    
+    def create(self, validated_data):
+        request = self.context.get('request')
+        try:
+            # Vérification du chevauchement sous verrou
+            return Reservation.book(
+                station=validated_data['station'],
+                player=validated_data['player'],
+                start=validated_data['start_time'],
+                end=validated_data['end_time'],
+                created_by=request.user if request else None,
+            )
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+
+
 class RateSettingsSerializer(serializers.ModelSerializer):
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
     
     class Meta:
         model = RateSettings
-        fields = ('id', 'hourly_rate', 'station_type', 'description', 'created_by', 
+        fields = ('id', 'hourly_rate', 'station_type', 'description', 'days_of_week',
+                  'period_start', 'period_end', 'min_duration', 'created_by',
                   'created_by_username', 'created_at', 'updated_at', 'is_active')
         read_only_fields = ('id', 'created_by', 'created_by_username', 'created_at', 'updated_at')
     
@@ -198,6 +316,20 @@ class RateSettingsSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(_("Le tarif horaire doit être supérieur à zéro"))
         return value
     
+    def validate_days_of_week(self, value):
+        if value and (not value.isdigit() or any(day not in '0123456' for day in value) or len(set(value)) != len(value)):
+            raise serializers.ValidationError(_("Les jours doivent être des chiffres distincts de 0 (lundi) à 6 (dimanche)"))
+        return ''.join(sorted(value)) if value else ''
+    
+    def validate(self, data):
+        period_start = data.get('period_start', getattr(self.instance, 'period_start', None))
+        period_end = data.get('period_end', getattr(self.instance, 'period_end', None))
+        if (period_start is None) != (period_end is None):
+            raise serializers.ValidationError(_("La plage horaire doit avoir un début et une fin"))
+        if period_start is not None and period_start == period_end:
+            raise serializers.ValidationError(_("Le début et la fin de la plage horaire doivent être différents"))
+        return data
+    
     def validate_station_type(self, value):
         if value not in dict(RateSettings.STATION_TYPE_CHOICES).keys():
             raise serializers.ValidationError(_("Le type de station doit être 'PC', 'console' ou 'all'"))
@@ -210,3 +342,94 @@ class RateSettingsSerializer(serializers.ModelSerializer):
             validated_data['created_by'] = request.user
         
         return super().create(validated_data)
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportJob
+        fields = ('id', 'report', 'params', 'status', 'error', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
+
+
+class ReportJobCreateSerializer(serializers.Serializer):
+    # L'export des sessions n'est pas un rapport sur une période (POST /api/exports/sessions/)
+    report = serializers.ChoiceField(choices=sorted(set(REPORTS) - {'session_snapshot'}))
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    group_by = serializers.ChoiceField(choices=list(GROUP_BY_CHOICES), required=False)
+    station_type = serializers.ChoiceField(choices=Station.TYPE_CHOICES, required=False)
+    refresh = serializers.BooleanField(required=False, default=False,
+                                       help_text=_("Recalcule même si un résultat identique existe"))
+    
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError(_("La date de début doit être antérieure à la date de fin"))
+        return data
+    
+    def job_params(self):
+        """Paramètres du rapport, sous forme JSON stable (sans les options de file)"""
+        data = self.validated_data
+        params = {'start_date': data['start_date'].isoformat(), 'end_date': data['end_date'].isoformat()}
+        if data['report'] == 'utilization':
+            params['group_by'] = data.get('group_by', 'type')
+        if data['report'] == 'heatmap' and data.get('station_type'):
+            params['station_type'] = data['station_type']
+        return params
+
+
+class WebhookSubscriptionSerializer(serializers.ModelSerializer):
+    topics = serializers.ListField(child=serializers.ChoiceField(choices=TOPICS), required=False)
+    secret = serializers.CharField(write_only=True, required=False, allow_blank=True)
+    metrics = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = WebhookSubscription
+        fields = ('id', 'url', 'topics', 'secret', 'batch_size', 'is_active', 'last_event_id',
+                  'created_at', 'metrics')
+        read_only_fields = ('id', 'last_event_id', 'created_at', 'metrics')
+    
+    def validate_batch_size(self, value):
+        if not 1 <= value <= 1000:
+            raise serializers.ValidationError(_("La taille des lots doit être comprise entre 1 et 1000"))
+        return value
+    
+    def create(self, validated_data):
+        # Un nouvel abonnement part de la fin du journal : pas de rattrapage de l'historique
+        validated_data['last_event_id'] = Event.objects.aggregate(head=Max('id'))['head'] or 0
+        return super().create(validated_data)
+    
+    def get_metrics(self, obj):
+        from .webhooks import subscription_metrics
+        return subscription_metrics(obj, self.context.get('head'))
+
+
+class SyncOperationSerializer(serializers.Serializer):
+    op_id = serializers.CharField(max_length=100, help_text=_("Identifiant de l'opération dans la file du client"))
+    type = serializers.ChoiceField(choices=('start', 'end'))
+    client_time = serializers.DateTimeField(required=False, help_text=_("Instant de l'opération sur le poste"))
+    player_id = serializers.UUIDField(required=False)
+    station_id = serializers.UUIDField(required=False)
+    session_id = serializers.UUIDField(required=False, help_text=_("Session à terminer (sinon celle en cours sur station_id)"))
+    duration = serializers.IntegerField(required=False, min_value=1, help_text=_("Durée optionnelle en minutes"))
+    
+    def validate(self, data):
+        if data['type'] == 'start' and not (data.get('player_id') and data.get('station_id')):
+            raise serializers.ValidationError(_("Un démarrage nécessite player_id et station_id"))
+        if data['type'] == 'end' and not (data.get('session_id') or data.get('station_id')):
+            raise serializers.ValidationError(_("Une fin nécessite session_id ou station_id"))
+        return data
+
+
+class SyncRequestSerializer(serializers.Serializer):
+    token = serializers.IntegerField(required=False, default=0, min_value=0,
+                                     help_text=_("Jeton de la synchronisation précédente (0 : état complet)"))
+    operations = SyncOperationSerializer(many=True, required=False, default=list)
+    
+    def validate_operations(self, value):
+        limit = getattr(settings, 'SYNC_MAX_OPERATIONS', 500)
+        if len(value) > limit:
+            raise serializers.ValidationError(_("Au plus %(limit)d opérations par synchronisation") % {'limit': limit})
+        op_ids = [operation['op_id'] for operation in value]
+        if len(set(op_ids)) != len(op_ids):
+            raise serializers.ValidationError(_("Les identifiants d'opération doivent être uniques"))
+        return value
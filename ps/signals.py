@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.db import transaction
+from django.dispatch import receiver
+
+from .availability import station_changed, station_deleted
+from .models import RateSettings, Station
+from .pricing import invalidate_schedule
+
+
+@receiver(post_save, sender=RateSettings)
+@receiver(post_delete, sender=RateSettings)
+def rate_settings_changed(sender, instance, **kwargs):
+    """Recompile le barème après toute modification d'un tarif"""
+    invalidate_schedule()
+
+
+@receiver(post_save, sender=Station)
+def station_saved(sender, instance, **kwargs):
+    """Met à jour l'index des stations disponibles une fois la transaction validée"""
+    transaction.on_commit(lambda: station_changed(instance))
+
+
+@receiver(post_delete, sender=Station)
+def station_removed(sender, instance, **kwargs):
+    """Retire la station de l'index des stations disponibles"""
+    station_id = instance.pk
+    transaction.on_commit(lambda: station_deleted(station_id))
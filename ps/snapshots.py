@@ -0,0 +1,295 @@
+"""
+Export en colonnes de l'historique des sessions, pour l'analyse hors ligne.
+
+Les sessions des deux stockages (table chaude et archive), jointes au type de
+station et au rôle du joueur, sont écrites dans SNAPSHOT_DIR/sessions avec
+une partition par mois de début (month=YYYY-MM), au format :
+
+- Parquet compressé (zstd) si pyarrow est installé : lisible et projetable
+  colonne par colonne par pyarrow, pandas ou DuckDB ;
+- sinon un fichier .npy non compressé par colonne (part-0/<colonne>.npy),
+  que np.load(..., mmap_mode='r') projette en mémoire sans tout lire.
+
+L'export est incrémental : l'empreinte d'un mois est un condensé des lignes
+exportées (identifiants, joueur et son rôle, station et son type, horaires,
+durée, coût, état), lues en un seul parcours par stockage, et seuls les mois
+dont l'empreinte a changé sont réécrits. manifest.json décrit les partitions.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Value
+from django.utils import timezone
+
+from .models import ArchivedSession, Session
+from .reports import day_start
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow est optionnel : repli sur NumPy
+    pa = pq = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+FORMATS = {
+    'parquet': 'part-0.parquet',
+    'npy': 'part-0',  # dossier : un .npy par colonne
+}
+COLUMNS = (
+    'id', 'player_id', 'player_role', 'station_id', 'station_type',
+    'start_time', 'end_time', 'duration', 'cost', 'is_active', 'archived',
+)
+
+
+class SnapshotError(RuntimeError):
+    """Export impossible (aucune bibliothèque de format disponible...)"""
+
+
+def snapshot_dir():
+    return Path(getattr(settings, 'SNAPSHOT_DIR', Path(settings.BASE_DIR) / 'snapshots')) / 'sessions'
+
+
+def default_format():
+    if pa is not None:
+        return 'parquet'
+    if np is not None:
+        return 'npy'
+    return None
+
+
+def read_manifest():
+    """Manifeste de l'export, ou None si aucun export n'a encore été fait"""
+    path = snapshot_dir() / 'manifest.json'
+    if not path.exists():
+        return None
+    with open(path, encoding='utf-8') as manifest:
+        return json.load(manifest)
+
+
+def partition_path(month, fmt):
+    return snapshot_dir() / f'month={month}' / FORMATS[fmt]
+
+
+def month_fingerprints():
+    """
+    {'YYYY-MM': empreinte} des sessions des deux stockages, par mois de début.
+
+    L'empreinte condense les lignes telles qu'elles seraient exportées : un
+    changement de joueur ou de station d'une session, ou du rôle du joueur et
+    du type de la station, réécrit donc le mois même si les totaux sont
+    inchangés.
+    """
+    digests = {}
+    for model in (Session, ArchivedSession):
+        is_active = 'is_active' if model is Session else Value(False)
+        rows = (
+            model.objects
+            .order_by('start_time', 'id')
+            .values_list(
+                'start_time', 'id', 'player_id', 'player__role', 'station_id', 'station__type',
+                'end_time', 'duration', 'cost', is_active,
+            )
+        )
+        for row in rows.iterator(chunk_size=5000):
+            month = timezone.localtime(row[0]).strftime('%Y-%m')
+            digest = digests.get(month)
+            if digest is None:
+                digest = digests[month] = hashlib.sha1()
+            digest.update(f"{model._meta.model_name}:{':'.join(map(str, row))}\n".encode())
+    return {month: digest.hexdigest() for month, digest in digests.items()}
+
+
+def month_columns(month):
+    """Colonnes (listes Python) des sessions commencées pendant le mois 'YYYY-MM'"""
+    first = date.fromisoformat(f'{month}-01')
+    start = day_start(first)
+    end = day_start(date(first.year + first.month // 12, first.month % 12 + 1, 1))
+
+    columns = {name: [] for name in COLUMNS}
+    for model in (Session, ArchivedSession):
+        is_active = 'is_active' if model is Session else Value(False)
+        rows = (
+            model.objects
+            .filter(start_time__gte=start, start_time__lt=end)
+            .order_by('start_time')
+            .values_list(
+                'id', 'player_id', 'player__role', 'station_id', 'station__type',
+                'start_time', 'end_time', 'duration', 'cost', is_active,
+            )
+        )
+        archived = model is ArchivedSession
+        for row in rows.iterator(chunk_size=5000):
+            for name, value in zip(COLUMNS, row + (archived,)):
+                columns[name].append(value)
+    return columns
+
+
+def _write_parquet(columns, path):
+    uuid_text = lambda values: [str(value) if value is not None else None for value in values]
+    table = pa.table({
+        'id': pa.array(uuid_text(columns['id']), pa.string()),
+        'player_id': pa.array(uuid_text(columns['player_id']), pa.string()),
+        'player_role': pa.array(columns['player_role'], pa.string()).dictionary_encode(),
+        'station_id': pa.array(uuid_text(columns['station_id']), pa.string()),
+        'station_type': pa.array(columns['station_type'], pa.string()).dictionary_encode(),
+        'start_time': pa.array(columns['start_time'], pa.timestamp('us', tz='UTC')),
+        'end_time': pa.array(columns['end_time'], pa.timestamp('us', tz='UTC')),
+        'duration': pa.array(columns['duration'], pa.int32()),
+        'cost': pa.array(columns['cost'], pa.decimal128(10, 2)),
+        'is_active': pa.array(columns['is_active'], pa.bool_()),
+        'archived': pa.array(columns['archived'], pa.bool_()),
+    })
+    pq.write_table(table, path, compression='zstd')
+
+
+def _write_npy(columns, path):
+    # Chaînes de largeur fixe plutôt qu'objets Python : seules les premières se projettent en mémoire
+    text = lambda values: np.array(['' if value is None else str(value) for value in values], dtype=str)
+    # Instants en UTC sans fuseau : NumPy ne connaît pas les fuseaux ; None devient NaT
+    moments = lambda values: np.array(
+        [value.astimezone(dt_timezone.utc).replace(tzinfo=None) if value else None for value in values],
+        dtype='datetime64[us]'
+    )
+    numbers = lambda values: np.array([float('nan') if value is None else float(value) for value in values])
+    arrays = {
+        'id': text(columns['id']),
+        'player_id': text(columns['player_id']),
+        'player_role': text(columns['player_role']),
+        'station_id': text(columns['station_id']),
+        'station_type': text(columns['station_type']),
+        'start_time': moments(columns['start_time']),
+        'end_time': moments(columns['end_time']),
+        'duration': numbers(columns['duration']),
+        'cost': numbers(columns['cost']),
+        'is_active': np.array(columns['is_active'], dtype=bool),
+        'archived': np.array(columns['archived'], dtype=bool),
+    }
+    path.mkdir()
+    for name, array in arrays.items():
+        np.save(path / f'{name}.npy', array, allow_pickle=False)
+
+
+WRITERS = {
+    'parquet': _write_parquet,
+    'npy': _write_npy,
+}
+
+
+def write_partition(month, fmt):
+    """Écrit la partition d'un mois de façon atomique et retourne son nombre de lignes"""
+    columns = month_columns(month)
+    path = partition_path(month, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f'.{path.name}.tmp')
+    _remove(temporary)
+    WRITERS[fmt](columns, temporary)
+    if temporary.is_dir() and path.exists():
+        # os.replace ne remplace pas un dossier non vide : l'ancienne partition est d'abord écartée
+        previous = path.with_name(f'.{path.name}.old')
+        _remove(previous)
+        os.replace(path, previous)
+        os.replace(temporary, path)
+        _remove(previous)
+    else:
+        os.replace(temporary, path)
+    return len(columns['id'])
+
+
+def _remove(path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def partition_file(path):
+    """
+    Fichier téléchargeable d'une partition : le fichier Parquet lui-même, ou
+    pour les .npy une archive .npz non compressée (lisible par np.load)
+    construite dans un fichier temporaire.
+    """
+    if not path.is_dir():
+        return open(path, 'rb'), path.suffix
+    archive = tempfile.TemporaryFile()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as bundle:
+        for column in sorted(path.glob('*.npy')):
+            bundle.write(column, column.name)
+    archive.seek(0)
+    return archive, '.npz'
+
+
+def export_sessions(full=False, fmt=None):
+    """
+    Met à jour l'export : réécrit les mois nouveaux ou modifiés (tous avec
+    full=True ou si le format change) et supprime les mois disparus.
+    """
+    fmt = fmt or default_format()
+    if fmt is None:
+        raise SnapshotError("L'export nécessite pyarrow (Parquet) ou NumPy (.npy)")
+    if fmt == 'parquet' and pa is None:
+        raise SnapshotError("Le format parquet nécessite pyarrow (pip install pyarrow)")
+    if fmt == 'npy' and np is None:
+        raise SnapshotError("Le format npy nécessite NumPy (pip install numpy)")
+
+    manifest = read_manifest()
+    if manifest is None:
+        partitions = {}
+    elif full or manifest.get('format') != fmt:
+        # Les partitions de l'ancien format ne doivent pas rester à côté des nouvelles
+        for month in manifest['partitions']:
+            shutil.rmtree(snapshot_dir() / f'month={month}', ignore_errors=True)
+        partitions = {}
+    else:
+        partitions = manifest['partitions']
+
+    fingerprints = month_fingerprints()
+    written, removed = [], []
+    for month in sorted(fingerprints):
+        if partitions.get(month, {}).get('fingerprint') == fingerprints[month]:
+            continue
+        rows = write_partition(month, fmt)
+        partitions[month] = {
+            'file': str(partition_path(month, fmt).relative_to(snapshot_dir())),
+            'rows': rows,
+            'fingerprint': fingerprints[month],
+            'written_at': timezone.now().isoformat(),
+        }
+        written.append(month)
+
+    for month in sorted(set(partitions) - set(fingerprints)):
+        shutil.rmtree(snapshot_dir() / f'month={month}', ignore_errors=True)
+        del partitions[month]
+        removed.append(month)
+
+    manifest = {
+        'format': fmt,
+        'columns': list(COLUMNS),
+        'generated_at': timezone.now().isoformat(),
+        'partitions': dict(sorted(partitions.items())),
+    }
+    path = snapshot_dir() / 'manifest.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name('.manifest.json.tmp')
+    with open(temporary, 'w', encoding='utf-8') as output:
+        json.dump(manifest, output, indent=2)
+    os.replace(temporary, path)
+
+    return {
+        'format': fmt,
+        'written': written,
+        'removed': removed,
+        'unchanged': len(partitions) - len(written),
+        'rows': sum(partition['rows'] for partition in partitions.values()),
+    }
@@ -0,0 +1,171 @@
+"""
+Synchronisation des postes d'accueil hors ligne.
+
+Le client met en file, sans réseau, des opérations horodatées (démarrer une
+session sur une station, terminer une session) puis les envoie en un seul
+POST /api/sync/ avec son jeton de synchronisation :
+
+- les opérations sont appliquées dans l'ordre, dans une seule transaction,
+  chacune dans son point de sauvegarde : une opération en conflit avec
+  l'état courant (station occupée ou en maintenance, session déjà terminée...)
+  est refusée sans annuler les autres ;
+- la réponse donne le résultat de chaque opération et les changements des
+  stations et des sessions depuis le jeton, lus dans le journal (ps.events),
+  y compris ceux des opérations appliquées. Le nouveau jeton est la position
+  du dernier événement transmis.
+
+Sans jeton, ou si le jeton est antérieur aux événements conservés, la
+réponse contient l'état complet (stations et sessions en cours) à la place
+des changements.
+"""
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .events import read_events
+from .models import Event, Session, Station, User
+
+
+SYNC_TOPICS = ('session.started', 'session.ended', 'session.repriced', 'station.status_changed')
+
+
+def _result(operation, status, **extra):
+    return {'op_id': operation['op_id'], 'status': status, **extra}
+
+
+def _client_time(operation, now):
+    # Horloge du poste en avance : l'opération ne peut pas dater du futur
+    moment = operation.get('client_time')
+    return min(moment, now) if moment else now
+
+
+def _start(operation, now):
+    from .serializers import SessionCreateSerializer
+
+    try:
+        player = User.objects.get(pk=operation['player_id'])
+    except User.DoesNotExist:
+        return _result(operation, 'invalid', error="Joueur non trouvé")
+    if player.role != 'player':
+        return _result(operation, 'invalid', error="L'utilisateur spécifié n'est pas un joueur")
+    try:
+        station = Station.objects.select_for_update().get(pk=operation['station_id'])
+    except Station.DoesNotExist:
+        return _result(operation, 'invalid', error="Station non trouvée")
+
+    if station.status != 'available':
+        return _result(
+            operation, 'conflict',
+            error="La station n'est pas disponible",
+            station_status=station.status,
+            current_session_id=str(station.current_session_id) if station.current_session_id else None,
+        )
+    if Session.objects.filter(player=player, is_active=True).exists():
+        return _result(operation, 'conflict', error="Le joueur a déjà une session active")
+
+    session = SessionCreateSerializer()._start_session(
+        player, station, operation.get('duration'), start_time=_client_time(operation, now)
+    )
+    return _result(operation, 'applied', session_id=str(session.pk))
+
+
+def _end(operation, now):
+    if operation.get('session_id'):
+        session = Session.objects.select_related('station').filter(pk=operation['session_id']).first()
+        if session is None:
+            return _result(operation, 'invalid', error="Session non trouvée")
+    else:
+        # Session en cours sur la station, éventuellement démarrée plus tôt dans le même lot
+        try:
+            station = Station.objects.select_for_update().get(pk=operation['station_id'])
+        except Station.DoesNotExist:
+            return _result(operation, 'invalid', error="Station non trouvée")
+        session = Session.objects.select_related('station').filter(station=station, is_active=True).first()
+        if session is None:
+            return _result(operation, 'conflict', error="Aucune session en cours sur la station",
+                           station_status=station.status)
+
+    if not session.is_active:
+        return _result(operation, 'conflict', error="Cette session est déjà terminée", session_id=str(session.pk))
+
+    end_time = max(_client_time(operation, now), session.start_time)
+    session.end_session(end_time=end_time)
+    if session.is_active or session.end_time != end_time:
+        # Terminée entre-temps par une autre requête
+        return _result(operation, 'conflict', error="Cette session est déjà terminée", session_id=str(session.pk))
+    return _result(operation, 'applied', session_id=str(session.pk))
+
+
+APPLY = {
+    'start': _start,
+    'end': _end,
+}
+
+
+def apply_operations(operations):
+    """Applique les opérations dans l'ordre, en une transaction ; retourne un résultat par opération"""
+    now = timezone.now()
+    results = []
+    with transaction.atomic():
+        for operation in operations:
+            try:
+                with transaction.atomic():
+                    results.append(APPLY[operation['type']](operation, now))
+            except DatabaseError as e:
+                # Seul le point de sauvegarde de l'opération est annulé
+                results.append(_result(operation, 'error', error=str(e)))
+    return results
+
+
+def journal_bounds():
+    bounds = Event.objects.aggregate(first=Min('id'), head=Max('id'))
+    return bounds['first'], bounds['head'] or 0
+
+
+def needs_reset(token, first):
+    """Le client doit repartir de l'état complet : premier envoi ou jeton purgé du journal"""
+    if not token:
+        return True
+    # Un trou après le jeton peut aussi venir d'une transaction annulée : l'état complet reste exact
+    return first is None or first > token + 1
+
+
+def changes_since(token, limit=None):
+    """
+    Changements des stations et des sessions depuis `token` :
+    {'token', 'reset', 'has_more'} et soit 'changes' (événements), soit
+    'stations' et 'sessions' (état complet) si needs_reset.
+    """
+    from .serializers import SessionSerializer, StationSerializer
+
+    limit = limit or getattr(settings, 'SYNC_MAX_CHANGES', 1000)
+    first, head = journal_bounds()
+    if needs_reset(token, first):
+        # Position lue avant l'état : un changement concurrent sera retransmis, jamais perdu
+        stations = Station.objects.select_related('current_session__player').order_by('name')
+        sessions = Session.objects.filter(is_active=True).select_related('player', 'station').order_by('start_time')
+        return {
+            'token': head,
+            'reset': True,
+            'has_more': False,
+            'stations': StationSerializer(stations, many=True).data,
+            'sessions': SessionSerializer(sessions, many=True).data,
+        }
+
+    events = read_events(token, limit, SYNC_TOPICS)
+    return {
+        'token': events[-1].id if events else max(token, head),
+        'reset': False,
+        'has_more': len(events) == limit,
+        'changes': [
+            {
+                'id': event.id,
+                'topic': event.topic,
+                'entity_id': event.entity_id,
+                'payload': event.payload,
+                'created_at': event.created_at,
+            }
+            for event in events
+        ],
+    }
@@ -1,3 +1,1969 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import hmac
+import json
+import random
+import re
+import tempfile
+import threading
+import uuid
+from array import array
+from concurrent.futures import Future
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection
+from django.db.models import F, QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import analytics, snapshots
+from .admin import StartTimeDrillDown
+from .archive import archive_sessions
+from .availability import available_stations, free_stations, invalidate_availability
+from .events import compact_events, purge_events, read_events, record, undelivered_events
+from .filters import filter_sessions
+from .heartbeats import HeartbeatBuffer
+from .idempotency import idempotent, purge_expired_keys
+from .leaderboard import METRICS, _is_whole_months, top_players
+from .jobs import claim_jobs, enqueue, finish_job, heartbeat, requeue_stale
+from .pricing import (
+    DEFAULT_HOURLY_RATE, VersionedSchedules, compile_schedule, get_schedule, invalidate_schedule,
+    price_live_sessions, recompute_costs, reprice_sessions, with_live_cost
+)
+from .models import (
+    ArchivedSession, Event, IdempotencyKey, PlayerMonthlyStats, PlayerStats, RateSettings, RateVersion, ReportJob,
+    Reservation, Session, Station, User, WebhookSubscription
+)
+from .reconcile import reconcile
+from .reports import (
+    day_start, merge_partials, month_shards, revenue_report, station_daily_partials, station_revenue_report,
+    usage_report
+)
+from .routers import ReplicaRouter, _routing_state, routing_context
+from .scheduler import ExpiryScheduler
+from .search import normalize
+from .serializers import SessionCreateSerializer
+from .snapshots import export_sessions, partition_file, partition_path, snapshot_dir
+from .sync import SYNC_TOPICS
+from .webhooks import dispatch_once
+
+
+class SessionFilterTests(TestCase):
+    """Filtres de la liste des sessions : résultats et plans d'exécution"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        cls.staff = User.objects.create_user(username='desk', password='x', role='staff')
+        cls.players = User.objects.bulk_create([
+            User(username=f'{prefix}{i}', role='player')
+            for prefix in ('alice', 'bob', 'carol', 'dave') for i in range(100)
+        ])
+        # Un seul PC parmi les stations, comme dans une salle surtout équipée de consoles
+        cls.pc = Station.objects.create(name='PC-1', type='PC')
+        stations = [cls.pc] + [Station.objects.create(name=f'PS-{i}', type='console') for i in range(19)]
+
+        Session.objects.bulk_create([
+            Session(
+                player=rng.choice(cls.players),
+                station=stations[i % len(stations)],
+                is_active=i < 5,
+                duration=rng.randint(10, 120),
+                cost=Decimal(rng.randint(50, 1000)),
+            )
+            for i in range(3000)
+        ])
+        # Sessions réparties sur un an, la plus récente à la fin
+        now = timezone.now()
+        for index, session_id in enumerate(Session.objects.order_by('pk').values_list('pk', flat=True)[:300]):
+            Session.objects.filter(pk=session_id).update(start_time=now - datetime.timedelta(days=index))
+        Session.objects.filter(is_active=False).update(end_time=F('start_time') + datetime.timedelta(hours=1))
+
+        # Statistiques du planificateur, comme sur une base en production
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def get_sessions(self, **params):
+        response = self.client.get('/api/sessions/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_filters_are_combined(self):
+        sessions = self.get_sessions(station_type='PC', min_cost='500', max_duration='60')
+        self.assertTrue(sessions)
+        for session in sessions:
+            self.assertEqual(session['station_id'], str(self.pc.pk))
+            self.assertGreaterEqual(Decimal(session['cost']), 500)
+            self.assertLessEqual(session['duration'], 60)
+
+    def test_date_filter_uses_local_day_bounds(self):
+        today = timezone.localdate()
+        sessions = self.get_sessions(date=today.isoformat())
+        expected = Session.objects.filter(start_time__date=today).count()
+        self.assertEqual(len(sessions), expected)
+
+    def test_player_prefix(self):
+        sessions = self.get_sessions(player='bob')
+        players = {str(player.pk) for player in self.players if player.username.startswith('bob')}
+        self.assertTrue(sessions)
+        self.assertTrue(all(session['player_id'] in players for session in sessions))
+
+    def test_invalid_parameters(self):
+        for params in ({'player_id': 'x'}, {'date': '2024-13-01'}, {'min_cost': 'abc'},
+                       {'min_cost': 'NaN'}, {'max_cost': 'Infinity'}, {'min_cost': '-inf'},
+                       {'is_active': 'maybe'}, {'station_type': 'arcade'}):
+            response = self.client.get('/api/sessions/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    @skipUnless(connection.vendor == 'sqlite', "Plans d'exécution propres à SQLite")
+    def test_query_plans_use_indexes(self):
+        # Sans histogrammes (stat4), SQLite estime une borne unique à une
+        # fraction fixe de la table et préfère alors parcourir l'index de tri :
+        # les intervalles sont donc testés avec leurs deux bornes
+        today = timezone.localdate().isoformat()
+        expected_indexes = [
+            ({'date': today}, {'session_start_idx'}),
+            ({'start_date': today, 'end_date': today}, {'session_start_idx'}),
+            ({'station_id': str(self.pc.pk)}, {'session_station_start_idx'}),
+            ({'station_id': str(self.pc.pk), 'date': today}, {'session_station_start_idx'}),
+            ({'station_type': 'PC', 'date': today}, {'session_station_start_idx', 'session_start_idx'}),
+            ({'is_active': 'true'}, {'session_open_start_idx'}),
+            ({'min_cost': '100', 'max_cost': '120'}, {'session_cost_idx'}),
+            ({'min_duration': '20', 'max_duration': '25'}, {'session_duration_idx'}),
+            ({'player': 'carol1'}, {'ps_session_player_id_5d1dfaac', 'session_player_active_idx'}),
+            ({'player_id': str(self.players[0].pk)}, {'ps_session_player_id_5d1dfaac', 'session_player_active_idx'}),
+        ]
+        for params, indexes in expected_indexes:
+            with self.subTest(params=params):
+                queryset = filter_sessions(Session.objects.select_related('player', 'station'), params)
+                plan = queryset.explain()
+                session_access = re.search(r'(SEARCH|SCAN) ps_session USING (?:COVERING )?INDEX (\w+)', plan)
+                self.assertIsNotNone(session_access, plan)
+                access, index = session_access.groups()
+                self.assertIn(index, indexes, plan)
+                # Recherche par l'index, ou parcours d'un index partiel (sessions en cours)
+                self.assertTrue(access == 'SEARCH' or index == 'session_open_start_idx', plan)
+
+
+class WebhookReceiver(BaseHTTPRequestHandler):
+    """Destinataire de test : enregistre les envois et répond server.reply_status"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(self.server.reply_status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class WebhookDispatchTests(TestCase):
+    """Livraison des événements du journal à un destinataire HTTP local"""
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), WebhookReceiver)
+        self.server.received = []
+        self.server.reply_status = 200
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.subscription = WebhookSubscription.objects.create(
+            url=f'http://127.0.0.1:{self.server.server_port}/hook',
+            topics=['session.started'],
+            secret='s3cret',
+            batch_size=2,
+        )
+        self.events = [record('session.started', i, {'n': i}) for i in range(3)]
+        record('rate.changed', 'r', {})
+
+    def test_batches_are_signed_and_advance_the_cursor(self):
+        self.assertEqual(dispatch_once(), {'delivered': 1, 'failed': 0, 'events': 2})
+        self.assertEqual(dispatch_once(), {'delivered': 1, 'failed': 0, 'events': 1})
+        self.assertEqual(dispatch_once(), {'delivered': 0, 'failed': 0, 'events': 0})
+
+        headers, body = self.server.received[0]
+        expected = 'sha256=' + hmac.new(b's3cret', body, hashlib.sha256).hexdigest()
+        self.assertEqual(headers['X-Webhook-Signature'], expected)
+        batches = [json.loads(body)['events'] for _, body in self.server.received]
+        self.assertEqual([[event['id'] for event in batch] for batch in batches],
+                         [[self.events[0].id, self.events[1].id], [self.events[2].id]])
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.last_event_id, self.events[2].id)
+        self.assertEqual(self.subscription.delivered_events, 3)
+        self.assertEqual(self.subscription.delivered_batches, 2)
+        self.assertEqual(self.subscription.last_status_code, 200)
+
+    def test_failure_schedules_a_retry_without_moving_the_cursor(self):
+        self.server.reply_status = 500
+        self.assertEqual(dispatch_once(), {'delivered': 0, 'failed': 1, 'events': 0})
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.last_event_id, 0)
+        self.assertEqual(self.subscription.consecutive_failures, 1)
+        self.assertEqual(self.subscription.last_status_code, 500)
+        self.assertGreater(self.subscription.next_attempt_at, timezone.now())
+
+        # Pas de nouvel envoi avant l'échéance, puis le même lot est renvoyé
+        self.assertEqual(dispatch_once(), {'delivered': 0, 'failed': 0, 'events': 0})
+        self.server.reply_status = 200
+        later = self.subscription.next_attempt_at + datetime.timedelta(seconds=1)
+        self.assertEqual(dispatch_once(now=later), {'delivered': 1, 'failed': 0, 'events': 2})
+        self.assertEqual(len(self.server.received), 2)
+        self.assertEqual(self.server.received[0][1], self.server.received[1][1])
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.consecutive_failures, 0)
+        self.assertIsNone(self.subscription.next_attempt_at)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routage des lectures vers la réplique (hors transaction : TestCase en ouvre une)"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='desk', password='x', role='staff')
+        self.player = User.objects.create_user(username='player', password='x', role='player')
+        self.station = Station.objects.create(name='PC-1', type='PC')
+        token = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        # Décisions du routeur ; les requêtes s'exécutent toutes sur la base de test
+        self.reads = []
+        route = ReplicaRouter.db_for_read
+
+        def record_read(router, model, **hints):
+            alias = route(router, model, **hints)
+            self.reads.append((model._meta.model_name, alias))
+            return DEFAULT_DB_ALIAS
+
+        patches = [
+            mock.patch('ps.routers.replica_alias', return_value='replica'),
+            mock.patch.object(ReplicaRouter, 'db_for_read', autospec=True, side_effect=record_read),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def route(self, model):
+        ReplicaRouter().db_for_read(model)
+        return self.reads[-1][1]
+
+    def aliases(self, model_name):
+        return {alias for name, alias in self.reads if name == model_name}
+
+    def test_flagged_get_reads_from_replica(self):
+        Session.objects.create(player=self.player, station=self.station)
+        response = self.client.get('/api/sessions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.aliases('session'), {'replica'})
+        # L'utilisateur authentifié est toujours lu sur la base principale
+        self.assertEqual(self.aliases('user'), {DEFAULT_DB_ALIAS})
+
+    def test_writes_and_unflagged_views_use_default(self):
+        response = self.client.post('/api/sessions/', {
+            'player_id': str(self.player.pk), 'station_id': str(self.station.pk),
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.client.get('/api/stations/').status_code, 200)
+        self.assertTrue(self.reads)
+        self.assertEqual({alias for _, alias in self.reads}, {DEFAULT_DB_ALIAS})
+
+    def test_reads_after_a_write_stay_on_default(self):
+        with routing_context(use_replica=True):
+            self.assertEqual(self.route(Session), 'replica')
+            ReplicaRouter().db_for_write(Session)
+            self.assertEqual(self.route(Session), DEFAULT_DB_ALIAS)
+
+    def test_state_is_reset_between_requests(self):
+        self.client.get('/api/sessions/')
+        self.assertIsNone(_routing_state.get())
+        self.reads.clear()
+        self.client.get('/api/stations/')
+        self.assertEqual({alias for _, alias in self.reads}, {DEFAULT_DB_ALIAS})
+        self.assertEqual(self.route(Session), DEFAULT_DB_ALIAS)
+
+
+class OccupancyTests(SimpleTestCase):
+    """Balayage d'occupation et ventilation horaire de la carte de chaleur"""
+
+    def test_sweep_matches_a_minute_by_minute_count(self):
+        rng = random.Random(1)
+        origin = timezone.now().replace(minute=0, second=0, microsecond=0)
+        intervals = []
+        for _ in range(200):
+            started = rng.randrange(0, 48 * 60)
+            intervals.append((rng.choice('ab'), started, started + rng.randrange(1, 300)))
+        intervals.sort(key=lambda interval: interval[1])
+        capacities = {'a': 3, 'b': 2}
+
+        occupancy = analytics.sweep_occupancy(
+            ((group, origin + datetime.timedelta(minutes=s), origin + datetime.timedelta(minutes=e))
+             for group, s, e in intervals),
+            capacities,
+        )
+        for group, capacity in capacities.items():
+            expected = sum(
+                min(capacity, sum(1 for g, s, e in intervals if g == group and s <= minute < e))
+                for minute in range(48 * 60 + 300)
+            ) * 60
+            self.assertAlmostEqual(occupancy[group].total, expected)
+
+    @skipUnless(analytics.np is not None, "NumPy non installé")
+    def test_numpy_and_python_bucketing_agree(self):
+        rng = random.Random(2)
+        hours = 72
+        span = hours * analytics.HOUR - 1800
+        starts, ends, costs = array('d'), array('d'), array('d')
+        for _ in range(500):
+            # Intervalles débordant de la période et bornes tombant pile sur les heures
+            started = rng.choice([rng.uniform(-7200, span), rng.randrange(-2, hours) * analytics.HOUR])
+            starts.append(started)
+            ends.append(started + rng.choice([rng.uniform(1, 20000), 3 * analytics.HOUR]))
+            costs.append(rng.choice([0.0, rng.uniform(1, 50)]))
+
+        vectorized = analytics._bucket_numpy(starts, ends, costs, span, hours)
+        pure = analytics._bucket_python(starts, ends, costs, span, hours)
+        for name, numpy_values, python_values in zip(('occupied', 'revenue', 'peak'), vectorized, pure):
+            with self.subTest(name):
+                self.assertEqual(len(numpy_values), len(python_values))
+                for numpy_value, python_value in zip(numpy_values, python_values):
+                    self.assertAlmostEqual(numpy_value, python_value, places=6)
+
+
+def rate_rule(hourly_rate, station_type='all', days='', period=None, min_duration=0, age=0):
+    """Tarif non enregistré ; `age` en minutes (le plus récent l'emporte à égalité)"""
+    period_start, period_end = (datetime.time(*period[0]), datetime.time(*period[1])) if period else (None, None)
+    return RateSettings(
+        hourly_rate=Decimal(hourly_rate), station_type=station_type, days_of_week=days,
+        period_start=period_start, period_end=period_end, min_duration=min_duration,
+        updated_at=timezone.now() - datetime.timedelta(minutes=age),
+    )
+
+
+def legacy_cost(rules, station_type, minutes):
+    """Ancien Session.calculate_cost : tarif propre au type, sinon « tous », au plus récent"""
+    rules = sorted(rules, key=lambda rule: rule.updated_at, reverse=True)
+    rate = next(
+        (rule.hourly_rate for rule in rules if rule.station_type == station_type),
+        next((rule.hourly_rate for rule in rules if rule.station_type == 'all'), DEFAULT_HOURLY_RATE),
+    )
+    return round(float(rate) * (minutes / 60), 2)
+
+
+def minute_cost(rules, station_type, start, minutes):
+    """Tarification minute par minute, règle par règle : référence du moteur compilé"""
+    def covers(rule, local):
+        days = {int(day) for day in rule.days_of_week} if rule.days_of_week else set(range(7))
+        weekday, moment = local.weekday(), local.time()
+        if rule.period_start is None:
+            return weekday in days
+        if rule.period_start < rule.period_end:
+            return weekday in days and rule.period_start <= moment < rule.period_end
+        # Plage qui passe minuit : rattachée au jour où elle commence
+        return (weekday in days and moment >= rule.period_start) or \
+            ((weekday - 1) % 7 in days and moment < rule.period_end)
+
+    total = 0.0
+    for minute in range(minutes):
+        local = timezone.localtime(start + datetime.timedelta(minutes=minute))
+        eligible = [
+            rule for rule in rules
+            if rule.station_type in (station_type, 'all') and rule.min_duration <= minute and covers(rule, local)
+        ]
+        if eligible:
+            best = max(eligible, key=lambda rule: (
+                rule.station_type == station_type and station_type != 'all',
+                rule.min_duration, rule.has_period, rule.updated_at,
+            ))
+            total += float(best.hourly_rate) / 60
+        else:
+            total += DEFAULT_HOURLY_RATE / 60
+    return round(total, 2)
+
+
+class PricingEngineTests(SimpleTestCase):
+    """Barème compilé comparé à l'ancien calcul et à une tarification minute par minute"""
+
+    # Lundi 2024-01-01, heure locale
+    monday = timezone.make_aware(datetime.datetime(2024, 1, 1))
+
+    def at(self, day, hour, minute=0):
+        return self.monday + datetime.timedelta(days=day, hours=hour, minutes=minute)
+
+    def assertPrices(self, rules, cases):
+        schedule = compile_schedule(rules)
+        for station_type, start, minutes in cases:
+            with self.subTest(station_type=station_type, start=start, minutes=minutes):
+                self.assertAlmostEqual(
+                    schedule.price(station_type, start, minutes),
+                    minute_cost(rules, station_type, start, minutes),
+                    places=2,
+                )
+
+    def test_flat_rate_matches_legacy_cost(self):
+        rules = [rate_rule('600')]
+        schedule = compile_schedule(rules)
+        self.assertTrue(schedule.is_flat)
+        for station_type in ('PC', 'console', 'all'):
+            for minutes in (1, 45, 60, 95, 24 * 60 + 7):
+                self.assertEqual(schedule.price(station_type, self.at(2, 15, 10), minutes),
+                                 legacy_cost(rules, station_type, minutes))
+        self.assertEqual(compile_schedule([]).price('PC', self.at(0, 0), 60), DEFAULT_HOURLY_RATE)
+
+    def test_station_type_rate_beats_all(self):
+        # Le tarif « tous » est plus récent, mais le tarif PC reste prioritaire
+        rules = [rate_rule('500', age=0), rate_rule('800', station_type='PC', age=10)]
+        schedule = compile_schedule(rules)
+        for station_type in ('PC', 'console', 'all'):
+            self.assertEqual(schedule.price(station_type, self.at(3, 9), 90), legacy_cost(rules, station_type, 90))
+        self.assertEqual(schedule.price('PC', self.at(3, 9), 90), 1200.0)
+        self.assertEqual(schedule.price('console', self.at(3, 9), 90), 750.0)
+
+    def test_day_of_week_window(self):
+        rules = [rate_rule('600'), rate_rule('1000', station_type='PC', days='56')]
+        # Vendredi 23:00 -> samedi 01:00 : une heure au tarif de base, une heure au tarif week-end
+        self.assertEqual(compile_schedule(rules).price('PC', self.at(4, 23), 120), 1600.0)
+        self.assertPrices(rules, [
+            ('PC', self.at(4, 23), 120),
+            ('console', self.at(4, 23), 120),
+            ('PC', self.at(5, 10, 30), 300),
+            ('PC', self.at(6, 22), 180),
+        ])
+
+    def test_period_crossing_midnight(self):
+        rules = [rate_rule('600'), rate_rule('300', period=((22, 0), (2, 0)))]
+        # 21:00 -> 03:00 : 1 h + 1 h à 600, 4 h à 300
+        self.assertEqual(compile_schedule(rules).price('console', self.at(1, 21), 360), 2400.0)
+        self.assertPrices(rules, [
+            ('console', self.at(1, 21), 360),
+            ('PC', self.at(2, 1, 30), 45),
+            ('all', self.at(3, 23, 59), 3),
+        ])
+
+    def test_session_crossing_the_week_boundary(self):
+        # Plage du dimanche 22:00 au lundi 02:00 : le barème reboucle sur le début de semaine
+        rules = [rate_rule('600'), rate_rule('300', days='6', period=((22, 0), (2, 0)))]
+        self.assertEqual(compile_schedule(rules).price('PC', self.at(6, 21), 360), 2400.0)
+        self.assertPrices(rules, [
+            ('PC', self.at(6, 21), 360),
+            ('PC', self.at(6, 23, 30), 8 * 24 * 60),
+            ('console', self.at(0, 1), 90),
+        ])
+
+    def test_min_duration_tiers(self):
+        rules = [
+            rate_rule('600'),
+            rate_rule('400', min_duration=60),
+            rate_rule('300', min_duration=180),
+            rate_rule('900', station_type='PC', period=((18, 0), (23, 0))),
+        ]
+        # 60 min à 600, 120 min à 400, 60 min à 300
+        self.assertEqual(compile_schedule(rules).price('console', self.at(0, 9), 240), 1700.0)
+        self.assertPrices(rules, [
+            ('console', self.at(0, 9), 240),
+            ('PC', self.at(0, 17), 300),
+            ('PC', self.at(0, 20), 59),
+            ('all', self.at(4, 10), 61),
+        ])
+
+
+class RecomputeCostsTests(TestCase):
+    """Recalcul des coûts d'après les versions de tarifs en vigueur au début des sessions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = User.objects.create_user(username='player', password='x', role='player')
+        cls.pc = Station.objects.create(name='PC-1', type='PC')
+        cls.console = Station.objects.create(name='PS-1', type='console')
+        cls.t0 = timezone.make_aware(datetime.datetime(2024, 3, 1))
+        cls.t1 = cls.t0 + datetime.timedelta(days=10)
+        cls.t2 = cls.t0 + datetime.timedelta(days=20)
+        # PC : 800 jusqu'à t1, puis le tarif « tous » (600) jusqu'à t2, puis 1000
+        RateVersion.objects.bulk_create([
+            RateVersion(station_type='all', hourly_rate=500, effective_from=cls.t0, effective_to=cls.t1),
+            RateVersion(station_type='PC', hourly_rate=800, effective_from=cls.t0 - datetime.timedelta(days=1),
+                        effective_to=cls.t1),
+            RateVersion(station_type='all', hourly_rate=600, effective_from=cls.t1),
+            RateVersion(station_type='PC', hourly_rate=1000, effective_from=cls.t2),
+        ])
+
+    def make_session(self, station, start, minutes, archived=False):
+        end = start + datetime.timedelta(minutes=minutes)
+        if archived:
+            return ArchivedSession.objects.create(
+                id=uuid.uuid4(), player=self.player, station=station,
+                start_time=start, end_time=end, duration=minutes, cost=0,
+            )
+        session = Session.objects.create(player=self.player, station=station, is_active=False,
+                                         end_time=end, duration=minutes, cost=0)
+        Session.objects.filter(pk=session.pk).update(start_time=start)
+        return session
+
+    def costs(self):
+        return {
+            str(pk): cost
+            for model in (Session, ArchivedSession)
+            for pk, cost in model.objects.values_list('pk', 'cost')
+        }
+
+    def make_sessions(self):
+        hours = datetime.timedelta(hours=1)
+        return {
+            'pc-era-0': self.make_session(self.pc, self.t0 + 5 * hours, 95),
+            'console-era-0': self.make_session(self.console, self.t0 + 6 * hours, 95),
+            'none-era-0': self.make_session(None, self.t0 + 7 * hours, 30),
+            'pc-era-1': self.make_session(self.pc, self.t1 + 5 * hours, 95),
+            'pc-era-2': self.make_session(self.pc, self.t2 + 5 * hours, 95),
+            'archived-pc-era-0': self.make_session(self.pc, self.t0 + 8 * hours, 61, archived=True),
+            'archived-console-era-2': self.make_session(self.console, self.t2 + 8 * hours, 61, archived=True),
+        }
+
+    def test_version_in_force_at_session_start(self):
+        sessions = self.make_sessions()
+        active = Session.objects.create(player=self.player, station=self.pc, cost=0)
+        Session.objects.filter(pk=active.pk).update(start_time=self.t0 + datetime.timedelta(hours=9))
+
+        stats = recompute_costs(self.t0, self.t2 + datetime.timedelta(days=1))
+        self.assertEqual(stats['mode'], 'sql')
+
+        costs = self.costs()
+        expected = {
+            'pc-era-0': '1266.67',                # 95 min à 800 (tarif PC plus ancien, mais propre au type)
+            'console-era-0': '791.67',            # 95 min à 500
+            'none-era-0': '250.00',               # 30 min à 500
+            'pc-era-1': '950.00',                 # 95 min à 600 : plus de version PC entre t1 et t2
+            'pc-era-2': '1583.33',                # 95 min à 1000
+            'archived-pc-era-0': '813.33',        # 61 min à 800
+            'archived-console-era-2': '610.00',   # 61 min à 600
+        }
+        for name, cost in expected.items():
+            with self.subTest(name):
+                self.assertEqual(costs[str(sessions[name].pk)], Decimal(cost))
+        # Les sessions en cours ne sont pas recalculées
+        self.assertEqual(costs[str(active.pk)], Decimal('0'))
+
+    def test_sql_and_engine_paths_agree_for_flat_versions(self):
+        self.make_sessions()
+        end = self.t2 + datetime.timedelta(days=1)
+        self.assertEqual(recompute_costs(self.t0, end)['mode'], 'sql')
+        sql_costs = self.costs()
+
+        Session.objects.update(cost=0)
+        ArchivedSession.objects.update(cost=0)
+        schedules = VersionedSchedules(RateVersion.overlapping(self.t0, end))
+        for model in (Session, ArchivedSession):
+            reprice_sessions(model.objects.all(), schedule_at=schedules.at)
+        self.assertEqual(self.costs(), sql_costs)
+
+    def test_windowed_version_uses_the_engine(self):
+        session = self.make_session(self.console, self.t1 + datetime.timedelta(hours=21), 120)
+        RateVersion.objects.create(station_type='all', hourly_rate=300, effective_from=self.t1,
+                                   period_start=datetime.time(22), period_end=datetime.time(23))
+
+        stats = recompute_costs(self.t1, self.t2)
+        self.assertEqual(stats['mode'], 'engine')
+        session.refresh_from_db()
+        # 21:00-22:00 à 600, 22:00-23:00 à 300
+        self.assertEqual(session.cost, Decimal('900.00'))
+
+
+class PlayerStatsTests(TestCase):
+    """Cumuls des joueurs : ajouts incrémentaux, reconstruction et recalcul des coûts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.players = [User.objects.create_user(username=f'p{i}', password='x', role='player') for i in range(2)]
+        cls.pc = Station.objects.create(name='PC-1', type='PC')
+        cls.console = Station.objects.create(name='PS-1', type='console')
+        cls.t0 = timezone.make_aware(datetime.datetime(2024, 1, 1))
+        hours = datetime.timedelta(hours=1)
+        sessions = [
+            # Dernière session de janvier terminée en février
+            (cls.players[0], cls.pc, cls.t0 + 30 * 24 * hours + 23 * hours, 90),
+            (cls.players[0], cls.console, cls.t0 + 5 * hours, 45),
+            (cls.players[0], None, cls.t0 + 40 * 24 * hours, 30),
+            (cls.players[1], cls.pc, cls.t0 + 10 * 24 * hours, 61),
+            (cls.players[1], cls.console, cls.t0 + 45 * 24 * hours, 120),
+        ]
+        for player, station, start, minutes in sessions:
+            session = Session.objects.create(
+                player=player, station=station, is_active=False,
+                end_time=start + datetime.timedelta(minutes=minutes), duration=minutes, cost=Decimal(minutes * 10),
+            )
+            Session.objects.filter(pk=session.pk).update(start_time=start)
+        ArchivedSession.objects.create(
+            id=uuid.uuid4(), player=cls.players[1], station=cls.pc, start_time=cls.t0 + 2 * hours,
+            end_time=cls.t0 + 3 * hours, duration=60, cost=Decimal('600'),
+        )
+        # Session prépayée en cours : hors des cumuls
+        prepaid = Session.objects.create(player=cls.players[1], station=cls.console, duration=30, cost=Decimal('250'))
+        Session.objects.filter(pk=prepaid.pk).update(start_time=cls.t0 + 50 * 24 * hours)
+
+    def snapshot(self):
+        return (
+            set(PlayerStats.objects.values_list('player_id', 'session_count', 'total_minutes', 'total_spent',
+                                                'last_visit')),
+            set(PlayerMonthlyStats.objects.values_list('player_id', 'month', 'session_count', 'total_minutes',
+                                                       'total_spent')),
+        )
+
+    def rebuilt(self):
+        PlayerStats.rebuild()
+        return self.snapshot()
+
+    def closed(self):
+        return Session.objects.filter(is_active=False)
+
+    def test_incremental_updates_match_rebuild(self):
+        for session in list(self.closed()) + list(ArchivedSession.objects.all()):
+            PlayerStats.add_session(session)
+        one_by_one = self.snapshot()
+
+        PlayerStats.objects.all().delete()
+        PlayerMonthlyStats.objects.all().delete()
+        PlayerStats.add_sessions(self.closed())
+        PlayerStats.add_sessions(ArchivedSession.objects.all())
+        self.assertEqual(self.snapshot(), one_by_one)
+
+        self.assertEqual(self.rebuilt(), one_by_one)
+        self.assertEqual(PlayerMonthlyStats.objects.filter(player=self.players[0]).count(), 2)
+
+    def test_reprice_keeps_stats_in_sync(self):
+        before = self.rebuilt()
+        schedule = compile_schedule([rate_rule('900'), rate_rule('1200', station_type='PC')])
+        changed = sum(reprice_sessions(model.objects.all(), schedule=schedule) for model in (Session, ArchivedSession))
+        self.assertEqual(changed, 7)
+
+        after = self.snapshot()
+        self.assertNotEqual(after, before)
+        self.assertEqual(self.rebuilt(), after)
+
+    def test_recompute_keeps_stats_in_sync(self):
+        self.rebuilt()
+        end = self.t0 + datetime.timedelta(days=60)
+        RateVersion.objects.create(station_type='all', hourly_rate=700, effective_from=self.t0)
+        self.assertEqual(recompute_costs(self.t0, end)['mode'], 'sql')
+        self.assertEqual(self.snapshot(), self.rebuilt())
+        # Une annonce par session recalculée, prépayée en cours exclue
+        self.assertEqual(Event.objects.filter(topic='session.repriced').count(), 6)
+
+        RateVersion.objects.create(station_type='PC', hourly_rate=400, effective_from=self.t0,
+                                   period_start=datetime.time(0), period_end=datetime.time(12))
+        self.assertEqual(recompute_costs(self.t0, end)['mode'], 'engine')
+        self.assertEqual(self.snapshot(), self.rebuilt())
+
+
+def start_session(player, station, duration=None):
+    """Démarre une session comme POST /api/sessions/"""
+    data = {'player_id': player.pk, 'station_id': station.pk}
+    if duration:
+        data['duration'] = duration
+    serializer = SessionCreateSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+class ExpirySchedulerTests(TestCase):
+    """Expiration des sessions prépayées à leur échéance"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.players = [User.objects.create_user(username=f'p{i}', password='x', role='player') for i in range(4)]
+        cls.stations = [Station.objects.create(name=f'PC-{i}', type='PC') for i in range(4)]
+
+    def ended_events(self, session):
+        return Event.objects.filter(topic='session.ended', entity_id=str(session.pk)).count()
+
+    def test_ends_exactly_the_due_sessions(self):
+        now = timezone.now()
+        due = start_session(self.players[0], self.stations[0], duration=30)
+        Session.objects.filter(pk=due.pk).update(end_time=now - datetime.timedelta(minutes=1))
+        later = start_session(self.players[1], self.stations[1], duration=30)
+        open_ended = start_session(self.players[2], self.stations[2])
+        closed = start_session(self.players[3], self.stations[3])
+        closed.end_session(end_time=now - datetime.timedelta(minutes=5))
+
+        scheduler = ExpiryScheduler()
+        self.assertEqual(scheduler.load(), 2)
+        self.assertEqual(scheduler.tick(now=now), 1)
+        self.assertEqual(scheduler.tick(now=now), 0)
+
+        self.assertEqual(
+            set(Session.objects.filter(is_active=True).values_list('pk', flat=True)),
+            {later.pk, open_ended.pk},
+        )
+        station = Station.objects.get(pk=self.stations[0].pk)
+        self.assertEqual((station.status, station.current_session_id), ('available', None))
+        self.assertEqual(Station.objects.get(pk=self.stations[1].pk).status, 'in_use')
+        self.assertEqual(PlayerStats.objects.get(player=self.players[0]).session_count, 1)
+        self.assertFalse(PlayerStats.objects.filter(player=self.players[1]).exists())
+        self.assertEqual(self.ended_events(due), 1)
+        self.assertEqual(self.ended_events(closed), 1)
+
+    def test_sessions_started_after_load_are_followed(self):
+        scheduler = ExpiryScheduler()
+        self.assertEqual(scheduler.load(), 0)
+        session = start_session(self.players[0], self.stations[0], duration=30)
+        start_session(self.players[1], self.stations[1])
+
+        # Sans reconstruction du tas : le démarrage est lu dans le journal
+        self.assertEqual(scheduler.follow(), 1)
+        self.assertEqual(scheduler.follow(), 0)
+        self.assertEqual(scheduler.next_expiry(), session.end_time)
+        self.assertEqual(scheduler.tick(now=session.end_time - datetime.timedelta(seconds=1)), 0)
+        self.assertEqual(scheduler.tick(now=session.end_time), 1)
+        self.assertFalse(Session.objects.get(pk=session.pk).is_active)
+        self.assertEqual(self.ended_events(session), 1)
+
+
+class LiveCostTests(TestCase):
+    """Coût courant des sessions actives comparé au moteur de tarification"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.players = [User.objects.create_user(username=f'p{i}', password='x', role='player') for i in range(3)]
+        cls.pc = Station.objects.create(name='PC-1', type='PC')
+        cls.console = Station.objects.create(name='PS-1', type='console')
+
+    def setUp(self):
+        invalidate_schedule()
+        self.addCleanup(invalidate_schedule)
+        started = timezone.now() - datetime.timedelta(minutes=95)
+        for player, station in zip(self.players, (self.pc, self.console, None)):
+            session = Session.objects.create(player=player, station=station)
+            Session.objects.filter(pk=session.pk).update(start_time=started)
+
+    def add_rate(self, hourly_rate, **fields):
+        rate = RateSettings.objects.create(hourly_rate=Decimal(hourly_rate), **fields)
+        invalidate_schedule()
+        return rate
+
+    def assertMatchesEngine(self, sessions):
+        schedule = get_schedule()
+        for session in sessions:
+            station_type = session.station.type if session.station else 'all'
+            with self.subTest(station_type=station_type):
+                expected = schedule.price(station_type, session.start_time, session.live_duration)
+                self.assertEqual(session.live_cost, Decimal(str(expected)).quantize(Decimal('0.01')))
+
+    def test_sql_cost_follows_schedule_precedence(self):
+        # Tarif PC restreint (tous les jours) : prioritaire sur le tarif PC permanent plus récent
+        self.add_rate('900', station_type='PC', days_of_week='0123456')
+        self.add_rate('800', station_type='PC')
+        # Palier sans effet sur la console au tarif identique, mais plus récent
+        self.add_rate('500', station_type='console')
+        self.add_rate('500', station_type='console', min_duration=60)
+        self.add_rate('600')
+        self.assertTrue(get_schedule().is_flat)
+        # Expressions SQL seules, sans correction par le moteur
+        self.assertMatchesEngine(with_live_cost(Session.objects.all()))
+
+    def test_engine_fallback_for_windowed_schedule(self):
+        self.add_rate('600')
+        self.add_rate('300', period_start=datetime.time(0), period_end=datetime.time(23, 59))
+        self.add_rate('400', station_type='PC', min_duration=30)
+        self.assertFalse(get_schedule().is_flat)
+        self.assertMatchesEngine(price_live_sessions(with_live_cost(Session.objects.all())))
+
+
+class AvailabilityTests(TestCase):
+    """Index des stations disponibles et réservation de la première station libre"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='desk', password='x', role='staff')
+        cls.players = [User.objects.create_user(username=f'p{i}', password='x', role='player') for i in range(3)]
+        cls.pcs = [Station.objects.create(name=f'PC-{i}', type='PC') for i in (1, 2)]
+        cls.console = Station.objects.create(name='PS-1', type='console')
+
+    def setUp(self):
+        invalidate_availability()
+        self.addCleanup(invalidate_availability)
+        token = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def reserve(self, player, station_type='PC'):
+        return self.client.post('/api/stations/available/', {
+            'type': station_type, 'player_id': str(player.pk), 'reserve': True,
+        }, content_type='application/json')
+
+    def available_names(self, station_type=None):
+        return [station['name'] for station in available_stations(station_type)]
+
+    def test_index_follows_station_saves(self):
+        self.assertEqual(self.available_names('PC'), ['PC-1', 'PC-2'])
+        # L'index n'est mis à jour qu'une fois la transaction validée
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pcs[0].status = 'maintenance'
+            self.pcs[0].save()
+            self.assertEqual(self.available_names(), ['PC-1', 'PC-2', 'PS-1'])
+        self.assertEqual(self.available_names(), ['PC-2', 'PS-1'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.console.type = 'PC'
+            self.console.save()
+        self.assertEqual(self.available_names('PC'), ['PC-2', 'PS-1'])
+        self.assertEqual(self.available_names('console'), [])
+
+    def test_reserve_claims_stations_in_order_then_conflicts(self):
+        claimed = []
+        for player in self.players[:2]:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.reserve(player)
+            self.assertEqual(response.status_code, 201, response.content)
+            claimed.append(response.json()['station_id'])
+        self.assertEqual(claimed, [str(station.pk) for station in self.pcs])
+        self.assertEqual(set(Station.objects.filter(type='PC').values_list('status', flat=True)), {'in_use'})
+        self.assertEqual(self.available_names('PC'), [])
+
+        response = self.reserve(self.players[2])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Session.objects.count(), 2)
+
+    def test_reserve_skips_locked_stations(self):
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=select_for_update) as lock:
+            response = self.reserve(self.players[0], 'console')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(any(call.kwargs.get('skip_locked') for call in lock.call_args_list))
+        self.console.refresh_from_db()
+        self.assertEqual(self.console.status, 'in_use')
+
+
+class ReservationTests(TestCase):
+    """Réservations sur plage horaire : chevauchements et stations libres"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='desk', password='x', role='staff')
+        cls.player = User.objects.create_user(username='player', password='x', role='player')
+        cls.stations = {name: Station.objects.create(name=name, type='PC') for name in ('PC-1', 'PC-2', 'PC-3', 'PC-4')}
+        cls.start = timezone.now().replace(microsecond=0) + datetime.timedelta(days=1)
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def at(self, hours):
+        return self.start + datetime.timedelta(hours=hours)
+
+    def book(self, name, start, end):
+        return self.client.post('/api/reservations/', {
+            'station_id': str(self.stations[name].pk), 'player_id': str(self.player.pk),
+            'start_time': self.at(start).isoformat(), 'end_time': self.at(end).isoformat(),
+        }, content_type='application/json')
+
+    def free_names(self, start, end):
+        return [station['name'] for station in free_stations(self.at(start), self.at(end))]
+
+    def test_overlapping_bookings_are_rejected(self):
+        self.assertEqual(self.book('PC-1', 1, 3).status_code, 201)
+        for start, end in ((0, 2), (2, 4), (1.5, 2.5), (0, 4), (1, 3)):
+            with self.subTest(start=start, end=end):
+                response = self.book('PC-1', start, end)
+                self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(Reservation.objects.filter(station=self.stations['PC-1']).count(), 1)
+        # Même plage sur une autre station
+        self.assertEqual(self.book('PC-2', 1, 3).status_code, 201)
+
+    def test_back_to_back_bookings_are_accepted(self):
+        for start, end in ((1, 2), (2, 3), (0, 1)):
+            with self.subTest(start=start, end=end):
+                response = self.book('PC-1', start, end)
+                self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Reservation.objects.filter(station=self.stations['PC-1']).count(), 3)
+
+    def test_cancelled_booking_frees_the_range(self):
+        reservation = Reservation.book(self.stations['PC-1'], self.player, self.at(1), self.at(2))
+        reservation.is_active = False
+        reservation.save()
+        self.assertEqual(self.book('PC-1', 1, 2).status_code, 201)
+
+    def test_free_stations_excludes_reserved_and_occupied(self):
+        Reservation.book(self.stations['PC-1'], self.player, self.at(1), self.at(2))
+        Station.objects.filter(pk=self.stations['PC-3'].pk).update(status='maintenance')
+        # Session ouverte sans heure de fin : occupe la station jusqu'à nouvel ordre
+        start_session(self.player, self.stations['PC-2'])
+        self.assertEqual(self.free_names(1, 2), ['PC-4'])
+        # La réservation ne couvre pas la plage suivante, la session si
+        self.assertEqual(self.free_names(2, 3), ['PC-1', 'PC-4'])
+
+        # Session à durée fixe : la station est libre après sa fin prévue
+        Session.objects.filter(station=self.stations['PC-2']).update(end_time=self.at(1.5))
+        self.assertEqual(self.free_names(1.5, 3), ['PC-2', 'PC-4'])
+        self.assertEqual(self.free_names(1, 1.5), ['PC-4'])
+
+        response = self.client.get('/api/stations/available/', {
+            'start': self.at(2).isoformat(), 'end': self.at(3).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([station['name'] for station in response.json()], ['PC-1', 'PC-2', 'PC-4'])
+
+
+class ReconcileTests(TestCase):
+    """Réconciliation : chaque incohérence est corrigée une seule fois"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = User.objects.create_user(username='player', password='x', role='player')
+        cls.station = Station.objects.create(name='PC-1', type='PC')
+        RateSettings.objects.create(hourly_rate=Decimal('600'))
+
+    def setUp(self):
+        invalidate_schedule()
+        self.addCleanup(invalidate_schedule)
+        self.now = timezone.now()
+
+    def start(self, minutes_ago, duration=None):
+        session = start_session(self.player, self.station, duration)
+        start_time = self.now - datetime.timedelta(minutes=minutes_ago)
+        end_time = start_time + datetime.timedelta(minutes=duration) if duration else None
+        Session.objects.filter(pk=session.pk).update(start_time=start_time, end_time=end_time)
+        return Session.objects.get(pk=session.pk)
+
+    def events(self, topic):
+        return list(Event.objects.filter(topic=topic).values_list('entity_id', flat=True))
+
+    def reconcile_twice(self):
+        found = reconcile(now=self.now)
+        # Deuxième passage : plus rien à corriger, ni événement ni cumul en double
+        self.assertEqual(reconcile(now=self.now), {key: [] for key in found})
+        self.station.refresh_from_db()
+        return found
+
+    def assertStats(self, sessions, minutes, spent):
+        stats = PlayerStats.objects.filter(player=self.player).first()
+        self.assertEqual(
+            (stats.session_count, stats.total_minutes, stats.total_spent) if stats else (0, 0, 0),
+            (sessions, minutes, Decimal(spent)),
+        )
+
+    def test_station_pointing_at_ended_session_is_released(self):
+        session = self.start(minutes_ago=30)
+        # Session terminée sans mise à jour de sa station
+        Session.objects.filter(pk=session.pk).update(is_active=False, end_time=self.now, duration=30)
+        Event.objects.all().delete()
+
+        found = self.reconcile_twice()
+        self.assertEqual(found['released_stations'], [self.station.pk])
+        self.assertEqual((self.station.status, self.station.current_session), ('available', None))
+        self.assertEqual(self.events('station.status_changed'), [str(self.station.pk)])
+        self.assertEqual(self.events('session.ended'), [])
+        self.assertStats(0, 0, 0)
+
+    def test_in_use_station_without_session_is_released(self):
+        Station.objects.filter(pk=self.station.pk).update(status='in_use')
+        Event.objects.all().delete()
+
+        found = self.reconcile_twice()
+        self.assertEqual(found['released_stations'], [self.station.pk])
+        self.assertEqual(self.station.status, 'available')
+        self.assertEqual(self.events('station.status_changed'), [str(self.station.pk)])
+
+    def test_orphaned_session_is_ended(self):
+        session = self.start(minutes_ago=45)
+        # Station libérée sans terminer la session
+        Station.objects.filter(pk=self.station.pk).update(status='available', current_session=None)
+        Event.objects.all().delete()
+
+        found = self.reconcile_twice()
+        self.assertEqual(found['ended_sessions'], [session.pk])
+        session.refresh_from_db()
+        self.assertEqual((session.is_active, session.end_time, session.duration), (False, self.now, 45))
+        self.assertEqual(session.cost, Decimal('450.00'))
+        self.assertEqual(self.events('session.ended'), [str(session.pk)])
+        self.assertEqual(self.events('station.status_changed'), [])
+        self.assertStats(1, 45, '450.00')
+
+    def test_expired_session_is_ended_at_its_end_time(self):
+        session = self.start(minutes_ago=120, duration=30)
+        Event.objects.all().delete()
+
+        found = self.reconcile_twice()
+        self.assertEqual(found['ended_sessions'], [session.pk])
+        self.assertEqual(found['released_stations'], [self.station.pk])
+        session.refresh_from_db()
+        self.assertEqual((session.is_active, session.duration, session.cost), (False, 30, Decimal('300.00')))
+        self.assertEqual(session.end_time, self.now - datetime.timedelta(minutes=90))
+        self.assertEqual((self.station.status, self.station.current_session), ('available', None))
+        self.assertEqual(self.events('session.ended'), [str(session.pk)])
+        self.assertEqual(self.events('station.status_changed'), [str(self.station.pk)])
+        self.assertStats(1, 30, '300.00')
+
+    def test_running_prepaid_session_is_left_alone(self):
+        session = self.start(minutes_ago=10, duration=30)
+        self.assertEqual(self.reconcile_twice(), {
+            'released_stations': [], 'occupied_stations': [], 'ended_sessions': [],
+        })
+        session.refresh_from_db()
+        self.assertTrue(session.is_active)
+        self.assertEqual(self.station.status, 'in_use')
+
+
+class StartTimeDrillDownTests(TestCase):
+    """Filtre année → mois → jour de l'admin des sessions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='x')
+        player = User.objects.create_user(username='player', password='x', role='player')
+        session = Session.objects.create(player=player, is_active=False, duration=30, cost=Decimal('250'))
+        Session.objects.filter(pk=session.pk).update(start_time=timezone.make_aware(datetime.datetime(2024, 3, 5, 10)))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def choices(self, value):
+        response = self.client.get('/admin/ps/session/', {'start': value})
+        self.assertEqual(response.status_code, 200, value)
+        spec = next(spec for spec in response.context['cl'].filter_specs if isinstance(spec, StartTimeDrillDown))
+        return [lookup for lookup, _ in spec.lookup_choices]
+
+    def test_drill_down_choices(self):
+        self.assertEqual(self.choices('2024')[:4], ['2024', '2024-01', '2024-02', '2024-03'])
+        self.assertEqual(self.choices('2024-02')[:3], ['2024', '2024-02', '2024-02-01'])
+        self.assertEqual(len(self.choices('2024-02')), 2 + 29)
+        self.assertEqual(self.choices('2024-03-05'), ['2024', '2024-03', '2024-03-05'])
+
+    def test_invalid_period_redirects_to_error_flag(self):
+        for value in ('abcdefg', '2024-13', 'abcd', '2024-02-30', '9999'):
+            with self.subTest(value=value):
+                response = self.client.get('/admin/ps/session/', {'start': value})
+                self.assertEqual(response.status_code, 302)
+                self.assertTrue(response['Location'].endswith('?e=1'))
+
+
+class ReportJobTests(TestCase):
+    """File des rapports : déduplication, réclamation, issue et reprise des travaux"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.jobs_dir = Path(directory.name)
+        patch = override_settings(REPORT_JOBS_DIR=self.jobs_dir)
+        patch.enable()
+        self.addCleanup(patch.disable)
+
+    def params(self, days_ago=10):
+        end = timezone.localdate() - datetime.timedelta(days=days_ago)
+        return {'start_date': (end - datetime.timedelta(days=6)).isoformat(), 'end_date': end.isoformat()}
+
+    def done(self, job, finished_ago=0):
+        job.result_file = f'{job.report}-{job.params_hash}.json'
+        (self.jobs_dir / job.result_file).write_text('{}')
+        finished_at = timezone.now() - datetime.timedelta(seconds=finished_ago)
+        ReportJob.objects.filter(pk=job.pk).update(status='done', result_file=job.result_file, finished_at=finished_at)
+
+    def test_enqueue_deduplicates_queued_jobs(self):
+        job = enqueue('revenue', self.params())
+        self.assertEqual(enqueue('revenue', self.params()), job)
+        self.assertNotEqual(enqueue('usage', self.params()), job)
+        self.assertNotEqual(enqueue('revenue', self.params(days_ago=11)), job)
+        self.assertNotEqual(enqueue('revenue', self.params(), refresh=True), job)
+        ReportJob.objects.update(status='failed')
+        self.assertEqual(enqueue('revenue', self.params()).status, 'pending')
+        self.assertEqual(ReportJob.objects.count(), 5)
+        with self.assertRaises(ValueError):
+            enqueue('unknown', self.params())
+
+    def test_enqueue_reuses_finished_results(self):
+        closed = enqueue('revenue', self.params())
+        self.done(closed, finished_ago=86400)
+        # Période close : résultat réutilisé quel que soit son âge
+        self.assertEqual(enqueue('revenue', self.params()), closed)
+
+        current = enqueue('revenue', self.params(days_ago=0))
+        self.done(current)
+        self.assertEqual(enqueue('revenue', self.params(days_ago=0)), current)
+        # Période en cours : résultat périmé après REPORT_JOB_RESULT_TTL
+        with override_settings(REPORT_JOB_RESULT_TTL=60):
+            ReportJob.objects.filter(pk=current.pk).update(finished_at=timezone.now() - datetime.timedelta(minutes=5))
+            self.assertNotEqual(enqueue('revenue', self.params(days_ago=0)), current)
+
+        # Fichier de résultat disparu : nouveau calcul
+        (self.jobs_dir / closed.result_file).unlink()
+        self.assertNotEqual(enqueue('revenue', self.params()), closed)
+
+    def test_claim_jobs_oldest_first_once(self):
+        jobs = [enqueue('revenue', self.params(days_ago=days)) for days in (10, 20, 30)]
+        for age, job in zip((3, 2, 1), jobs):
+            ReportJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - datetime.timedelta(minutes=age))
+
+        claimed = claim_jobs(2)
+        self.assertEqual([job.pk for job in claimed], [jobs[0].pk, jobs[1].pk])
+        self.assertEqual([job.pk for job in claim_jobs(5)], [jobs[2].pk])
+        self.assertEqual(claim_jobs(5), [])
+        running = ReportJob.objects.filter(status='running')
+        self.assertEqual(running.count(), 3)
+        self.assertFalse(running.filter(started_at__isnull=True).exists())
+
+    def test_finish_job_records_outcome(self):
+        succeeded, failed = enqueue('revenue', self.params()), enqueue('usage', self.params())
+        claim_jobs(2)
+        future = Future()
+        future.set_result('revenue.json')
+        self.assertTrue(finish_job(succeeded, future))
+        future = Future()
+        future.set_exception(RuntimeError("boom"))
+        self.assertFalse(finish_job(failed, future))
+
+        job = ReportJob.objects.get(pk=succeeded.pk)
+        self.assertEqual((job.status, job.result_file, job.error), ('done', 'revenue.json', ''))
+        self.assertIsNotNone(job.finished_at)
+        job = ReportJob.objects.get(pk=failed.pk)
+        self.assertEqual((job.status, job.error), ('failed', 'boom'))
+
+    def test_requeue_spares_jobs_with_a_heartbeat(self):
+        long_running, abandoned = (enqueue('revenue', self.params(days_ago=days)) for days in (10, 20))
+        claim_jobs(2)
+        an_hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        ReportJob.objects.update(started_at=an_hour_ago, heartbeat_at=an_hour_ago)
+
+        # Calcul long toujours suivi par son worker
+        self.assertEqual(heartbeat([long_running.pk]), 1)
+        self.assertEqual(requeue_stale(300), 1)
+
+        long_running.refresh_from_db()
+        abandoned.refresh_from_db()
+        self.assertEqual((long_running.status, long_running.started_at), ('running', an_hour_ago))
+        self.assertEqual((abandoned.status, abandoned.started_at, abandoned.heartbeat_at), ('pending', None, None))
+        self.assertEqual([job.pk for job in claim_jobs(5)], [abandoned.pk])
+
+
+class EventJournalTests(TestCase):
+    """Journal des événements : lecture, compactage, purge et recalcul des coûts"""
+
+    def setUp(self):
+        Event.objects.all().delete()
+        self.now = timezone.now()
+
+    def add(self, topic, entity_id, hours_ago=0):
+        event = record(topic, entity_id, {'entity': entity_id})
+        Event.objects.filter(pk=event.pk).update(created_at=self.now - datetime.timedelta(hours=hours_ago))
+        return event
+
+    def remaining(self):
+        return list(Event.objects.order_by('id').values_list('topic', 'entity_id'))
+
+    def test_read_events_in_journal_order(self):
+        events = [self.add(topic, entity) for topic, entity in (
+            ('session.started', 's1'), ('station.status_changed', 'a'), ('session.ended', 's1'),
+            ('rate.changed', 'r'), ('session.started', 's2'),
+        )]
+        self.assertEqual(read_events(), events)
+        self.assertEqual(read_events(after=events[1].id, limit=2), events[2:4])
+        self.assertEqual(read_events(topics=['session.started', 'session.ended']), [events[0], events[2], events[4]])
+        self.assertEqual(read_events(after=events[-1].id), [])
+
+    def test_compact_keeps_latest_state_per_entity(self):
+        self.add('station.status_changed', 'a', hours_ago=5)
+        self.add('station.status_changed', 'b', hours_ago=5)
+        self.add('session.started', 's1', hours_ago=5)
+        self.add('station.status_changed', 'a', hours_ago=4)
+        self.add('session.started', 's1', hours_ago=4)
+        self.add('rate.changed', 'r', hours_ago=3)
+        self.add('station.status_changed', 'a', hours_ago=2)
+        # Plus récent que la limite : conservé même s'il est remplacé ensuite
+        self.add('rate.changed', 'r', hours_ago=0)
+        self.add('rate.changed', 'r', hours_ago=0)
+
+        self.assertEqual(compact_events(self.now - datetime.timedelta(hours=1)), 3)
+        self.assertEqual(self.remaining(), [
+            ('station.status_changed', 'b'),
+            ('session.started', 's1'),
+            ('session.started', 's1'),
+            ('station.status_changed', 'a'),
+            ('rate.changed', 'r'),
+            ('rate.changed', 'r'),
+        ])
+
+    def test_purge_deletes_older_events_in_batches(self):
+        for hours_ago in (50, 49, 48, 47, 1):
+            self.add('session.started', str(hours_ago), hours_ago=hours_ago)
+        self.assertEqual(purge_events(self.now - datetime.timedelta(hours=24), batch_size=2), 4)
+        self.assertEqual(self.remaining(), [('session.started', '1')])
+        self.assertEqual(purge_events(self.now - datetime.timedelta(hours=24)), 0)
+
+    def test_purge_and_compaction_keep_undelivered_events(self):
+        events = [self.add('station.status_changed', 'a', hours_ago=hours_ago) for hours_ago in (50, 49, 48, 47)]
+        before = self.now - datetime.timedelta(hours=24)
+        WebhookSubscription.objects.create(url='https://a.example/hook', last_event_id=events[3].id)
+        late = WebhookSubscription.objects.create(url='https://b.example/hook', last_event_id=events[1].id)
+        # Un abonnement désactivé ne retient pas le journal
+        WebhookSubscription.objects.create(url='https://c.example/hook', is_active=False, last_event_id=0)
+
+        self.assertEqual(undelivered_events(before), (2, events[2].id, events[3].id))
+        self.assertEqual(compact_events(before), 2)
+        self.assertEqual(list(Event.objects.values_list('id', flat=True)), [events[2].id, events[3].id])
+        self.assertEqual(purge_events(before), 0)
+        self.assertEqual([event.id for event in read_events(after=late.last_event_id)], [events[2].id, events[3].id])
+
+        late.last_event_id = events[3].id
+        late.save()
+        self.assertEqual(undelivered_events(before), (0, None, None))
+        self.assertEqual(purge_events(before), 2)
+
+    def test_reprice_records_one_event_per_changed_session(self):
+        player = User.objects.create_user(username='player', password='x', role='player')
+        station = Station.objects.create(name='PC-1', type='PC')
+        start = self.now - datetime.timedelta(hours=3)
+        sessions = [
+            Session.objects.create(player=player, station=station, is_active=False, start_time=start,
+                                   end_time=start + datetime.timedelta(minutes=minutes), duration=minutes, cost=cost)
+            for minutes, cost in ((60, Decimal('600')), (30, Decimal('100')))
+        ]
+        archived = ArchivedSession.objects.create(
+            id=uuid.uuid4(), player=player, station=station, start_time=start,
+            end_time=start + datetime.timedelta(minutes=90), duration=90, cost=Decimal('0'),
+        )
+        Event.objects.all().delete()
+
+        schedule = compile_schedule([rate_rule('600')])
+        self.assertEqual(sum(reprice_sessions(model.objects.all(), schedule=schedule)
+                             for model in (Session, ArchivedSession)), 2)
+        events = read_events(topics=['session.repriced'])
+        self.assertEqual([event.entity_id for event in events], [str(sessions[1].pk), str(archived.pk)])
+        self.assertEqual([event.payload['cost'] for event in events], ['300.00', '900.00'])
+        self.assertFalse(events[1].payload['is_active'])
+
+        # Coûts inchangés : aucun nouvel événement
+        for model in (Session, ArchivedSession):
+            reprice_sessions(model.objects.all(), schedule=schedule)
+        self.assertEqual(Event.objects.count(), 2)
+
+
+class IdempotencyTests(TestCase):
+    """En-tête Idempotency-Key : rejeu, réutilisation interdite, requêtes en cours et erreurs serveur"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='desk', password='x', role='staff')
+        cls.players = [User.objects.create_user(username=f'p{i}', password='x', role='player') for i in range(2)]
+        cls.station = Station.objects.create(name='PC-1', type='PC')
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def start(self, player, key):
+        return self.client.post('/api/sessions/', {
+            'player_id': str(player.pk), 'station_id': str(self.station.pk),
+        }, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def call(self, view, key='key-1', body=b'{}'):
+        request = RequestFactory().post('/api/things/', body, content_type='application/json',
+                                        HTTP_IDEMPOTENCY_KEY=key)
+        request.user = self.staff
+        return idempotent(view)(None, request)
+
+    def test_retry_replays_first_response(self):
+        first = self.start(self.players[0], 'key-1')
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        retry = self.start(self.players[0], 'key-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.assertEqual(self.start(self.players[0], 'key-1').status_code, 201)
+        response = self.start(self.players[1], 'key-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('error', response.json())
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_key_in_flight_conflicts(self):
+        responses = []
+
+        def view(_, request):
+            # Nouvelle tentative pendant que la première s'exécute encore
+            responses.append(self.call(lambda *args: HttpResponse(status=201)))
+            return HttpResponse(status=201)
+
+        self.assertEqual(self.call(view).status_code, 201)
+        self.assertEqual([response.status_code for response in responses], [409])
+        # Verrou libéré : la tentative suivante rejoue la réponse
+        self.assertEqual(self.call(view)['Idempotent-Replayed'], 'true')
+
+    def test_server_errors_are_not_stored(self):
+        statuses = iter((503, 200))
+        calls = []
+
+        def view(_, request):
+            calls.append(request)
+            return HttpResponse(status=next(statuses))
+
+        self.assertEqual(self.call(view).status_code, 503)
+        self.assertEqual(self.call(view).status_code, 200)
+        self.assertEqual(len(calls), 2)
+        replay = self.call(view)
+        self.assertEqual((replay.status_code, replay['Idempotent-Replayed']), (200, 'true'))
+        self.assertEqual(len(calls), 2)
+
+    def test_replay_survives_many_other_keys(self):
+        first = self.start(self.players[0], 'key-1')
+        self.assertEqual(first.status_code, 201, first.content)
+        # Plus de clés que n'en garde le cache en mémoire locale (300 par défaut)
+        for index in range(350):
+            self.assertEqual(self.call(lambda *args: HttpResponse(status=201), key=f'other-{index}').status_code, 201)
+
+        retry = self.start(self.players[0], 'key-1')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_expired_keys_run_again_and_are_purged(self):
+        calls = []
+
+        def view(_, request):
+            calls.append(request)
+            return HttpResponse(status=201)
+
+        self.call(view, key='expired')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.call(view, key='stored')
+        self.assertNotIn('Idempotent-Replayed', self.call(view, key='expired'))
+        self.assertEqual(self.call(view, key='stored')['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(calls), 3)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(purge_expired_keys(batch_size=1), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class SyncTests(TestCase):
+    """Synchronisation des postes hors ligne : opérations par lot et changements depuis le jeton"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='desk', password='x', role='staff')
+        cls.players = [User.objects.create_user(username=f'p{i}', password='x', role='player') for i in range(3)]
+        cls.stations = [Station.objects.create(name=f'PC-{i}', type='PC') for i in range(3)]
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        self.now = timezone.now()
+
+    def sync(self, operations=(), **fields):
+        response = self.client.post('/api/sync/', {'operations': list(operations), **fields},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def start_op(self, op_id, player, station, minutes_ago=None):
+        operation = {'op_id': op_id, 'type': 'start', 'player_id': str(player.pk), 'station_id': str(station.pk)}
+        if minutes_ago is not None:
+            operation['client_time'] = (self.now - datetime.timedelta(minutes=minutes_ago)).isoformat()
+        return operation
+
+    def head(self):
+        return Event.objects.order_by('-id').values_list('id', flat=True).first()
+
+    def test_conflicting_start_does_not_undo_the_batch(self):
+        running = start_session(self.players[0], self.stations[0])
+        result = self.sync([
+            self.start_op('1', self.players[1], self.stations[0]),
+            self.start_op('2', self.players[1], self.stations[1]),
+            {'op_id': '3', 'type': 'end', 'session_id': str(running.pk)},
+        ])
+        self.assertEqual([op['status'] for op in result['results']], ['conflict', 'applied', 'applied'])
+        self.assertEqual(result['results'][0]['current_session_id'], str(running.pk))
+
+        running.refresh_from_db()
+        self.assertFalse(running.is_active)
+        started = Session.objects.get(pk=result['results'][1]['session_id'])
+        self.assertEqual((started.player, started.station, started.is_active), (self.players[1], self.stations[1], True))
+        self.assertEqual(
+            dict(Station.objects.values_list('name', 'status')),
+            {'PC-0': 'available', 'PC-1': 'in_use', 'PC-2': 'available'},
+        )
+
+    def test_end_by_station_of_session_started_in_same_batch(self):
+        result = self.sync([
+            self.start_op('1', self.players[0], self.stations[0], minutes_ago=30),
+            {'op_id': '2', 'type': 'end', 'station_id': str(self.stations[0].pk),
+             'client_time': (self.now - datetime.timedelta(minutes=10)).isoformat()},
+        ])
+        self.assertEqual([op['status'] for op in result['results']], ['applied', 'applied'])
+        self.assertEqual(result['results'][0]['session_id'], result['results'][1]['session_id'])
+
+        session = Session.objects.get(pk=result['results'][0]['session_id'])
+        self.assertEqual((session.is_active, session.duration), (False, 20))
+        self.assertEqual(session.end_time, self.now - datetime.timedelta(minutes=10))
+        self.stations[0].refresh_from_db()
+        self.assertEqual((self.stations[0].status, self.stations[0].current_session), ('available', None))
+
+    def test_future_client_time_is_clamped_to_now(self):
+        result = self.sync([self.start_op('1', self.players[0], self.stations[0], minutes_ago=-60)])
+        session = Session.objects.get(pk=result['results'][0]['session_id'])
+        self.assertLessEqual(session.start_time, timezone.now())
+        self.assertGreaterEqual(session.start_time, self.now)
+
+    def test_without_token_returns_full_state(self):
+        start_session(self.players[0], self.stations[0])
+        result = self.sync()
+        self.assertTrue(result['reset'])
+        self.assertFalse(result['has_more'])
+        self.assertEqual(result['token'], self.head())
+        self.assertEqual([station['name'] for station in result['stations']], ['PC-0', 'PC-1', 'PC-2'])
+        self.assertEqual([session['player_id'] for session in result['sessions']], [str(self.players[0].pk)])
+        self.assertNotIn('changes', result)
+
+    def test_token_older_than_journal_resets(self):
+        start_session(self.players[0], self.stations[0])
+        token = self.head()
+        start_session(self.players[1], self.stations[1])
+        start_session(self.players[2], self.stations[2])
+        # Purge : l'événement qui suit le jeton n'existe plus
+        Event.objects.filter(id__lte=token + 1).delete()
+        result = self.sync(token=token)
+        self.assertTrue(result['reset'])
+        self.assertEqual(len(result['sessions']), 3)
+
+    def test_token_returns_changes_page_by_page(self):
+        token = self.head()
+        for player, station in zip(self.players, self.stations):
+            start_session(player, station)
+        # Un démarrage et un changement de statut par session
+        expected = [event.id for event in read_events(token, 100, SYNC_TOPICS)]
+        self.assertEqual(len(expected), 6)
+
+        with override_settings(SYNC_MAX_CHANGES=4):
+            result = self.sync(token=token)
+            self.assertEqual((result['reset'], result['has_more']), (False, True))
+            self.assertEqual([change['id'] for change in result['changes']], expected[:4])
+            self.assertEqual(result['token'], expected[3])
+
+            result = self.sync(token=result['token'])
+        self.assertEqual((result['reset'], result['has_more']), (False, False))
+        self.assertEqual([change['id'] for change in result['changes']], expected[4:])
+        self.assertEqual(result['token'], expected[-1])
+
+
+class ArchiveTests(TestCase):
+    """Archivage des sessions terminées : déplacement par lots et rapports inchangés"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = User.objects.create_user(username='player', password='x', role='player')
+        cls.station = Station.objects.create(name='PC-1', type='PC')
+        cls.now = timezone.now()
+
+    def closed(self, days_ago, minutes=60, cost='500'):
+        end = self.now - datetime.timedelta(days=days_ago)
+        session = Session.objects.create(player=self.player, station=self.station, is_active=False,
+                                         end_time=end, duration=minutes, cost=Decimal(cost))
+        Session.objects.filter(pk=session.pk).update(start_time=end - datetime.timedelta(minutes=minutes))
+        return session
+
+    def cutoff(self):
+        return self.now - datetime.timedelta(days=30)
+
+    def test_old_closed_sessions_are_moved(self):
+        old, recent = self.closed(days_ago=40), self.closed(days_ago=10)
+        old.refresh_from_db()
+        self.assertEqual(archive_sessions(self.cutoff(), batch_size=10), 1)
+
+        self.assertFalse(Session.objects.filter(pk=old.pk).exists())
+        archived = ArchivedSession.objects.get(pk=old.pk)
+        for field in ArchivedSession.ARCHIVED_FIELDS:
+            self.assertEqual(getattr(archived, field), getattr(old, field), field)
+        self.assertTrue(Session.objects.filter(pk=recent.pk).exists())
+        self.assertEqual(archive_sessions(self.cutoff(), batch_size=10), 0)
+
+    def test_active_and_referenced_sessions_stay(self):
+        active = Session.objects.create(player=self.player, station=self.station)
+        Session.objects.filter(pk=active.pk).update(start_time=self.now - datetime.timedelta(days=40))
+        referenced = self.closed(days_ago=40)
+        Station.objects.filter(pk=self.station.pk).update(current_session=referenced)
+
+        self.assertEqual(archive_sessions(self.cutoff(), batch_size=10), 0)
+        self.assertEqual(Session.objects.count(), 2)
+        self.assertFalse(ArchivedSession.objects.exists())
+
+    def test_batch_size_and_max_batches(self):
+        for days_ago in range(31, 38):
+            self.closed(days_ago=days_ago)
+        self.assertEqual(archive_sessions(self.cutoff(), batch_size=2, max_batches=2), 4)
+        self.assertEqual((Session.objects.count(), ArchivedSession.objects.count()), (3, 4))
+        # Les plus anciennes partent d'abord
+        self.assertEqual(
+            Session.objects.order_by('end_time').first().end_time,
+            self.now - datetime.timedelta(days=33),
+        )
+        self.assertEqual(archive_sessions(self.cutoff(), batch_size=2), 3)
+        self.assertEqual((Session.objects.count(), ArchivedSession.objects.count()), (0, 7))
+
+    def test_reports_are_unchanged_by_archiving(self):
+        for days_ago, minutes, cost in ((45, 30, '250'), (40, 90, '750'), (40, 60, '500'), (5, 45, '375')):
+            self.closed(days_ago, minutes, cost)
+        start = timezone.localdate(self.now) - datetime.timedelta(days=60)
+        end = timezone.localdate(self.now)
+        before = (revenue_report(start, end), usage_report(start, end))
+        self.assertEqual(before[0]['total_revenue'], 1875.0)
+
+        self.assertEqual(archive_sessions(self.cutoff(), batch_size=2), 3)
+        self.assertEqual((revenue_report(start, end), usage_report(start, end)), before)
+
+
+class HeartbeatTests(TestCase):
+    """Signaux de vie des agents : regroupement en mémoire et écriture par lot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='desk', password='x', role='staff')
+        cls.stations = [Station.objects.create(name=f'PC-{i}', type='PC') for i in range(2)]
+
+    def setUp(self):
+        # Intervalle long : seules les écritures explicites des tests ont lieu
+        self.buffer = HeartbeatBuffer(interval=3600)
+        self.addCleanup(self.cancel_timer)
+        self.now = timezone.now().replace(microsecond=0)
+        token = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def cancel_timer(self):
+        if self.buffer._timer is not None:
+            self.buffer._timer.cancel()
+
+    def ago(self, seconds):
+        return self.now - datetime.timedelta(seconds=seconds)
+
+    def agent(self, station):
+        station.refresh_from_db()
+        return station.last_seen_at, station.agent_status
+
+    def test_latest_signal_per_station_is_kept(self):
+        station = self.stations[0]
+        self.buffer.record(station.pk, self.ago(20), 'idle')
+        self.buffer.record(station.pk, self.ago(5), 'busy')
+        # Signal en retard, plus ancien que celui en attente
+        self.buffer.record(station.pk, self.ago(10), 'error')
+        self.buffer.record(self.stations[1].pk, self.ago(1), 'idle')
+        self.assertEqual(self.buffer.pending(), 2)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.pending(), 0)
+        self.assertEqual(self.agent(station), (self.ago(5), 'busy'))
+        self.assertEqual(self.agent(self.stations[1]), (self.ago(1), 'idle'))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_unknown_station_is_ignored(self):
+        self.buffer.record(uuid.uuid4(), self.now, 'idle')
+        self.buffer.record(self.stations[0].pk, self.now, 'busy')
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.agent(self.stations[0]), (self.now, 'busy'))
+        self.assertEqual(Station.objects.filter(last_seen_at__isnull=False).count(), 1)
+
+    def test_older_signal_does_not_move_last_seen_backwards(self):
+        # Signal plus récent déjà écrit par un autre processus
+        Station.objects.filter(pk=self.stations[0].pk).update(last_seen_at=self.ago(2), agent_status='busy')
+        self.buffer.record(self.stations[0].pk, self.ago(30), 'error')
+        self.buffer.record(self.stations[1].pk, self.ago(30), 'error')
+        self.buffer.flush()
+        self.assertEqual(self.agent(self.stations[0]), (self.ago(2), 'busy'))
+        self.assertEqual(self.agent(self.stations[1]), (self.ago(30), 'error'))
+
+    def test_failed_write_is_kept_for_the_next_flush(self):
+        self.buffer.record(self.stations[0].pk, self.ago(10), 'idle')
+        self.buffer.record(self.stations[1].pk, self.ago(10), 'idle')
+        with mock.patch.object(HeartbeatBuffer, '_write', side_effect=DatabaseError("base indisponible")):
+            with self.assertRaises(DatabaseError):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.pending(), 2)
+        self.assertIsNotNone(self.buffer._timer)
+
+        # Un signal reçu entre-temps l'emporte sur le lot remis en attente
+        self.buffer.record(self.stations[0].pk, self.ago(1), 'busy')
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.agent(self.stations[0]), (self.ago(1), 'busy'))
+        self.assertEqual(self.agent(self.stations[1]), (self.ago(10), 'idle'))
+
+    def test_view_accepts_one_signal_or_a_list(self):
+        with mock.patch('ps.views.heartbeat_buffer', self.buffer):
+            response = self.client.post('/api/stations/heartbeats/', {
+                'station_id': str(self.stations[0].pk), 'status': 'busy',
+            }, content_type='application/json')
+            self.assertEqual((response.status_code, response.json()), (202, {'accepted': 1}))
+
+            response = self.client.post('/api/stations/heartbeats/', [
+                {'station_id': str(station.pk), 'timestamp': self.ago(3).isoformat(), 'status': 'idle'}
+                for station in self.stations
+            ], content_type='application/json')
+            self.assertEqual((response.status_code, response.json()), (202, {'accepted': 2}))
+
+            response = self.client.post('/api/stations/heartbeats/', [{'station_id': 'x'}],
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.buffer.flush()
+        # Le signal sans horodatage (réception) est plus récent que celui de la liste
+        self.assertEqual(self.agent(self.stations[0])[1], 'busy')
+        self.assertEqual(self.agent(self.stations[1]), (self.ago(3), 'idle'))
+
+    def test_agent_online_in_station_serializer(self):
+        Station.objects.filter(pk=self.stations[0].pk).update(last_seen_at=timezone.now())
+        Station.objects.filter(pk=self.stations[1].pk).update(last_seen_at=self.ago(120))
+        with override_settings(STATION_HEARTBEAT_TIMEOUT=30):
+            response = self.client.get('/api/stations/')
+        online = {station['name']: station['agent_online'] for station in response.json()}
+        self.assertEqual(online, {'PC-0': True, 'PC-1': False})
+        Station.objects.update(last_seen_at=None)
+        self.assertEqual({station['agent_online'] for station in self.client.get('/api/stations/').json()}, {False})
+
+
+class LeaderboardTests(TestCase):
+    """Classement des joueurs : chaque source donne le même résultat qu'une agrégation directe"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='desk', password='x', role='staff')
+        cls.players = [User.objects.create_user(username=f'p{i}', password='x', role='player') for i in range(4)]
+        rng = random.Random(3)
+        moments = [
+            timezone.make_aware(datetime.datetime(2024, month, day, 18))
+            for month, day in ((1, 3), (1, 20), (1, 31), (2, 10), (2, 29), (3, 5), (3, 25))
+        ]
+        for index, end in enumerate(moments * 3):
+            player = (cls.players + [cls.staff])[index % 5]
+            fields = dict(player=player, end_time=end, duration=rng.randint(10, 300),
+                          cost=Decimal(rng.randint(100, 5000)) + Decimal(index) / 100)
+            start = end - datetime.timedelta(minutes=fields['duration'])
+            # Janvier archivé, le reste dans la table chaude
+            if end.month == 1:
+                ArchivedSession.objects.create(id=uuid.uuid4(), start_time=start, **fields)
+            else:
+                session = Session.objects.create(is_active=False, **fields)
+                Session.objects.filter(pk=session.pk).update(start_time=start)
+        PlayerStats.rebuild()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        token = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def expected(self, metric, start_date=None, end_date=None):
+        field = {'time': 'duration', 'spend': 'cost'}[metric]
+        totals = {}
+        for model in (Session, ArchivedSession):
+            sessions = model.objects.filter(player__role='player')
+            if start_date:
+                sessions = sessions.filter(end_time__gte=day_start(start_date),
+                                           end_time__lt=day_start(end_date + datetime.timedelta(days=1)))
+            for player_id, value in sessions.values_list('player_id', field):
+                current = totals.setdefault(str(player_id), [0, 0])
+                current[0] += value
+                current[1] += 1
+        ranking = sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+        return [(player_id, round(float(value), 2), count) for player_id, (value, count) in ranking]
+
+    def ranking(self, result):
+        return [(row['player_id'], row['value'], row['session_count']) for row in result['players']]
+
+    def assertMatches(self, source, start_date=None, end_date=None):
+        for metric in METRICS:
+            with self.subTest(metric=metric, source=source):
+                result = top_players(metric, start_date, end_date, limit=10)
+                self.assertEqual(result['source'], source)
+                self.assertEqual(self.ranking(result), self.expected(metric, start_date, end_date))
+                self.assertEqual(len(result['players']), 4)
+                self.assertEqual([row['rank'] for row in result['players']], [1, 2, 3, 4])
+
+    def test_lifetime_ranking(self):
+        self.assertMatches('lifetime')
+
+    def test_whole_months_ranking(self):
+        self.assertMatches('monthly', datetime.date(2024, 1, 1), datetime.date(2024, 2, 29))
+
+    def test_range_over_hot_and_archived_sessions(self):
+        self.assertMatches('sessions', datetime.date(2024, 1, 15), datetime.date(2024, 3, 10))
+        self.assertMatches('sessions', datetime.date(2024, 2, 2), datetime.date(2024, 3, 10))
+
+    def test_limit_keeps_the_best(self):
+        result = top_players('spend', datetime.date(2024, 1, 15), datetime.date(2024, 3, 10), limit=2)
+        self.assertEqual(self.ranking(result), self.expected('spend', datetime.date(2024, 1, 15),
+                                                              datetime.date(2024, 3, 10))[:2])
+
+    def test_whole_months_boundaries(self):
+        today = timezone.localdate()
+        cases = [
+            (datetime.date(2024, 1, 1), datetime.date(2024, 1, 31), True),
+            (datetime.date(2024, 1, 1), datetime.date(2024, 2, 29), True),
+            (datetime.date(2024, 2, 1), datetime.date(2024, 2, 28), False),
+            (datetime.date(2024, 1, 2), datetime.date(2024, 1, 31), False),
+            (datetime.date(2024, 12, 1), datetime.date(2024, 12, 31), True),
+            # Mois en cours : entier jusqu'à aujourd'hui
+            (today.replace(day=1), today, True),
+            (today.replace(day=1) - datetime.timedelta(days=1), today, False),
+        ]
+        for start_date, end_date, whole in cases:
+            with self.subTest(start=start_date, end=end_date):
+                self.assertIs(_is_whole_months(start_date, end_date), whole)
+
+    def test_view_validation(self):
+        for params in ({'metric': 'visits'}, {'limit': 'ten'}, {'start': '2024-01-01'}, {'end': '2024-01-31'},
+                       {'start': '2024-01-01', 'end': '2024-13-01'}, {'start': '2024-02-01', 'end': '2024-01-01'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/reports/top-players/', params).status_code, 400)
+
+        response = self.client.get('/api/reports/top-players/', {
+            'metric': 'time', 'start': '2024-01-01', 'end': '2024-01-31', 'limit': 0,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['source'], len(response.json()['players'])), ('monthly', 1))
+
+        token = RefreshToken.for_user(self.players[0]).access_token
+        response = self.client.get('/api/reports/top-players/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 403)
+
+
+class UserListTests(TestCase):
+    """Liste paginée des utilisateurs et recherche par nom"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        people = [
+            ('jdupont', 'Jérôme', 'Dupont', 'player'),
+            ('hlefevre', 'Hélène', 'Lefèvre', 'player'),
+            ('hdurand', 'Hélène', 'Durand', 'staff'),
+            ('zoe', 'Zoé', 'Ängström', 'player'),
+            ('marc', 'Marc', 'Dupuis', 'player'),
+        ]
+        for username, firstname, lastname, role in people:
+            User.objects.create_user(username=username, password='x', firstname=firstname,
+                                     lastname=lastname, role=role)
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def users(self, status_code=200, **params):
+        response = self.client.get('/api/users/', params)
+        self.assertEqual(response.status_code, status_code, response.content)
+        return response.json()
+
+    def usernames(self, **params):
+        return [user['username'] for user in self.users(**params)['results']]
+
+    def test_pagination(self):
+        page = self.users(page=2, page_size=2)
+        self.assertEqual((page['count'], page['page'], page['page_size'], page['num_pages']), (6, 2, 2, 3))
+        # Ordre de l'index de recherche : nom d'utilisateur normalisé
+        self.assertEqual([user['username'] for user in page['results']], ['hlefevre', 'jdupont'])
+        self.assertEqual(self.usernames(page=3, page_size=2), ['marc', 'zoe'])
+        self.assertEqual(self.users(page_size=1000)['page_size'], 200)
+
+        for params in ({'page': 0}, {'page_size': 0}, {'page': 'x'}, {'page_size': '1.5'}, {'role': 'guest'}):
+            with self.subTest(params=params):
+                self.users(status_code=400, **params)
+        self.users(status_code=404, page=4, page_size=2)
+        # Une liste vide a tout de même une première page
+        self.assertEqual(self.users(search='personne')['results'], [])
+
+    def test_admin_only(self):
+        player = User.objects.get(username='marc')
+        token = RefreshToken.for_user(player).access_token
+        response = self.client.get('/api/users/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_role_filter(self):
+        self.assertEqual(self.usernames(role='staff'), ['hdurand'])
+        self.assertEqual(self.usernames(role='player'), ['hlefevre', 'jdupont', 'marc', 'zoe'])
+        self.assertEqual(self.usernames(role='player', search='helene'), ['hlefevre'])
+
+    def test_search_ignores_accents_and_case(self):
+        self.assertEqual(self.usernames(search='HÉLÈNE'), ['hdurand', 'hlefevre'])
+        self.assertEqual(self.usernames(search='lefevre'), ['hlefevre'])
+        self.assertEqual(self.usernames(search='angst'), ['zoe'])
+        # Chaque mot doit commencer l'un des noms
+        self.assertEqual(self.usernames(search='hel dur'), ['hdurand'])
+        self.assertEqual(self.usernames(search='dup'), ['jdupont', 'marc'])
+        self.assertEqual(self.usernames(search='dup jer'), ['jdupont'])
+        self.assertEqual(self.usernames(search='  '), ['admin', 'hdurand', 'hlefevre', 'jdupont', 'marc', 'zoe'])
+        if connection.vendor != 'postgresql':
+            # Sans pg_trgm : préfixes seulement
+            self.assertEqual(self.usernames(search='pont'), [])
+
+    def test_partial_save_updates_search_keys(self):
+        user = User.objects.get(username='marc')
+        user.firstname = 'Églantine'
+        user.save(update_fields=['firstname'])
+        user.refresh_from_db()
+        self.assertEqual((user.firstname, user.firstname_key), ('Églantine', 'eglantine'))
+        self.assertEqual(self.usernames(search='eglan'), ['marc'])
+        self.assertEqual(normalize('  Ångström   Zoé '), 'angstrom zoe')
+
+
+class MonthShardTests(SimpleTestCase):
+    """Découpage d'une période en tranches mensuelles"""
+
+    def test_window_across_a_year(self):
+        self.assertEqual(month_shards(datetime.date(2023, 11, 15), datetime.date(2024, 2, 10)), [
+            (datetime.date(2023, 11, 15), datetime.date(2023, 11, 30)),
+            (datetime.date(2023, 12, 1), datetime.date(2023, 12, 31)),
+            (datetime.date(2024, 1, 1), datetime.date(2024, 1, 31)),
+            (datetime.date(2024, 2, 1), datetime.date(2024, 2, 10)),
+        ])
+
+    def test_single_day(self):
+        day = datetime.date(2024, 12, 31)
+        self.assertEqual(month_shards(day, day), [(day, day)])
+
+    def test_end_on_last_day_of_month(self):
+        self.assertEqual(month_shards(datetime.date(2024, 1, 20), datetime.date(2024, 2, 29)), [
+            (datetime.date(2024, 1, 20), datetime.date(2024, 1, 31)),
+            (datetime.date(2024, 2, 1), datetime.date(2024, 2, 29)),
+        ])
+
+
+class StationRevenueShardTests(TestCase):
+    """Les cumuls par tranche mensuelle fusionnés égalent ceux de la période entière"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(5)
+        player = User.objects.create_user(username='player', password='x', role='player')
+        stations = [Station.objects.create(name=f'PC-{i}', type='PC') for i in range(3)] + [None]
+        first = timezone.make_aware(datetime.datetime(2023, 11, 1))
+        for index in range(200):
+            end = first + datetime.timedelta(hours=rng.randint(0, 24 * 120))
+            fields = dict(player=player, station=rng.choice(stations), end_time=end,
+                          duration=rng.randint(5, 240), cost=Decimal(rng.randint(100, 3000)))
+            # Un tiers archivé : les deux stockages sont lus
+            if index % 3 == 0:
+                ArchivedSession.objects.create(id=uuid.uuid4(), start_time=end, **fields)
+            else:
+                Session.objects.create(is_active=False, **fields)
+
+    def test_merged_shards_equal_whole_window(self):
+        start, end = datetime.date(2023, 11, 20), datetime.date(2024, 2, 10)
+        shards = month_shards(start, end)
+        self.assertEqual(len(shards), 4)
+        merged = {}
+        for first, last in shards:
+            merge_partials(station_daily_partials(first, last), merged)
+        whole = station_daily_partials(start, end)
+        self.assertTrue(whole)
+        self.assertEqual(merged, whole)
+
+        report = station_revenue_report(start, end)
+        self.assertEqual(sum(station['sessions_count'] for station in report['stations']),
+                         sum(totals[0] for totals in whole.values()))
+        self.assertEqual(report['total_revenue'], round(float(sum(totals[1] for totals in whole.values())), 2))
+
+
+def numpy_load(path):
+    return snapshots.np.load(path, mmap_mode='r', allow_pickle=False)
+
+
+@skipUnless(snapshots.np is not None, "NumPy n'est pas installé")
+class SessionExportTests(TestCase):
+    """Export en colonnes .npy : réécriture des seuls mois modifiés et relecture projetée"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = User.objects.create_user(username='player', password='x', role='player')
+        cls.other = User.objects.create_user(username='other', password='x', role='player')
+        cls.station = Station.objects.create(name='PC-1', type='PC')
+        cls.january = [cls.closed(datetime.datetime(2024, 1, day, 14), cost) for day, cost in ((3, '500'), (20, '750'))]
+        cls.february = [cls.closed(datetime.datetime(2024, 2, 10, 18), '250')]
+
+    @classmethod
+    def closed(cls, start, cost):
+        start = timezone.make_aware(start)
+        session = Session.objects.create(player=cls.player, station=cls.station, is_active=False,
+                                         end_time=start + datetime.timedelta(hours=1), duration=60,
+                                         cost=Decimal(cost))
+        Session.objects.filter(pk=session.pk).update(start_time=start)
+        return session
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SNAPSHOT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def export(self, **kwargs):
+        return export_sessions(fmt='npy', **kwargs)
+
+    def test_unchanged_months_are_skipped(self):
+        first = self.export()
+        self.assertEqual((first['written'], first['unchanged'], first['rows']), (['2024-01', '2024-02'], 0, 3))
+        second = self.export()
+        self.assertEqual((second['written'], second['removed'], second['unchanged']), ([], [], 2))
+        self.assertEqual(self.export(full=True)['written'], ['2024-01', '2024-02'])
+
+    def test_changed_rows_rewrite_their_month(self):
+        self.export()
+        # Totaux inchangés : seules les identités des lignes diffèrent
+        Session.objects.filter(pk=self.january[0].pk).update(player=self.other)
+        self.assertEqual(self.export()['written'], ['2024-01'])
+
+        User.objects.filter(pk=self.other.pk).update(role='staff')
+        self.assertEqual(self.export()['written'], ['2024-01'])
+
+        Station.objects.filter(pk=self.station.pk).update(type='PS5')
+        self.assertEqual(self.export()['written'], ['2024-01', '2024-02'])
+        self.assertEqual(self.export()['written'], [])
+
+        role = numpy_load(partition_path('2024-01', 'npy') / 'player_role.npy')
+        self.assertEqual(sorted(role.tolist()), ['player', 'staff'])
+
+    def test_vanished_months_are_removed(self):
+        self.export()
+        Session.objects.filter(pk__in=[session.pk for session in self.february]).delete()
+        summary = self.export()
+        self.assertEqual((summary['written'], summary['removed'], summary['rows']), ([], ['2024-02'], 2))
+        self.assertFalse((snapshot_dir() / 'month=2024-02').exists())
+        self.assertEqual(list(snapshots.read_manifest()['partitions']), ['2024-01'])
+
+    def test_columns_round_trip(self):
+        archived = ArchivedSession.objects.create(
+            id=uuid.uuid4(), player=self.other, station=None,
+            start_time=timezone.make_aware(datetime.datetime(2024, 1, 25)),
+            end_time=timezone.make_aware(datetime.datetime(2024, 1, 25, 2)), duration=120, cost=Decimal('12.50'),
+        )
+        self.export()
+        path = partition_path('2024-01', 'npy')
+        columns = {name: numpy_load(path / f'{name}.npy') for name in snapshots.COLUMNS}
+        self.assertTrue(all(isinstance(column, snapshots.np.memmap) for column in columns.values()))
+
+        expected = sorted([*self.january, archived], key=lambda session: str(session.id))
+        order = sorted(range(len(columns['id'])), key=lambda index: columns['id'][index])
+        for session, index in zip(expected, order):
+            session.refresh_from_db()
+            is_archived = isinstance(session, ArchivedSession)
+            self.assertEqual(columns['id'][index], str(session.id))
+            self.assertEqual(columns['player_id'][index], str(session.player_id))
+            self.assertEqual(columns['station_id'][index], str(session.station_id or ''))
+            self.assertEqual(columns['station_type'][index], '' if is_archived else 'PC')
+            self.assertEqual(columns['start_time'][index],
+                             snapshots.np.datetime64(session.start_time.replace(tzinfo=None), 'us'))
+            self.assertEqual(columns['cost'][index], float(session.cost))
+            self.assertEqual(columns['duration'][index], session.duration)
+            self.assertEqual(bool(columns['archived'][index]), is_archived)
+            self.assertFalse(columns['is_active'][index])
+
+        # Le téléchargement regroupe les colonnes dans une archive .npz lisible par np.load
+        content, suffix = partition_file(path)
+        with content, snapshots.np.load(content) as bundle:
+            self.assertEqual(suffix, '.npz')
+            self.assertEqual(sorted(bundle.files), sorted(snapshots.COLUMNS))
+            self.assertEqual(bundle['cost'].tolist(), columns['cost'].tolist())
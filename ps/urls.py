@@ -1,10 +1,14 @@
-from django.urls import path
+from django.urls import path, re_path
 from .views import (
     LoginView, RegisterView,
-    StationListView, StationDetailView,
+    StationListView, StationDetailView, AvailableStationView, StationHeartbeatView,
     SessionListView, SessionDetailView, EndSessionView,
+    ReservationListView, ReservationDetailView,
     RateSettingsListView, RateSettingsDetailView, CurrentRatesView,
-    RevenueReportView, UsageReportView,
+    RevenueReportView, UsageReportView, UtilizationReportView, HeatmapReportView,
+    TopPlayersReportView, ReportJobListView, ReportJobDetailView, ReportJobResultView,
+    SessionExportView, SessionExportPartitionView, EventListView,
+    WebhookListView, WebhookDetailView, SyncView,
     UserListView, UserDetailView
 )
 
@@ -17,6 +21,8 @@ urlpatterns = [
     
     # Routes de gestion des stations
     path('stations/', StationListView.as_view(), name='station-list'),
+    path('stations/available/', AvailableStationView.as_view(), name='station-available'),
+    path('stations/heartbeats/', StationHeartbeatView.as_view(), name='station-heartbeats'),
     path('stations/<uuid:station_id>/', StationDetailView.as_view(), name='station-detail'),
     
     # Routes de gestion des sessions
@@ -24,6 +30,10 @@ urlpatterns = [
     path('sessions/<uuid:session_id>/', SessionDetailView.as_view(), name='session-detail'),
     path('sessions/<uuid:session_id>/end/', EndSessionView.as_view(), name='session-end'),
     
+    # Routes de gestion des réservations
+    path('reservations/', ReservationListView.as_view(), name='reservation-list'),
+    path('reservations/<uuid:reservation_id>/', ReservationDetailView.as_view(), name='reservation-detail'),
+    
     # Routes de gestion des tarifs
     path('rates/', RateSettingsListView.as_view(), name='rate-list'),
     path('rates/<uuid:rate_id>/', RateSettingsDetailView.as_view(), name='rate-detail'),
@@ -32,6 +42,24 @@ urlpatterns = [
     # Routes de rapports financiers
     path('reports/revenue/', RevenueReportView.as_view(), name='revenue-report'),
     path('reports/usage/', UsageReportView.as_view(), name='usage-report'),
+    path('reports/utilization/', UtilizationReportView.as_view(), name='utilization-report'),
+    path('reports/heatmap/', HeatmapReportView.as_view(), name='heatmap-report'),
+    path('reports/top-players/', TopPlayersReportView.as_view(), name='top-players-report'),
+    path('reports/jobs/', ReportJobListView.as_view(), name='report-job-list'),
+    path('reports/jobs/<uuid:job_id>/', ReportJobDetailView.as_view(), name='report-job-detail'),
+    path('reports/jobs/<uuid:job_id>/result/', ReportJobResultView.as_view(), name='report-job-result'),
+    
+    # Routes d'export de l'historique des sessions
+    path('exports/sessions/', SessionExportView.as_view(), name='session-export'),
+    re_path(r'^exports/sessions/(?P<month>\d{4}-\d{2})/$', SessionExportPartitionView.as_view(), name='session-export-partition'),
+    
+    # Synchronisation des postes hors ligne
+    path('sync/', SyncView.as_view(), name='sync'),
+    
+    # Journal des changements
+    path('events/', EventListView.as_view(), name='event-list'),
+    path('webhooks/', WebhookListView.as_view(), name='webhook-list'),
+    path('webhooks/<uuid:subscription_id>/', WebhookDetailView.as_view(), name='webhook-detail'),
     
     # Routes d'administration des utilisateurs
     path('users/', UserListView.as_view(), name='user-list'),
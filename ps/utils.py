@@ -47,6 +47,10 @@ class ErrorResponse:
     def conflict(message="Conflit avec l'état actuel de la ressource"):
         return JsonResponse({'error': message}, status=status.HTTP_409_CONFLICT)
     
+    @staticmethod
+    def unprocessable(message="Requête impossible à traiter"):
+        return JsonResponse({'error': message}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    
     @staticmethod
     def server_error(message="Erreur interne du serveur"):
         return JsonResponse({'error': message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -56,27 +60,22 @@ class CostCalculator:
     """Utilitaire pour calculer les coûts des sessions"""
     
     @staticmethod
-    def calculate_session_cost(duration_minutes):
+    def calculate_session_cost(duration_minutes, station_type='all', start_time=None):
         """
         Calcule le coût d'une session en fonction de sa durée
         
         Args:
             duration_minutes (int): Durée de la session en minutes
+            station_type (str): Type de station ('PC', 'console' ou 'all')
+            start_time (datetime): Début de la session (maintenant par défaut)
             
         Returns:
-            float: Coût calculé de la session
+            float: Coût calculé de la session selon le barème tarifaire
         """
-        # Prix de base par heure
-        base_hourly_rate = 10.0
-        
-        # Convertir la durée en heures
-        hours = duration_minutes / 60
-        
-        # Appliquer le tarif horaire
-        cost = base_hourly_rate * hours
+        from django.utils import timezone
+        from .pricing import get_schedule
         
-        # Arrondir à 2 décimales
-        return round(cost, 2)
+        return get_schedule().price(station_type, start_time or timezone.now(), duration_minutes)
     @staticmethod
     def bad_request(message="Requête invalide"):
         return JsonResponse({"error": message}, status=status.HTTP_400_BAD_REQUEST)
@@ -4,21 +4,40 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404, FileResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
-from django.db.models import Q, Avg
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q, Max
 from django.views.generic import View
-from datetime import datetime
+from django.core.paginator import Paginator
+from datetime import datetime, timedelta
 import json
-from .models import Station, Session, RateSettings
-from django.db import models
+import uuid
+from .models import Station, Session, RateSettings, Reservation, ReportJob, Event, WebhookSubscription
+from django.db import models, transaction
 from .serializers import (
     RegisterSerializer, LoginSerializer, UserSerializer,
     StationSerializer, SessionSerializer, SessionCreateSerializer,
-    RateSettingsSerializer
+    LiveSessionSerializer, RateSettingsSerializer, ReservationSerializer,
+    HeartbeatSerializer, ReportJobSerializer, ReportJobCreateSerializer,
+    WebhookSubscriptionSerializer, SyncRequestSerializer
 )
 from .utils import ErrorResponse
+from .reports import revenue_report, usage_report
+from .analytics import GROUP_BY_CHOICES, utilization_report, heatmap_report
+from .pricing import with_live_cost, price_live_sessions
+from .availability import available_stations, free_stations
+from .heartbeats import heartbeat_buffer
+from .leaderboard import METRICS, MAX_LIMIT, top_players
+from .filters import SESSION_FILTERS, FilterError, filter_sessions
+from .search import search_users
+from .jobs import enqueue, result_path
+from .snapshots import default_format, partition_file, read_manifest, snapshot_dir
+from .events import TOPICS as EVENT_TOPICS, wait_for_events
+from .idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from .sync import apply_operations, changes_since
 from drf_yasg.utils import swagger_auto_schema
 from django.contrib.auth import get_user_model
 
@@ -28,6 +47,66 @@ from drf_yasg import openapi
 User = get_user_model()
 
 
+def parse_report_period(request):
+    """
+    Lit et valide les paramètres start_date et end_date (YYYY-MM-DD) d'un rapport.
+    Retourne (start_date, end_date, None) ou (None, None, réponse d'erreur).
+    """
+    start_date_str = request.query_params.get('start_date')
+    end_date_str = request.query_params.get('end_date')
+    
+    if not start_date_str or not end_date_str:
+        return None, None, ErrorResponse.bad_request("Les paramètres start_date et end_date sont requis")
+    
+    try:
+        # Convertir les chaînes de date en objets date
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None, None, ErrorResponse.bad_request("Format de date invalide. Utilisez YYYY-MM-DD")
+    
+    # Vérifier que la date de début est avant la date de fin
+    if start_date > end_date:
+        return None, None, ErrorResponse.bad_request("La date de début doit être antérieure à la date de fin")
+    
+    return start_date, end_date, None
+
+
+def parse_datetime_param(value):
+    """Convertit un paramètre ISO 8601 en datetime avec fuseau, ou None s'il est invalide"""
+    try:
+        moment = parse_datetime(value or '')
+    except ValueError:
+        return None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+# Lecture du journal des changements
+EVENT_MAX_LIMIT = 1000
+EVENT_MAX_WAIT = 30
+
+
+# Pagination de la liste des utilisateurs
+USER_PAGE_SIZE = 50
+USER_MAX_PAGE_SIZE = 200
+
+
+WITH_LIVE_COST_PARAMETER = openapi.Parameter(
+    name='with_live_cost',
+    in_=openapi.IN_QUERY,
+    description='Si 1, ajoute la durée (live_duration) et le coût courants (live_cost) des sessions actives',
+    type=openapi.TYPE_BOOLEAN,
+    required=False
+)
+
+
+def wants_live_cost(request):
+    """Indique si le client demande le coût courant des sessions"""
+    return request.query_params.get('with_live_cost', '').lower() in ('1', 'true')
+
+
 class LoginView(APIView):
     permission_classes = [AllowAny]
     
@@ -93,6 +172,7 @@ class RegisterView(APIView):
 
 
 class StationListView(APIView):
+    """Statut en direct des stations : lu sur la base principale, jamais sur une réplique en retard"""
     permission_classes = [IsAuthenticated]
 
     @swagger_auto_schema(
@@ -129,6 +209,151 @@ class StationListView(APIView):
         return JsonResponse({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AvailableStationView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Liste les stations disponibles maintenant, ou libres sur une plage horaire (start, end)",
+        manual_parameters=[
+            openapi.Parameter(
+                name='type',
+                in_=openapi.IN_QUERY,
+                description='Type de station (PC ou console)',
+                type=openapi.TYPE_STRING,
+                enum=['PC', 'console'],
+                required=False
+            ),
+            openapi.Parameter(
+                name='start',
+                in_=openapi.IN_QUERY,
+                description='Début de la plage (ISO 8601), avec end',
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATETIME,
+                required=False
+            ),
+            openapi.Parameter(
+                name='end',
+                in_=openapi.IN_QUERY,
+                description='Fin de la plage (ISO 8601), avec start',
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATETIME,
+                required=False
+            )
+        ],
+        responses={
+            200: "Liste des stations disponibles (id, nom, type)",
+            400: "Type de station invalide",
+            401: "Non autorisé"
+        }
+    )
+    def get(self, request):
+        station_type = request.query_params.get('type')
+        if station_type and station_type not in dict(Station.TYPE_CHOICES):
+            return ErrorResponse.bad_request("Le type doit être 'PC' ou 'console'")
+        
+        if 'start' in request.query_params or 'end' in request.query_params:
+            start = parse_datetime_param(request.query_params.get('start'))
+            end = parse_datetime_param(request.query_params.get('end'))
+            if start is None or end is None:
+                return ErrorResponse.bad_request("Les paramètres start et end doivent être des dates ISO 8601")
+            if start >= end:
+                return ErrorResponse.bad_request("Le début de la plage doit être antérieur à sa fin")
+            # Recherche sur la plage : réservations et sessions consultées en base
+            return JsonResponse(free_stations(start, end, station_type), safe=False)
+        
+        return JsonResponse(available_stations(station_type), safe=False)
+    
+    @swagger_auto_schema(
+        operation_description="Réserve la première station libre d'un type et y démarre une session pour le joueur",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['type', 'player_id', 'reserve'],
+            properties={
+                'type': openapi.Schema(type=openapi.TYPE_STRING, enum=['PC', 'console']),
+                'player_id': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID),
+                'duration': openapi.Schema(type=openapi.TYPE_INTEGER, description='Durée optionnelle en minutes'),
+                'reserve': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='Doit valoir true'),
+            }
+        ),
+        responses={
+            201: SessionSerializer,
+            400: "Données invalides",
+            401: "Non autorisé",
+            403: "Accès interdit",
+            409: "Aucune station disponible"
+        }
+    )
+    def post(self, request):
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent réserver des stations")
+        
+        if str(request.data.get('reserve', '')).lower() not in ('1', 'true'):
+            return ErrorResponse.bad_request("Le paramètre reserve=true est requis")
+        
+        station_type = request.data.get('type')
+        if station_type not in dict(Station.TYPE_CHOICES):
+            return ErrorResponse.bad_request("Le type doit être 'PC' ou 'console'")
+        
+        with transaction.atomic():
+            # Les stations verrouillées par un autre poste sont sautées : deux réservations
+            # simultanées obtiennent deux stations différentes
+            station = (
+                Station.objects
+                .select_for_update(skip_locked=True)
+                .filter(type=station_type, status='available')
+                .order_by('name', 'id')
+                .first()
+            )
+            if station is None:
+                return ErrorResponse.conflict("Aucune station disponible pour ce type")
+            
+            data = {'player_id': request.data.get('player_id'), 'station_id': station.pk}
+            if request.data.get('duration') is not None:
+                data['duration'] = request.data.get('duration')
+            serializer = SessionCreateSerializer(data=data)
+            if not serializer.is_valid():
+                return JsonResponse({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+            
+            session = serializer.save()
+        
+        return JsonResponse(SessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class StationHeartbeatView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Reçoit un ou plusieurs signaux de vie d'agents de station ; ils sont écrits par lot",
+        request_body=HeartbeatSerializer(many=True),
+        responses={
+            202: "Signaux acceptés",
+            400: "Données invalides",
+            401: "Non autorisé",
+            403: "Accès interdit"
+        }
+    )
+    def post(self, request):
+        # Les agents s'authentifient avec un compte du personnel
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les agents de station peuvent envoyer des signaux de vie")
+        
+        many = isinstance(request.data, list)
+        serializer = HeartbeatSerializer(data=request.data, many=many)
+        if not serializer.is_valid():
+            return JsonResponse({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        heartbeats = serializer.validated_data if many else [serializer.validated_data]
+        received_at = timezone.now()
+        for heartbeat in heartbeats:
+            heartbeat_buffer.record(
+                heartbeat['station_id'],
+                heartbeat.get('timestamp') or received_at,
+                heartbeat['status'],
+            )
+        
+        return JsonResponse({'accepted': len(heartbeats)}, status=status.HTTP_202_ACCEPTED)
+
+
 class StationDetailView(APIView):
     permission_classes = [IsAuthenticated]
     
@@ -200,27 +425,20 @@ class StationDetailView(APIView):
 
 class SessionListView(APIView):
     permission_classes = [IsAuthenticated]
+    read_replica = True
     
     @swagger_auto_schema(
-        operation_description="Liste les sessions avec filtres optionnels (joueur, date)",
+        operation_description="Liste les sessions avec filtres optionnels combinables",
         manual_parameters=[
             openapi.Parameter(
-                name='player_id',
+                name=name,
                 in_=openapi.IN_QUERY,
-                description='ID du joueur pour filtrer les sessions',
+                description=description,
                 type=openapi.TYPE_STRING,
-                format=openapi.FORMAT_UUID,
-                required=False
-            ),
-            openapi.Parameter(
-                name='date',
-                in_=openapi.IN_QUERY,
-                description='Date pour filtrer les sessions (format: YYYY-MM-DD)',
-                type=openapi.TYPE_STRING,
-                format='date',
                 required=False
             )
-        ],
+            for name, (description, _) in SESSION_FILTERS.items()
+        ] + [WITH_LIVE_COST_PARAMETER],
         responses={
             200: SessionSerializer(many=True),
             400: "Paramètres de requête invalides",
@@ -228,41 +446,30 @@ class SessionListView(APIView):
         }
     )
     def get(self, request):
-        # Filtrage par joueur
-        player_id = request.query_params.get('player_id')
-        date_str = request.query_params.get('date')
-        
-        filters = Q()
-        
-        if player_id:
-            try:
-                # Valider l'UUID
-                player = User.objects.get(pk=player_id)
-                filters &= Q(player=player)
-            except (User.DoesNotExist, ValueError):
-                return ErrorResponse.bad_request("ID de joueur invalide")
-        
-        if date_str:
-            try:
-                # Convertir la chaîne de date en objet date
-                session_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                filters &= Q(start_time__date=session_date)
-            except ValueError:
-                return ErrorResponse.bad_request("Format de date invalide. Utilisez YYYY-MM-DD")
-        
-        # Limiter les résultats selon le rôle
-        if request.user.role == 'player':
-            # Les joueurs ne peuvent voir que leurs propres sessions
-            filters &= Q(player=request.user)
+        # Filtres combinables, traduits en conditions utilisables par les index ;
+        # les joueurs ne voient que leurs propres sessions
+        try:
+            sessions = filter_sessions(
+                Session.objects.select_related('player', 'station'),
+                request.query_params,
+                user=request.user,
+            )
+        except FilterError as e:
+            return ErrorResponse.bad_request(str(e))
         
-        sessions = Session.objects.filter(filters)
-        serializer = SessionSerializer(sessions, many=True)
+        if wants_live_cost(request):
+            # Durée et coût courants calculés par la base en une seule requête
+            sessions = price_live_sessions(with_live_cost(sessions))
+            serializer = LiveSessionSerializer(sessions, many=True)
+        else:
+            serializer = SessionSerializer(sessions, many=True)
         
         return JsonResponse(serializer.data, safe=False)
     
     @swagger_auto_schema(
         request_body=SessionCreateSerializer,
             operation_description="Démarre une nouvelle session en assignant un joueur à une station, avec une durée optionnelle en minutes",
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={
             201: SessionSerializer,
             400: "Données invalides",
@@ -270,6 +477,7 @@ class SessionListView(APIView):
             403: "Accès interdit"
         }
     )
+    @idempotent
     def post(self, request):
         # Vérifier si l'utilisateur est autorisé à créer des sessions
         if request.user.role not in ['admin', 'staff']:
@@ -293,6 +501,7 @@ class SessionDetailView(APIView):
     
     @swagger_auto_schema(
         operation_description="Récupère les détails d'une session spécifique",
+        manual_parameters=[WITH_LIVE_COST_PARAMETER],
         responses={
             200: SessionSerializer,
             401: "Non autorisé",
@@ -302,13 +511,21 @@ class SessionDetailView(APIView):
     )
     def get(self, request, session_id):
         try:
-            session = Session.objects.get(pk=session_id)
+            live = wants_live_cost(request)
+            sessions = Session.objects.filter(pk=session_id)
+            if live:
+                sessions = with_live_cost(sessions)
+            session = sessions.get()
             
             # Vérifier les autorisations
             if request.user.role == 'player' and request.user != session.player:
                 return ErrorResponse.forbidden("Vous n'êtes pas autorisé à voir cette session")
             
-            serializer = SessionSerializer(session)
+            if live:
+                session, = price_live_sessions([session])
+                serializer = LiveSessionSerializer(session)
+            else:
+                serializer = SessionSerializer(session)
             return JsonResponse(serializer.data)
         
         except Session.DoesNotExist:
@@ -320,6 +537,7 @@ class EndSessionView(APIView):
     
     @swagger_auto_schema(
         operation_description="Termine une session, calcule la durée et le coût",
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={
             200: SessionSerializer,
             400: "La session est déjà terminée",
@@ -328,6 +546,7 @@ class EndSessionView(APIView):
             404: "Session non trouvée"
         }
     )
+    @idempotent
     def put(self, request, session_id):
         # Vérifier si l'utilisateur est autorisé à terminer des sessions
         if request.user.role not in ['admin', 'staff']:
@@ -351,6 +570,131 @@ class EndSessionView(APIView):
             return ErrorResponse.not_found("Session non trouvée")
 
 
+class ReservationListView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Liste les réservations actives, avec filtres optionnels (station, date)",
+        manual_parameters=[
+            openapi.Parameter(
+                name='station_id',
+                in_=openapi.IN_QUERY,
+                description='ID de la station',
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_UUID,
+                required=False
+            ),
+            openapi.Parameter(
+                name='date',
+                in_=openapi.IN_QUERY,
+                description='Jour des réservations (format: YYYY-MM-DD)',
+                type=openapi.TYPE_STRING,
+                format='date',
+                required=False
+            )
+        ],
+        responses={
+            200: ReservationSerializer(many=True),
+            400: "Paramètres de requête invalides",
+            401: "Non autorisé"
+        }
+    )
+    def get(self, request):
+        reservations = Reservation.objects.filter(is_active=True).select_related('station')
+        
+        station_id = request.query_params.get('station_id')
+        if station_id:
+            try:
+                reservations = reservations.filter(station_id=uuid.UUID(station_id))
+            except ValueError:
+                return ErrorResponse.bad_request("ID de station invalide")
+        
+        date_str = request.query_params.get('date')
+        if date_str:
+            try:
+                day = datetime.strptime(date_str, '%Y-%m-%d').date()
+            except ValueError:
+                return ErrorResponse.bad_request("Format de date invalide. Utilisez YYYY-MM-DD")
+            # Réservations qui chevauchent la journée
+            start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            reservations = reservations.filter(start_time__lt=start + timedelta(days=1), end_time__gt=start)
+        
+        # Les joueurs ne voient que leurs propres réservations
+        if request.user.role == 'player':
+            reservations = reservations.filter(player=request.user)
+        
+        serializer = ReservationSerializer(reservations, many=True)
+        return JsonResponse(serializer.data, safe=False)
+    
+    @swagger_auto_schema(
+        request_body=ReservationSerializer,
+        operation_description="Réserve une station pour un joueur sur une plage horaire",
+        responses={
+            201: ReservationSerializer,
+            400: "Données invalides ou station déjà réservée",
+            401: "Non autorisé",
+            403: "Accès interdit"
+        }
+    )
+    def post(self, request):
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent créer des réservations")
+        
+        serializer = ReservationSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            serializer.save()
+            return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
+        
+        return JsonResponse({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ReservationDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Récupère les détails d'une réservation",
+        responses={
+            200: ReservationSerializer,
+            401: "Non autorisé",
+            403: "Accès interdit",
+            404: "Réservation non trouvée"
+        }
+    )
+    def get(self, request, reservation_id):
+        try:
+            reservation = Reservation.objects.select_related('station').get(pk=reservation_id)
+        except Reservation.DoesNotExist:
+            return ErrorResponse.not_found("Réservation non trouvée")
+        
+        if request.user.role == 'player' and request.user.pk != reservation.player_id:
+            return ErrorResponse.forbidden("Vous n'êtes pas autorisé à voir cette réservation")
+        
+        return JsonResponse(ReservationSerializer(reservation).data)
+    
+    @swagger_auto_schema(
+        operation_description="Annule une réservation",
+        responses={
+            204: "Annulation réussie",
+            401: "Non autorisé",
+            403: "Accès interdit",
+            404: "Réservation non trouvée"
+        }
+    )
+    def delete(self, request, reservation_id):
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent annuler des réservations")
+        
+        try:
+            reservation = Reservation.objects.get(pk=reservation_id)
+        except Reservation.DoesNotExist:
+            return ErrorResponse.not_found("Réservation non trouvée")
+        
+        # La réservation est conservée pour l'historique, mais libère la plage
+        reservation.is_active = False
+        reservation.save(update_fields=['is_active'])
+        return HttpResponse(status=204)
+
+
 class RateSettingsListView(APIView):
     """Vue pour lister et créer des paramètres tarifaires"""
     
@@ -390,6 +734,7 @@ class RateSettingsListView(APIView):
     @swagger_auto_schema(
         request_body=RateSettingsSerializer,
         operation_description="Crée un nouveau paramètre tarifaire (Admin/Staff uniquement)",
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={
             201: RateSettingsSerializer,
             400: "Données invalides",
@@ -398,6 +743,7 @@ class RateSettingsListView(APIView):
             500: "Erreur serveur"
         }
     )
+    @idempotent
     def post(self, request):
         """Crée un nouveau paramètre tarifaire (Admin/Staff uniquement)"""
         try:
@@ -560,6 +906,7 @@ class CurrentRatesView(APIView):
 class RevenueReportView(APIView):
     """Vue pour générer des rapports sur les revenus"""
     permission_classes = [IsAuthenticated]
+    read_replica = True
     
     @swagger_auto_schema(
         operation_description="Génère un rapport des revenus pour une période donnée",
@@ -611,60 +958,12 @@ class RevenueReportView(APIView):
                 return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent accéder aux rapports financiers")
             
             # Récupérer et valider les paramètres de date
-            start_date_str = request.query_params.get('start_date')
-            end_date_str = request.query_params.get('end_date')
-            
-            if not start_date_str or not end_date_str:
-                return ErrorResponse.bad_request("Les paramètres start_date et end_date sont requis")
-            
-            try:
-                # Convertir les chaînes de date en objets date
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                
-                # Ajouter un jour à end_date pour inclure toute la journée
-                end_date_inclusive = end_date + timezone.timedelta(days=1)
-            except ValueError:
-                return ErrorResponse.bad_request("Format de date invalide. Utilisez YYYY-MM-DD")
-            
-            # Vérifier que la date de début est avant la date de fin
-            if start_date > end_date:
-                return ErrorResponse.bad_request("La date de début doit être antérieure à la date de fin")
+            start_date, end_date, error = parse_report_period(request)
+            if error:
+                return error
             
-            # Récupérer les sessions terminées dans la période spécifiée
-            sessions = Session.objects.filter(
-                is_active=False,
-                end_time__gte=timezone.make_aware(datetime.combine(start_date, datetime.min.time())),
-                end_time__lt=timezone.make_aware(datetime.combine(end_date_inclusive, datetime.min.time()))
-            )
-            
-            # Calculer le revenu total
-            total_revenue = sum(session.cost or 0 for session in sessions)
-            
-            # Préparer les détails par jour
-            details = []
-            current_date = start_date
-            while current_date <= end_date:
-                # Filtrer les sessions pour la journée courante
-                day_start = timezone.make_aware(datetime.combine(current_date, datetime.min.time()))
-                day_end = timezone.make_aware(datetime.combine(current_date + timezone.timedelta(days=1), datetime.min.time()))
-                day_sessions = sessions.filter(end_time__gte=day_start, end_time__lt=day_end)
-                
-                # Calculer le revenu du jour
-                day_revenue = sum(session.cost or 0 for session in day_sessions)
-                
-                details.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'revenue': float(day_revenue)
-                })
-                
-                # Passer au jour suivant
-                current_date += timezone.timedelta(days=1)
-            
-            return JsonResponse({
-                'total_revenue': float(total_revenue),
-                'details': details
-            })
+            # Agréger les sessions terminées (table chaude et archive)
+            return JsonResponse(revenue_report(start_date, end_date))
         
         except Exception as e:
             return ErrorResponse.server_error(str(e))
@@ -673,6 +972,7 @@ class RevenueReportView(APIView):
 class UsageReportView(APIView):
     """Vue pour générer des rapports sur l'utilisation des stations"""
     permission_classes = [IsAuthenticated]
+    read_replica = True
     
     @swagger_auto_schema(
         operation_description="Fournit des statistiques d'utilisation (nombre de sessions, durée moyenne)",
@@ -726,121 +1026,792 @@ class UsageReportView(APIView):
                 return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent accéder aux rapports d'utilisation")
             
             # Récupérer et valider les paramètres de date
-            start_date_str = request.query_params.get('start_date')
-            end_date_str = request.query_params.get('end_date')
-            
-            if not start_date_str or not end_date_str:
-                return ErrorResponse.bad_request("Les paramètres start_date et end_date sont requis")
-            
-            try:
-                # Convertir les chaînes de date en objets date
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                
-                # Ajouter un jour à end_date pour inclure toute la journée
-                end_date_inclusive = end_date + timezone.timedelta(days=1)
-            except ValueError:
-                return ErrorResponse.bad_request("Format de date invalide. Utilisez YYYY-MM-DD")
-            
-            # Vérifier que la date de début est avant la date de fin
-            if start_date > end_date:
-                return ErrorResponse.bad_request("La date de début doit être antérieure à la date de fin")
-            
-            # Récupérer les sessions terminées dans la période spécifiée
-            sessions = Session.objects.filter(
-                is_active=False,
-                end_time__gte=timezone.make_aware(datetime.combine(start_date, datetime.min.time())),
-                end_time__lt=timezone.make_aware(datetime.combine(end_date_inclusive, datetime.min.time()))
-            )
-            
-            # Calculer les statistiques globales
-            total_sessions = sessions.count()
-            
-            # Éviter la division par zéro
-            if total_sessions > 0:
-                # Utiliser l'agrégation pour calculer la durée moyenne
-                avg_duration = sessions.aggregate(avg_duration=models.Avg('duration'))['avg_duration'] or 0
-            else:
-                avg_duration = 0
-            
-            # Préparer les détails par jour
-            details = []
-            current_date = start_date
-            while current_date <= end_date:
-                # Filtrer les sessions pour la journée courante
-                day_start = timezone.make_aware(datetime.combine(current_date, datetime.min.time()))
-                day_end = timezone.make_aware(datetime.combine(current_date + timezone.timedelta(days=1), datetime.min.time()))
-                day_sessions = sessions.filter(end_time__gte=day_start, end_time__lt=day_end)
-                
-                # Calculer les statistiques du jour
-                day_count = day_sessions.count()
-                
-                if day_count > 0:
-                    day_avg_duration = day_sessions.aggregate(avg_duration=models.Avg('duration'))['avg_duration'] or 0
-                else:
-                    day_avg_duration = 0
-                
-                details.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'sessions_count': day_count,
-                    'average_duration': round(float(day_avg_duration), 2)
-                })
-                
-                # Passer au jour suivant
-                current_date += timezone.timedelta(days=1)
+            start_date, end_date, error = parse_report_period(request)
+            if error:
+                return error
             
-            return JsonResponse({
-                'total_sessions': total_sessions,
-                'average_duration': round(float(avg_duration), 2),
-                'details': details
-            })
+            # Agréger les sessions terminées (table chaude et archive)
+            return JsonResponse(usage_report(start_date, end_date))
         
         except Exception as e:
             return ErrorResponse.server_error(str(e))
 
 
-class UserListView(APIView):
-    """Vue pour lister tous les utilisateurs (réservée aux administrateurs)"""
+class UtilizationReportView(APIView):
+    """Vue pour générer le taux d'occupation des stations"""
     permission_classes = [IsAuthenticated]
+    read_replica = True
     
     @swagger_auto_schema(
-        operation_description="Liste tous les utilisateurs (administrateurs uniquement)",
+        operation_description="Taux d'occupation (%) par type de station ou par station, par heure de la journée et par jour",
+        manual_parameters=[
+            openapi.Parameter(
+                name='start_date',
+                in_=openapi.IN_QUERY,
+                description='Date de début au format YYYY-MM-DD',
+                type=openapi.TYPE_STRING,
+                format='date',
+                required=True
+            ),
+            openapi.Parameter(
+                name='end_date',
+                in_=openapi.IN_QUERY,
+                description='Date de fin au format YYYY-MM-DD',
+                type=openapi.TYPE_STRING,
+                format='date',
+                required=True
+            ),
+            openapi.Parameter(
+                name='group_by',
+                in_=openapi.IN_QUERY,
+                description="Regroupement : 'type' (défaut) ou 'station'",
+                type=openapi.TYPE_STRING,
+                enum=list(GROUP_BY_CHOICES),
+                required=False
+            )
+        ],
         responses={
-            200: openapi.Response(
-                description="Liste des utilisateurs",
-                schema=openapi.Schema(
-                    type=openapi.TYPE_ARRAY,
-                    items=openapi.Schema(
-                        type=openapi.TYPE_OBJECT,
-                        properties={
-                            'id': openapi.Schema(type=openapi.TYPE_STRING, format='uuid'),
-                            'username': openapi.Schema(type=openapi.TYPE_STRING),
-                            'role': openapi.Schema(type=openapi.TYPE_STRING, enum=['player', 'staff', 'admin'])
-                        }
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'group_by': openapi.Schema(type=openapi.TYPE_STRING),
+                    'groups': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'key': openapi.Schema(type=openapi.TYPE_STRING),
+                                'label': openapi.Schema(type=openapi.TYPE_STRING),
+                                'stations': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'utilization': openapi.Schema(type=openapi.TYPE_NUMBER, description="Taux d'occupation en %"),
+                                'by_hour': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                                'by_day': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT))
+                            }
+                        )
                     )
-                )
+                }
             ),
+            400: "Paramètres de requête invalides",
             401: "Non authentifié",
             403: "Accès interdit"
         }
     )
     def get(self, request):
-        """Liste tous les utilisateurs (administrateurs uniquement)"""
+        """Calcule le taux d'occupation des stations sur une période donnée"""
         try:
-            # Vérifier que l'utilisateur est un administrateur
-            if request.user.role != 'admin':
-                return ErrorResponse.forbidden("Seuls les administrateurs peuvent accéder à la liste des utilisateurs")
-            
-            # Récupérer tous les utilisateurs
-            users = User.objects.all()
+            if request.user.role not in ['admin', 'staff']:
+                return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent accéder aux rapports d'utilisation")
             
-            # Sérialiser les données
-            serializer = UserSerializer(users, many=True)
+            start_date, end_date, error = parse_report_period(request)
+            if error:
+                return error
+            
+            group_by = request.query_params.get('group_by', 'type')
+            if group_by not in GROUP_BY_CHOICES:
+                return ErrorResponse.bad_request("Le paramètre group_by doit être 'type' ou 'station'")
+            
+            return JsonResponse(utilization_report(start_date, end_date, group_by=group_by))
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
+
+
+class HeatmapReportView(APIView):
+    """Vue pour générer la carte de chaleur jour de la semaine × heure"""
+    permission_classes = [IsAuthenticated]
+    read_replica = True
+    
+    @swagger_auto_schema(
+        operation_description="Matrice jour de la semaine × heure des sessions simultanées (moyenne et pic) et du revenu",
+        manual_parameters=[
+            openapi.Parameter(
+                name='start_date',
+                in_=openapi.IN_QUERY,
+                description='Date de début au format YYYY-MM-DD',
+                type=openapi.TYPE_STRING,
+                format='date',
+                required=True
+            ),
+            openapi.Parameter(
+                name='end_date',
+                in_=openapi.IN_QUERY,
+                description='Date de fin au format YYYY-MM-DD',
+                type=openapi.TYPE_STRING,
+                format='date',
+                required=True
+            ),
+            openapi.Parameter(
+                name='station_type',
+                in_=openapi.IN_QUERY,
+                description='Filtrer par type de station (console, PC)',
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'weekdays': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+                    'hours': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                    'concurrent_sessions': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_NUMBER)), description='Nombre moyen de sessions simultanées (7 × 24)'),
+                    'peak_concurrent_sessions': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)), description='Pic de sessions simultanées (7 × 24)'),
+                    'revenue': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_NUMBER)), description='Revenu en FCFA au prorata du temps joué (7 × 24)'),
+                    'peak_concurrency': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'total_revenue': openapi.Schema(type=openapi.TYPE_NUMBER)
+                }
+            ),
+            400: "Paramètres de requête invalides",
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    def get(self, request):
+        """Calcule la carte de chaleur des sessions et du revenu sur une période donnée"""
+        try:
+            if request.user.role not in ['admin', 'staff']:
+                return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent accéder aux rapports d'utilisation")
+            
+            start_date, end_date, error = parse_report_period(request)
+            if error:
+                return error
+            
+            station_type = request.query_params.get('station_type')
+            if station_type and station_type not in dict(Station.TYPE_CHOICES):
+                return ErrorResponse.bad_request("Le type de station doit être 'PC' ou 'console'")
+            
+            return JsonResponse(heatmap_report(start_date, end_date, station_type=station_type))
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
+
+
+class TopPlayersReportView(APIView):
+    """Vue du classement des joueurs pour le programme de fidélité"""
+    permission_classes = [IsAuthenticated]
+    read_replica = True
+    
+    @swagger_auto_schema(
+        operation_description="Classement des joueurs par temps de jeu ou dépense, depuis toujours ou sur une période",
+        manual_parameters=[
+            openapi.Parameter(
+                name='metric',
+                in_=openapi.IN_QUERY,
+                description='Critère de classement',
+                type=openapi.TYPE_STRING,
+                enum=list(METRICS),
+                default='spend',
+                required=False
+            ),
+            openapi.Parameter(
+                name='start',
+                in_=openapi.IN_QUERY,
+                description='Début de la période (YYYY-MM-DD) ; sans période, classement depuis toujours',
+                type=openapi.TYPE_STRING,
+                format='date',
+                required=False
+            ),
+            openapi.Parameter(
+                name='end',
+                in_=openapi.IN_QUERY,
+                description='Fin de la période incluse (YYYY-MM-DD)',
+                type=openapi.TYPE_STRING,
+                format='date',
+                required=False
+            ),
+            openapi.Parameter(
+                name='limit',
+                in_=openapi.IN_QUERY,
+                description=f'Nombre de joueurs (1 à {MAX_LIMIT})',
+                type=openapi.TYPE_INTEGER,
+                default=10,
+                required=False
+            )
+        ],
+        responses={
+            200: "Classement des joueurs",
+            400: "Paramètres de requête invalides",
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    def get(self, request):
+        try:
+            if request.user.role not in ['admin', 'staff']:
+                return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent accéder aux rapports")
+            
+            metric = request.query_params.get('metric', 'spend')
+            if metric not in METRICS:
+                return ErrorResponse.bad_request("Le critère doit être 'time' ou 'spend'")
+            
+            try:
+                limit = int(request.query_params.get('limit', 10))
+            except ValueError:
+                return ErrorResponse.bad_request("Le paramètre limit doit être un entier")
+            
+            start_str = request.query_params.get('start')
+            end_str = request.query_params.get('end')
+            start_date = end_date = None
+            if start_str or end_str:
+                if not start_str or not end_str:
+                    return ErrorResponse.bad_request("Les paramètres start et end vont ensemble")
+                try:
+                    start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+                    end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
+                except ValueError:
+                    return ErrorResponse.bad_request("Format de date invalide. Utilisez YYYY-MM-DD")
+                if start_date > end_date:
+                    return ErrorResponse.bad_request("La date de début doit être antérieure à la date de fin")
             
+            return JsonResponse(top_players(metric, start_date, end_date, limit))
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
+
+
+class ReportJobListView(APIView):
+    """Mise en file des rapports lourds, calculés par la commande run_report_jobs"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Met un rapport en file d'attente ; un résultat identique encore valide est réutilisé",
+        request_body=ReportJobCreateSerializer,
+        responses={
+            200: ReportJobSerializer,
+            202: ReportJobSerializer,
+            400: "Données invalides",
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    def post(self, request):
+        try:
+            if request.user.role not in ['admin', 'staff']:
+                return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent demander des rapports")
+            
+            serializer = ReportJobCreateSerializer(data=request.data)
+            if not serializer.is_valid():
+                return JsonResponse({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+            
+            job = enqueue(
+                serializer.validated_data['report'],
+                serializer.job_params(),
+                user=request.user,
+                refresh=serializer.validated_data['refresh'],
+            )
+            # 200 : résultat déjà disponible ; 202 : calcul en attente ou en cours
+            code = status.HTTP_200_OK if job.status == 'done' else status.HTTP_202_ACCEPTED
+            return JsonResponse(ReportJobSerializer(job).data, status=code)
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
+
+
+class ReportJobDetailView(APIView):
+    """Suivi d'un rapport mis en file"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="État d'un rapport mis en file (pending, running, done ou failed)",
+        responses={
+            200: ReportJobSerializer,
+            401: "Non authentifié",
+            403: "Accès interdit",
+            404: "Rapport non trouvé"
+        }
+    )
+    def get(self, request, job_id):
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent consulter les rapports")
+        
+        try:
+            job = ReportJob.objects.get(pk=job_id)
+        except ReportJob.DoesNotExist:
+            return ErrorResponse.not_found("Rapport non trouvé")
+        
+        return JsonResponse(ReportJobSerializer(job).data)
+
+
+class ReportJobResultView(APIView):
+    """Téléchargement du résultat d'un rapport terminé"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Télécharge le résultat JSON d'un rapport terminé",
+        responses={
+            200: "Résultat du rapport (JSON)",
+            401: "Non authentifié",
+            403: "Accès interdit",
+            404: "Rapport non trouvé",
+            409: "Rapport pas encore terminé"
+        }
+    )
+    def get(self, request, job_id):
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent consulter les rapports")
+        
+        try:
+            job = ReportJob.objects.get(pk=job_id)
+        except ReportJob.DoesNotExist:
+            return ErrorResponse.not_found("Rapport non trouvé")
+        
+        if job.status != 'done':
+            return ErrorResponse.conflict(f"Le rapport n'est pas terminé (état : {job.status})")
+        
+        path = result_path(job)
+        if not path.exists():
+            return ErrorResponse.not_found("Le fichier du rapport a été supprimé ; relancez-le avec refresh")
+        
+        return FileResponse(open(path, 'rb'), content_type='application/json', filename=f"{job.report}-{job.pk}.json")
+
+
+class SessionExportView(APIView):
+    """Export en colonnes de l'historique des sessions (manifeste et mise à jour)"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Manifeste de l'export : format, colonnes et partitions mensuelles avec leur URL",
+        responses={
+            200: "Manifeste de l'export",
+            401: "Non authentifié",
+            403: "Accès interdit",
+            404: "Aucun export disponible"
+        }
+    )
+    def get(self, request):
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent accéder aux exports")
+        
+        manifest = read_manifest()
+        if manifest is None:
+            return ErrorResponse.not_found("Aucun export disponible ; lancez-en un par POST ou avec la commande export_sessions")
+        
+        for month, partition in manifest['partitions'].items():
+            partition['url'] = request.build_absolute_uri(
+                reverse('ps:session-export-partition', kwargs={'month': month})
+            )
+        return JsonResponse(manifest)
+    
+    @swagger_auto_schema(
+        operation_description="Met à jour l'export en arrière-plan (seuls les mois modifiés sont réécrits)",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'full': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='Réécrit tous les mois')
+            }
+        ),
+        responses={
+            200: ReportJobSerializer,
+            202: ReportJobSerializer,
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    def post(self, request):
+        try:
+            if request.user.role not in ['admin', 'staff']:
+                return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent lancer un export")
+            
+            if default_format() is None:
+                return ErrorResponse.server_error("L'export nécessite pyarrow (Parquet) ou NumPy (.npy)")
+            
+            job = enqueue('session_snapshot', {'full': bool(request.data.get('full', False))}, user=request.user)
+            code = status.HTTP_200_OK if job.status == 'done' else status.HTTP_202_ACCEPTED
+            return JsonResponse(ReportJobSerializer(job).data, status=code)
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
+
+
+class SessionExportPartitionView(APIView):
+    """Téléchargement d'une partition mensuelle de l'export"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Télécharge la partition d'un mois (YYYY-MM) de l'export des sessions",
+        responses={
+            200: "Fichier Parquet, ou archive .npz non compressée des colonnes .npy",
+            401: "Non authentifié",
+            403: "Accès interdit",
+            404: "Partition non trouvée"
+        }
+    )
+    def get(self, request, month):
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent accéder aux exports")
+        
+        manifest = read_manifest()
+        partition = manifest and manifest['partitions'].get(month)
+        if not partition:
+            return ErrorResponse.not_found("Partition non trouvée")
+        
+        content, suffix = partition_file(snapshot_dir() / partition['file'])
+        return FileResponse(content, as_attachment=True, filename=f"sessions-{month}{suffix}")
+
+
+class EventListView(APIView):
+    """Lecture du journal des changements par position, avec attente optionnelle"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Événements postérieurs à la position `after`, dans l'ordre du journal. "
+                              "Reprendre ensuite avec after=next.",
+        manual_parameters=[
+            openapi.Parameter(
+                name='after',
+                in_=openapi.IN_QUERY,
+                description='Position (identifiant) du dernier événement déjà traité (0 par défaut)',
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                name='limit',
+                in_=openapi.IN_QUERY,
+                description=f'Nombre maximal d\'événements (100 par défaut, {EVENT_MAX_LIMIT} au plus)',
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                name='wait',
+                in_=openapi.IN_QUERY,
+                description=f'Attente maximale (secondes, {EVENT_MAX_WAIT} au plus) si aucun événement n\'est disponible',
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                name='topic',
+                in_=openapi.IN_QUERY,
+                description='Sujets à retenir, séparés par des virgules (' + ', '.join(EVENT_TOPICS) + ')',
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+        ],
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'events': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'topic': openapi.Schema(type=openapi.TYPE_STRING),
+                                'entity_id': openapi.Schema(type=openapi.TYPE_STRING),
+                                'payload': openapi.Schema(type=openapi.TYPE_OBJECT),
+                                'created_at': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                            }
+                        )
+                    ),
+                    'next': openapi.Schema(type=openapi.TYPE_INTEGER, description='Valeur de after pour la lecture suivante'),
+                }
+            ),
+            400: "Paramètres invalides",
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    def get(self, request):
+        try:
+            if request.user.role not in ['admin', 'staff']:
+                return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent lire le journal")
+            
+            try:
+                after = int(request.query_params.get('after', 0))
+                limit = int(request.query_params.get('limit', 100))
+                wait = float(request.query_params.get('wait', 0))
+            except ValueError:
+                return ErrorResponse.bad_request("after et limit doivent être des entiers, wait un nombre")
+            if after < 0 or limit < 1 or wait < 0:
+                return ErrorResponse.bad_request("after, limit et wait doivent être positifs")
+            
+            topics = [topic for topic in request.query_params.get('topic', '').split(',') if topic]
+            unknown = set(topics) - set(EVENT_TOPICS)
+            if unknown:
+                return ErrorResponse.bad_request(f"Sujet(s) inconnu(s) : {', '.join(sorted(unknown))}")
+            
+            events = wait_for_events(after, min(limit, EVENT_MAX_LIMIT), topics, min(wait, EVENT_MAX_WAIT))
+            return JsonResponse({
+                'events': [
+                    {
+                        'id': event.id,
+                        'topic': event.topic,
+                        'entity_id': event.entity_id,
+                        'payload': event.payload,
+                        'created_at': event.created_at,
+                    }
+                    for event in events
+                ],
+                'next': events[-1].id if events else after,
+            })
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
+
+
+class SyncView(APIView):
+    """Synchronisation par lot des postes d'accueil hors ligne"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Applique dans l'ordre, en une transaction, les démarrages et fins de session "
+                              "mis en file hors ligne, puis retourne les changements des stations et des "
+                              "sessions depuis `token`. Une opération en conflit avec l'état courant est "
+                              "refusée (status=conflict) sans annuler les autres.",
+        request_body=SyncRequestSerializer,
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'results': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'op_id': openapi.Schema(type=openapi.TYPE_STRING),
+                                'status': openapi.Schema(type=openapi.TYPE_STRING, enum=['applied', 'conflict', 'invalid', 'error']),
+                                'session_id': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID),
+                                'error': openapi.Schema(type=openapi.TYPE_STRING),
+                            }
+                        )
+                    ),
+                    'token': openapi.Schema(type=openapi.TYPE_INTEGER, description='Jeton à renvoyer à la synchronisation suivante'),
+                    'reset': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='État complet (stations, sessions) au lieu des changements'),
+                    'has_more': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='Changements restants : resynchroniser avec le nouveau jeton'),
+                    'changes': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                    'stations': StationSerializer(many=True),
+                    'sessions': SessionSerializer(many=True),
+                }
+            ),
+            400: "Données invalides",
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    @idempotent
+    def post(self, request):
+        if request.user.role not in ['admin', 'staff']:
+            return ErrorResponse.forbidden("Seuls les administrateurs et le personnel peuvent synchroniser des sessions")
+        
+        serializer = SyncRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            results = apply_operations(serializer.validated_data['operations'])
+            return JsonResponse({
+                'results': results,
+                **changes_since(serializer.validated_data['token']),
+            })
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
+
+
+class WebhookListView(APIView):
+    """Abonnements webhook au journal des changements (réservés aux administrateurs)"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Liste les abonnements webhook et leurs mesures de livraison (retard, échecs, latence)",
+        responses={
+            200: WebhookSubscriptionSerializer(many=True),
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    def get(self, request):
+        if request.user.role != 'admin':
+            return ErrorResponse.forbidden("Seuls les administrateurs peuvent gérer les webhooks")
+        
+        try:
+            head = Event.objects.aggregate(head=Max('id'))['head'] or 0
+            subscriptions = WebhookSubscription.objects.all()
+            serializer = WebhookSubscriptionSerializer(subscriptions, many=True, context={'head': head})
             return JsonResponse(serializer.data, safe=False)
         
         except Exception as e:
             return ErrorResponse.server_error(str(e))
+    
+    @swagger_auto_schema(
+        operation_description="Abonne une URL au journal : les événements postérieurs à la création lui sont "
+                              "envoyés par lots en POST JSON, signés par HMAC-SHA256 si une clé est fournie",
+        request_body=WebhookSubscriptionSerializer,
+        responses={
+            201: WebhookSubscriptionSerializer,
+            400: "Données invalides",
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    def post(self, request):
+        if request.user.role != 'admin':
+            return ErrorResponse.forbidden("Seuls les administrateurs peuvent gérer les webhooks")
+        
+        try:
+            serializer = WebhookSubscriptionSerializer(data=request.data)
+            if not serializer.is_valid():
+                return JsonResponse({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+            subscription = serializer.save(created_by=request.user)
+            return JsonResponse(WebhookSubscriptionSerializer(subscription).data, status=status.HTTP_201_CREATED)
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
+
+
+class WebhookDetailView(APIView):
+    """Consultation et désactivation d'un abonnement webhook"""
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Détail et mesures de livraison d'un abonnement webhook",
+        responses={
+            200: WebhookSubscriptionSerializer,
+            401: "Non authentifié",
+            403: "Accès interdit",
+            404: "Abonnement non trouvé"
+        }
+    )
+    def get(self, request, subscription_id):
+        if request.user.role != 'admin':
+            return ErrorResponse.forbidden("Seuls les administrateurs peuvent gérer les webhooks")
+        
+        try:
+            subscription = WebhookSubscription.objects.get(pk=subscription_id)
+        except WebhookSubscription.DoesNotExist:
+            return ErrorResponse.not_found("Abonnement non trouvé")
+        
+        return JsonResponse(WebhookSubscriptionSerializer(subscription).data)
+    
+    @swagger_auto_schema(
+        operation_description="Désactive un abonnement webhook (les mesures sont conservées)",
+        responses={
+            204: "Abonnement désactivé",
+            401: "Non authentifié",
+            403: "Accès interdit",
+            404: "Abonnement non trouvé"
+        }
+    )
+    def delete(self, request, subscription_id):
+        if request.user.role != 'admin':
+            return ErrorResponse.forbidden("Seuls les administrateurs peuvent gérer les webhooks")
+        
+        updated = WebhookSubscription.objects.filter(pk=subscription_id).update(is_active=False)
+        if not updated:
+            return ErrorResponse.not_found("Abonnement non trouvé")
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class UserListView(APIView):
+    """Vue pour lister les utilisateurs (réservée aux administrateurs)"""
+    permission_classes = [IsAuthenticated]
+    read_replica = True
+    
+    @swagger_auto_schema(
+        operation_description="Liste paginée des utilisateurs, triée par nom d'utilisateur (administrateurs uniquement)",
+        manual_parameters=[
+            openapi.Parameter(
+                name='search',
+                in_=openapi.IN_QUERY,
+                description="Mots recherchés dans le nom d'utilisateur, le prénom ou le nom (début de mot ; "
+                            "n'importe où sous PostgreSQL), sans tenir compte de la casse ni des accents",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                name='role',
+                in_=openapi.IN_QUERY,
+                description='Filtrer par rôle (player, staff, admin)',
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                name='page',
+                in_=openapi.IN_QUERY,
+                description='Numéro de page (1 par défaut)',
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                name='page_size',
+                in_=openapi.IN_QUERY,
+                description=f'Utilisateurs par page ({USER_PAGE_SIZE} par défaut, {USER_MAX_PAGE_SIZE} au plus)',
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Page d'utilisateurs",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'page': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'page_size': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'num_pages': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'results': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'id': openapi.Schema(type=openapi.TYPE_STRING, format='uuid'),
+                                    'username': openapi.Schema(type=openapi.TYPE_STRING),
+                                    'role': openapi.Schema(type=openapi.TYPE_STRING, enum=['player', 'staff', 'admin'])
+                                }
+                            )
+                        ),
+                    }
+                )
+            ),
+            400: "Paramètres invalides",
+            401: "Non authentifié",
+            403: "Accès interdit"
+        }
+    )
+    def get(self, request):
+        """Liste paginée des utilisateurs (administrateurs uniquement)"""
+        try:
+            # Vérifier que l'utilisateur est un administrateur
+            if request.user.role != 'admin':
+                return ErrorResponse.forbidden("Seuls les administrateurs peuvent accéder à la liste des utilisateurs")
+            
+            try:
+                page_number = int(request.query_params.get('page', 1))
+                page_size = int(request.query_params.get('page_size', USER_PAGE_SIZE))
+            except ValueError:
+                return ErrorResponse.bad_request("page et page_size doivent être des entiers")
+            if page_number < 1 or page_size < 1:
+                return ErrorResponse.bad_request("page et page_size doivent être positifs")
+            page_size = min(page_size, USER_MAX_PAGE_SIZE)
+            
+            # Utilisateurs avec leurs statistiques en une jointure, dans l'ordre de l'index de recherche
+            users = User.objects.select_related('stats').order_by('username_key', 'id')
+            
+            role = request.query_params.get('role')
+            if role:
+                if role not in dict(User.ROLE_CHOICES):
+                    return ErrorResponse.bad_request("Rôle invalide")
+                users = users.filter(role=role)
+            
+            users = search_users(users, request.query_params.get('search', ''))
+            
+            paginator = Paginator(users, page_size)
+            if page_number > paginator.num_pages and page_number > 1:
+                return ErrorResponse.not_found("Page inexistante")
+            page = paginator.page(page_number)
+            
+            return JsonResponse({
+                'count': paginator.count,
+                'page': page.number,
+                'page_size': page_size,
+                'num_pages': paginator.num_pages,
+                'results': UserSerializer(page.object_list, many=True).data,
+            })
+        
+        except Exception as e:
+            return ErrorResponse.server_error(str(e))
 
 
 class UserDetailView(APIView):
@@ -850,7 +1821,7 @@ class UserDetailView(APIView):
     def get_user(self, user_id):
         """Récupère un utilisateur par son ID"""
         try:
-            return User.objects.get(pk=user_id)
+            return User.objects.select_related('stats').get(pk=user_id)
         except User.DoesNotExist:
             return None
     
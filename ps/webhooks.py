@@ -0,0 +1,176 @@
+"""
+Livraison des événements du journal (ps.events) aux abonnements webhook.
+
+Le journal sert de boîte d'envoi : démarrer ou terminer une session n'écrit
+qu'une ligne Event dans sa transaction, sans appel réseau. Le répartiteur
+(commande dispatch_webhooks) lit, pour chaque abonnement, les événements
+postérieurs à sa position et les envoie par lots en un POST JSON :
+
+    {"subscription": "<id>", "events": [{"id": ..., "topic": ..., ...}, ...]}
+
+signé par HMAC-SHA256 (en-tête X-Webhook-Signature: sha256=<hex>) si
+l'abonnement a une clé. Une réponse 2xx avance la position ; sinon le lot
+est retenté après une attente exponentielle (WEBHOOK_RETRY_BASE secondes,
+doublée à chaque échec, plafonnée à WEBHOOK_RETRY_MAX, avec une part
+aléatoire). Les envois vers des abonnements différents partent en parallèle.
+"""
+import hashlib
+import hmac
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .events import read_events
+from .models import Event, WebhookSubscription
+
+
+def event_payload(event):
+    return {
+        'id': event.id,
+        'topic': event.topic,
+        'entity_id': event.entity_id,
+        'payload': event.payload,
+        'created_at': event.created_at,
+    }
+
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def retry_delay(failures):
+    """Attente avant la tentative suivant le n-ième échec consécutif"""
+    base = getattr(settings, 'WEBHOOK_RETRY_BASE', 5)
+    ceiling = getattr(settings, 'WEBHOOK_RETRY_MAX', 3600)
+    delay = min(base * 2 ** (failures - 1), ceiling)
+    # Part aléatoire : les abonnés en panne ne sont pas tous retentés au même instant
+    return delay * random.uniform(0.8, 1.0)
+
+
+def deliver(subscription, events, timeout=None):
+    """
+    Envoie un lot en un POST et retourne (code HTTP ou None, erreur, durée en ms).
+    N'accède pas à la base : appelé depuis les fils du répartiteur.
+    """
+    body = json.dumps(
+        {'subscription': str(subscription.pk), 'events': [event_payload(event) for event in events]},
+        cls=DjangoJSONEncoder,
+    ).encode()
+    request = urllib.request.Request(subscription.url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'User-Agent': 'ps-webhooks',
+        'X-Webhook-Id': str(subscription.pk),
+    })
+    if subscription.secret:
+        request.add_header('X-Webhook-Signature', sign(subscription.secret, body))
+
+    timeout = timeout or getattr(settings, 'WEBHOOK_TIMEOUT', 10)
+    started = time.monotonic()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            code, error = response.status, ''
+    except urllib.error.HTTPError as e:
+        code, error = e.code, f"HTTP {e.code}"
+    except (urllib.error.URLError, OSError) as e:
+        code, error = None, str(getattr(e, 'reason', e))
+    return code, error, int((time.monotonic() - started) * 1000)
+
+
+def pending_batch(subscription):
+    """Prochain lot d'événements à livrer à l'abonnement"""
+    return read_events(subscription.last_event_id, subscription.batch_size, subscription.topics or None)
+
+
+def record_outcome(subscription, events, outcome, now=None):
+    """Met à jour la position, l'échéancier de nouvelle tentative et les mesures"""
+    now = now or timezone.now()
+    code, error, latency = outcome
+    subscriptions = WebhookSubscription.objects.filter(pk=subscription.pk)
+    if code is not None and 200 <= code < 300:
+        subscriptions.update(
+            last_event_id=events[-1].id,
+            consecutive_failures=0,
+            next_attempt_at=None,
+            delivered_events=F('delivered_events') + len(events),
+            delivered_batches=F('delivered_batches') + 1,
+            last_delivery_at=now,
+            last_status_code=code,
+            last_latency_ms=latency,
+            last_error='',
+        )
+        return True
+
+    failures = subscription.consecutive_failures + 1
+    subscriptions.update(
+        consecutive_failures=failures,
+        next_attempt_at=now + timedelta(seconds=retry_delay(failures)),
+        failed_attempts=F('failed_attempts') + 1,
+        last_status_code=code,
+        last_latency_ms=latency,
+        last_error=error[:1000],
+    )
+    return False
+
+
+def due_subscriptions(now=None):
+    now = now or timezone.now()
+    return WebhookSubscription.objects.filter(is_active=True).filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)
+    )
+
+
+def dispatch_once(max_workers=4, now=None):
+    """
+    Un passage du répartiteur : au plus un lot par abonnement dû, les envois
+    en parallèle sur `max_workers` fils. Les lectures et écritures en base
+    restent dans le fil appelant. Retourne {'delivered', 'failed', 'events'}.
+    """
+    now = now or timezone.now()
+    work = []
+    for subscription in due_subscriptions(now):
+        events = pending_batch(subscription)
+        if events:
+            work.append((subscription, events))
+
+    stats = {'delivered': 0, 'failed': 0, 'events': 0}
+    if not work:
+        return stats
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(work)))) as pool:
+        outcomes = list(pool.map(lambda item: deliver(*item), work))
+
+    for (subscription, events), outcome in zip(work, outcomes):
+        if record_outcome(subscription, events, outcome, now):
+            stats['delivered'] += 1
+            stats['events'] += len(events)
+        else:
+            stats['failed'] += 1
+    return stats
+
+
+def subscription_metrics(subscription, head=None):
+    """Mesures de livraison d'un abonnement, dont le retard sur le journal"""
+    if head is None:
+        head = Event.objects.aggregate(head=Max('id'))['head'] or 0
+    return {
+        'delivered_events': subscription.delivered_events,
+        'delivered_batches': subscription.delivered_batches,
+        'failed_attempts': subscription.failed_attempts,
+        'consecutive_failures': subscription.consecutive_failures,
+        'next_attempt_at': subscription.next_attempt_at,
+        'last_delivery_at': subscription.last_delivery_at,
+        'last_status_code': subscription.last_status_code,
+        'last_latency_ms': subscription.last_latency_ms,
+        'last_error': subscription.last_error,
+        # Écart de position (tous sujets confondus) : majorant des événements en attente
+        'lag': max(head - subscription.last_event_id, 0),
+    }
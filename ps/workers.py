@@ -0,0 +1,52 @@
+"""
+Fonctions exécutées dans les processus d'un pool (ProcessPoolExecutor).
+
+Avec les méthodes de démarrage spawn et forkserver, un processus du pool
+importe ce module avant que Django ne soit configuré : il ne doit donc
+importer aucun modèle au chargement. init_worker configure Django, puis
+chaque tâche importe ce dont elle a besoin et ferme ses connexions.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def init_worker():
+    """Initialisation d'un processus du pool"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def process_pool(workers):
+    """
+    Pool de processus démarrés par spawn : chacun ouvre ses propres
+    connexions à la base au lieu d'hériter de celles du parent.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker
+    )
+
+
+def compute_report(job_id, report, params, digest):
+    """Calcule un rapport en file (ps.jobs.compute)"""
+    from django.db import connections
+    from .jobs import compute
+
+    try:
+        return compute(job_id, report, params, digest)
+    finally:
+        connections.close_all()
+
+
+def compute_station_shard(start_date, end_date):
+    """Cumuls partiels d'une tranche de ps.reports.station_revenue_report (dates ISO)"""
+    from datetime import date
+    from django.db import connections
+    from .reports import station_daily_partials
+
+    try:
+        return station_daily_partials(date.fromisoformat(start_date), date.fromisoformat(end_date))
+    finally:
+        connections.close_all()